@@ -8,21 +8,37 @@ import {
     INodeInputConfiguration,
     INodeOutputConfiguration
 } from 'n8n-workflow';
-import { hatColors, defaultHatsOrder, IAnalysisResult } from './types';
+import { hatColors, defaultHatsOrder, IAnalysisJob, IAnalysisResult } from './types';
 import Anthropic from '@anthropic-ai/sdk';
-import { spawn } from 'child_process';
+import { getPythonWorker } from './python_worker';
 import { join } from 'path';
 import { readFileSync } from 'fs';
-import express from 'express';
+import { createApp, createStoreFromEnv } from './web_visualizer/server';
 
-// Declare global type for latestConversation
-declare global {
-    var latestConversation: IAnalysisResult | null;
+// Хранилище запусков визуализатора: каждый элемент — отдельный запуск со своим ID
+const visualizerStore = createStoreFromEnv();
+
+// Сервер запускается один раз на процесс n8n, а не при каждом выполнении узла
+let visualizationServerStarted = false;
+
+function setupVisualizationServer() {
+    if (visualizationServerStarted) return;
+    visualizationServerStarted = true;
+
+    const app = createApp(visualizerStore);
+
+    const serverPort = Number(process.env.VISUALIZER_PORT || 3001);
+    // Маршрут приёма событий и /metrics не защищены, поэтому по умолчанию только localhost
+    const serverHost = process.env.VISUALIZER_HOST || '127.0.0.1';
+    app.listen(serverPort, serverHost, () => {
+        console.log(`Visualization server running on ${serverHost}:${serverPort}`);
+    }).on('error', (error: Error) => {
+        // Занятый порт не должен ронять процесс n8n: анализ работает и без визуализатора
+        console.error(`Visualization server failed to start on ${serverHost}:${serverPort}:`, error);
+    });
 }
 
 export class SixThinkingHats implements INodeType {
-    private visualizationServer: express.Express | null = null;
-
     description: INodeTypeDescription = {
         displayName: 'Six Thinking Hats',
         name: 'sixThinkingHats',
@@ -71,30 +87,41 @@ export class SixThinkingHats implements INodeType {
                 default: true,
                 description: 'Включить режим последовательного диалога между шляпами',
             },
+            {
+                displayName: 'Максимум раундов',
+                name: 'maxRounds',
+                type: 'number',
+                typeOptions: {
+                    minValue: 1,
+                },
+                default: 1,
+                description: 'Сколько раундов дебатов провести в режиме диалога; анализ завершается раньше, когда мнения сходятся',
+            },
+            {
+                displayName: 'Параллельно обрабатываемых элементов',
+                name: 'itemConcurrency',
+                type: 'number',
+                typeOptions: {
+                    minValue: 1,
+                },
+                default: 4,
+                description: 'Сколько входных элементов анализируется одновременно',
+            },
         ],
     };
 
-    private setupVisualizationServer() {
-        if (this.visualizationServer) return;
-
-        const app = express();
-        const visualizerPath = join(__dirname, 'web_visualizer');
-        app.use(express.static(visualizerPath));
-
-        const serverPort = Number(process.env.VISUALIZER_PORT || 3001);
-        app.listen(serverPort, '0.0.0.0', () => {
-            console.log(`Visualization server running on port ${serverPort}`);
-        });
-
-        this.visualizationServer = app;
-    }
-
     async execute(this: IExecuteFunctions): Promise<INodeExecutionData[][]> {
-        global.latestConversation = null;
         try {
-            const topic = this.getNodeParameter('topic', 0) as string;
-            const hatsOrder = this.getNodeParameter('hatsOrder', 0) as string[];
-            const dialogMode = this.getNodeParameter('dialogMode', 0) as boolean;
+            const items = this.getInputData();
+            const itemConcurrency = Math.max(1, this.getNodeParameter('itemConcurrency', 0, 4) as number);
+
+            // Read parameters for every input item up front
+            const jobs: IAnalysisJob[] = items.map((_, itemIndex) => ({
+                topic: this.getNodeParameter('topic', itemIndex) as string,
+                hats: this.getNodeParameter('hatsOrder', itemIndex) as string[],
+                dialogMode: this.getNodeParameter('dialogMode', itemIndex) as boolean,
+                maxRounds: this.getNodeParameter('maxRounds', itemIndex, 1) as number,
+            }));
 
             // Validate API key
             const apiKey = process.env.ANTHROPIC_API_KEY;
@@ -102,53 +129,51 @@ export class SixThinkingHats implements INodeType {
                 throw new Error('ANTHROPIC_API_KEY не найден в переменных окружения');
             }
 
-            // Spawn Python process for analysis
-            const pythonScript = join(__dirname, 'six_hats_prompt.py');
-            const pythonProcess = spawn('python', [
-                pythonScript,
-                '--topic', topic,
-                '--hats', JSON.stringify(hatsOrder),
-                '--dialog-mode', String(dialogMode),
-            ]);
-
-            return new Promise((resolve, reject) => {
-                let outputData = '';
-                let errorData = '';
-
-                pythonProcess.stdout.on('data', (data) => {
-                    outputData += data.toString();
-                });
-
-                pythonProcess.stderr.on('data', (data) => {
-                    errorData += data.toString();
-                });
+            // Start the visualizer first so browsers can follow the runs live
+            setupVisualizationServer();
+            const executionId = this.getExecutionId();
 
-                pythonProcess.on('close', (code) => {
-                    if (code !== 0) {
-                        reject(new Error(`Ошибка Python процесса: ${errorData}`));
-                        return;
-                    }
+            // Stream the jobs to the long-lived Python worker, at most itemConcurrency at a time
+            const pythonScript = join(__dirname, 'six_hats_prompt.py');
+            const worker = getPythonWorker(pythonScript);
+            const results: IAnalysisResult[] = new Array(jobs.length);
+            let nextItem = 0;
 
+            const runNext = async (): Promise<void> => {
+                while (nextItem < jobs.length) {
+                    const itemIndex = nextItem++;
+                    const runId = `${executionId}-${itemIndex}`;
+                    visualizerStore.startRun(runId, jobs[itemIndex].topic);
                     try {
-                        const result = JSON.parse(outputData) as IAnalysisResult;
-                        if (result.status === 'success') {
-                            global.latestConversation = result;
-                            // Get instance reference and call visualization server setup
-                            const nodeInstance = this as unknown as SixThinkingHats;
-                            nodeInstance.setupVisualizationServer();
-                        }
-                        const returnData: INodeExecutionData[] = [{
-                            json: result as unknown as IDataObject,
-                        }];
-                        resolve([returnData]);
+                        results[itemIndex] = await worker.analyze(
+                            { ...jobs[itemIndex], runId },
+                            (event) => visualizerStore.handleEvent(runId, event),
+                        );
                     } catch (error: unknown) {
-                        const errorMessage = error instanceof Error 
-                            ? error.message 
-                            : 'Неизвестная ошибка при обработке вывода Python';
-                        reject(new Error(`Ошибка обработки вывода Python: ${errorMessage}`));
+                        // A failure of the worker itself only fails the items it was serving
+                        results[itemIndex] = {
+                            status: 'error',
+                            error: error instanceof Error ? error.message : String(error),
+                            conversation: [],
+                        };
                     }
+                    visualizerStore.finishRun(runId, results[itemIndex]);
+                }
+            };
+            await Promise.all(Array.from({ length: Math.min(itemConcurrency, jobs.length) }, runNext));
+
+            // Map results back to their source items in order
+            const returnData: INodeExecutionData[] = [];
+            results.forEach((result, itemIndex) => {
+                if (result.status !== 'success' && !this.continueOnFail()) {
+                    throw new Error(`Элемент ${itemIndex}: ${result.error}`);
+                }
+                returnData.push({
+                    json: result as unknown as IDataObject,
+                    pairedItem: { item: itemIndex },
                 });
             });
+            return [returnData];
         } catch (error: unknown) {
             const errorMessage = error instanceof Error 
                 ? error.message 
@@ -0,0 +1,362 @@
+"""
+Offline benchmarks for the analyzer, the dialogue history and the console formatter.
+
+Runs entirely against MockBackend, so no API key or network is needed, and writes
+one JSON document that can be diffed between commits:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --sizes 10,1000 --runs 3 --skip startup
+"""
+import io
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from hat_handlers import HatManager, Message
+from model_backends import MockBackend
+from null_formatter import NullFormatter
+from request_scheduler import RequestScheduler
+from six_hats_prompt import BLUE_STEPS, SixHatsAnalyzer
+
+HATS = ['white', 'red', 'black', 'yellow', 'green', 'blue']
+SUITES = ('analyzer', 'blue_step', 'render', 'history', 'formatter', 'startup')
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def summarize(samples: List[float]) -> Dict:
+    """
+    Reduces timing samples (seconds) to milliseconds statistics
+    """
+    ordered = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    return {
+        'runs': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': round(percentile(50) * 1000, 3),
+        'p95_ms': round(percentile(95) * 1000, 3),
+        'min_ms': round(ordered[0] * 1000, 3)
+    }
+
+def measure(fn: Callable[[], object], runs: int) -> Dict:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def build_manager(size: int) -> HatManager:
+    """
+    Builds a dialogue of size messages in rounds of one turn per hat. A round
+    opens a new thread and each later turn of it answers the one before, so the
+    reply tree stays as shallow as a real run's (one round deep) however long
+    the dialogue gets.
+    """
+    manager = HatManager()
+    last_id = None
+    for i in range(size):
+        hat = manager.get_hat(HATS[i % len(HATS)])
+        hat.add_message(f"Message {i} about the topic", last_id if i % len(HATS) else None)
+        last_id = hat.messages[-1].id
+    return manager
+
+def build_records(size: int, as_dicts: bool) -> List:
+    """
+    Builds the messages of build_manager's dialogue on their own, either as
+    Message records or as the per-message dicts they replaced
+    """
+    records = []
+    counts: Dict[str, int] = {}
+    last_id = None
+    for i in range(size):
+        color = HATS[i % len(HATS)]
+        seq = counts.get(color, 0)
+        counts[color] = seq + 1
+        content = f"Message {i} about the topic"
+        response_to = last_id if i % len(HATS) else None
+        if as_dicts:
+            record = {
+                'id': f"{color}_{seq}",
+                'hat': color,
+                'content': content,
+                'timestamp': datetime.now().isoformat(),
+                'response_to': response_to
+            }
+            last_id = record['id']
+        else:
+            record = Message(color, seq, content, time.monotonic(), response_to)
+            last_id = record.id
+        records.append(record)
+    return records
+
+def peak_memory(fn: Callable[[], object]) -> int:
+    """
+    Returns the peak bytes allocated while fn runs, including what it returns
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_records(size: int, runs: int) -> Dict:
+    """
+    Compares Message records with per-message dicts: peak memory of building
+    the dialogue, build time and JSON export time
+    """
+    results = {}
+    for name, as_dicts in (('dict', True), ('message', False)):
+        records = build_records(size, as_dicts)
+        export = (lambda: records) if as_dicts else (lambda: [record.to_dict() for record in records])
+        results[name] = {
+            'peak_bytes': peak_memory(lambda: build_records(size, as_dicts)),
+            'build': measure(lambda: build_records(size, as_dicts), runs),
+            'export_json': measure(lambda: json.dumps(export()), runs)
+        }
+    results['message_vs_dict_memory'] = round(results['message']['peak_bytes'] / results['dict']['peak_bytes'], 3)
+    return results
+
+async def bench_analyzer_run(
+    scenario: Dict,
+    backend_options: Dict,
+    runs: int
+) -> Dict:
+    """
+    Times full analyze_topic runs and each hat's latency (hat_start to hat_end)
+    """
+    totals = []
+    per_hat: Dict[str, List[float]] = {}
+    calls = 0
+    for _ in range(runs):
+        # A fresh backend per run keeps failure injection identical between runs
+        backend = MockBackend(**backend_options)
+        started: Dict[str, float] = {}
+
+        def on_event(event: Dict) -> None:
+            if event['event'] == 'hat_start':
+                started[event['hat']] = time.perf_counter()
+            elif event['event'] == 'hat_end':
+                per_hat.setdefault(event['hat'], []).append(time.perf_counter() - started[event['hat']])
+
+        analyzer = SixHatsAnalyzer(
+            client=backend,
+            console=scenario.get('console', NullFormatter)(),
+            max_concurrency=scenario['concurrency'],
+            on_event=on_event,
+            scheduler=RequestScheduler(base_delay=0.01),
+            blue_step=scenario.get('blue_step', 'two-call')
+        )
+        start = time.perf_counter()
+        result = await analyzer.analyze_topic('Benchmark topic', scenario['hats'], scenario['dialog_mode'])
+        totals.append(time.perf_counter() - start)
+        if result['status'] != 'success':
+            raise RuntimeError(f"Benchmark run failed: {result.get('error')}")
+        calls += backend.calls
+
+    return {
+        'total': summarize(totals),
+        'model_calls_per_run': calls / runs,
+        'per_hat': {hat: summarize(samples) for hat, samples in per_hat.items()}
+    }
+
+def bench_analyzer(runs: int, backend_options: Dict) -> Dict:
+    scenarios = {
+        'sequential_dialog': {'hats': HATS, 'dialog_mode': True, 'concurrency': 1},
+        'scheduled_dialog': {'hats': HATS, 'dialog_mode': True, 'concurrency': 4},
+        'fan_out': {'hats': HATS, 'dialog_mode': False, 'concurrency': 4},
+        'two_rounds_dialog': {'hats': HATS * 2, 'dialog_mode': True, 'concurrency': 1},
+    }
+    results = {
+        name: asyncio.run(bench_analyzer_run(scenario, backend_options, runs))
+        for name, scenario in scenarios.items()
+    }
+    if backend_options.get('failure_rate', 0) == 0:
+        flaky = dict(backend_options, failure_rate=0.3)
+        results['sequential_dialog_flaky'] = asyncio.run(
+            bench_analyzer_run(scenarios['sequential_dialog'], flaky, runs)
+        )
+    return results
+
+def bench_blue_step(runs: int, backend_options: Dict) -> Dict:
+    """
+    Compares how Blue turns get their focus, in dialogues where Blue follows
+    other hats; with rich rendering into memory there is work for a speculative
+    focus call to overlap
+    """
+    consoles = {'headless': NullFormatter}
+    try:
+        from rich.console import Console
+        from console_formatter import ConsoleFormatter
+        consoles['rendered'] = lambda: ConsoleFormatter(Console(file=io.StringIO(), width=120, force_terminal=True))
+    except ImportError:
+        pass
+
+    dialogues = {
+        'sequential': {'hats': HATS, 'dialog_mode': True, 'concurrency': 1},
+        'two_blue_turns': {'hats': HATS[:3] + ['blue'] + HATS[3:], 'dialog_mode': True, 'concurrency': 1},
+        'fan_out': {'hats': HATS, 'dialog_mode': False, 'concurrency': 4},
+    }
+    results = {}
+    for console_name, console in consoles.items():
+        for dialogue_name, dialogue in dialogues.items():
+            for blue_step in BLUE_STEPS:
+                scenario = dict(dialogue, console=console, blue_step=blue_step)
+                name = f"{dialogue_name}_{console_name}_{blue_step}"
+                results[name] = asyncio.run(bench_analyzer_run(scenario, backend_options, runs))
+    return results
+
+def bench_render(runs: int, backend_options: Dict) -> Dict:
+    """
+    Compares rendering inline in the analysis with the background render queue
+    """
+    try:
+        from rich.console import Console
+        from console_formatter import ConsoleFormatter
+        from render_queue import BackgroundRenderer
+    except ImportError:
+        return {}
+
+    def formatter() -> ConsoleFormatter:
+        return ConsoleFormatter(Console(file=io.StringIO(), width=120, force_terminal=True))
+
+    consoles = {'inline': formatter, 'background': lambda: BackgroundRenderer(formatter())}
+    dialogues = {
+        'sequential': {'hats': HATS, 'dialog_mode': True, 'concurrency': 1},
+        'fan_out': {'hats': HATS, 'dialog_mode': False, 'concurrency': 4},
+    }
+    results = {}
+    for dialogue_name, dialogue in dialogues.items():
+        for console_name, console in consoles.items():
+            scenario = dict(dialogue, console=console)
+            results[f"{dialogue_name}_{console_name}"] = asyncio.run(bench_analyzer_run(scenario, backend_options, runs))
+    return results
+
+def bench_history(sizes: List[int], runs: int) -> Dict:
+    """
+    Times HatManager operations at each dialogue size
+    """
+    results = {}
+    for size in sizes:
+        manager = build_manager(size)
+        ids = [message.id for message in manager.get_dialogue_history()]
+        lookups = ids[::max(1, size // 1000)]
+        results[str(size)] = {
+            'build': measure(lambda: build_manager(size), runs),
+            'history': measure(manager.get_dialogue_history, runs),
+            'last_message': measure(manager.get_last_message, runs),
+            'lookup_1k': measure(lambda: [manager.get_message(i) for i in lookups], runs),
+            'context_for_response': measure(lambda: [hat.get_context_for_response() for hat in manager.hats.values()], runs),
+            'export': measure(manager.export_dialogue, runs),
+            'export_json': measure(lambda: json.dumps(manager.export_dialogue()), runs),
+            'records': bench_records(size, runs)
+        }
+    return results
+
+def bench_formatter(sizes: List[int], runs: int) -> Dict:
+    """
+    Times ConsoleFormatter rendering into an in-memory console
+    """
+    try:
+        from rich.console import Console
+        from console_formatter import ConsoleFormatter
+    except ImportError:
+        return {'skipped': 'rich is not installed'}
+
+    def formatter() -> ConsoleFormatter:
+        return ConsoleFormatter(Console(file=io.StringIO(), width=120, force_terminal=True))
+
+    results = {}
+    for size in sizes:
+        history = build_manager(size).get_dialogue_history()
+        # Rendering every message of a 100k dialogue is not a realistic workload
+        sample = history[-min(size, 50):]
+        results[str(size)] = {
+            'print_message': measure(lambda: [formatter().print_message(message) for message in sample], runs),
+            'print_message_count': len(sample),
+            'dialogue_tree': measure(lambda: formatter().print_dialogue_tree(history), runs),
+            'statistics': measure(lambda: formatter().print_analysis_statistics(history), runs)
+        }
+    return results
+
+def bench_startup(runs: int) -> Dict:
+    """
+    Times interpreter start plus import, and worker start until its first result
+    """
+    env = dict(os.environ, SIX_HATS_BACKEND='mock', SIX_HATS_MOCK_LATENCY='0')
+    script = os.path.join(SCRIPT_DIR, 'six_hats_prompt.py')
+    job = json.dumps({'topic': 'Startup', 'hats': ['white'], 'dialog_mode': False}) + "\n"
+
+    def import_only():
+        subprocess.run([sys.executable, '-c', 'import six_hats_prompt'], cwd=SCRIPT_DIR, env=env, check=True)
+
+    def first_result():
+        subprocess.run(
+            [sys.executable, script, '--worker', '--headless', '--no-cache'],
+            input=job.encode('utf-8'), cwd=SCRIPT_DIR, env=env, check=True, capture_output=True
+        )
+
+    return {
+        'import': measure(import_only, runs),
+        'worker_first_result': measure(first_result, runs)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks against the mock model backend')
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    parser.add_argument('--runs', type=int, default=5, help='Repetitions per measurement')
+    parser.add_argument('--sizes', default='10,1000,100000', help='Dialogue sizes for history and formatter suites')
+    parser.add_argument('--skip', default='', help='Comma-separated suites to skip: ' + ', '.join(SUITES))
+    parser.add_argument('--latency', type=float, default=0.02, help='Mock time to first token, seconds')
+    parser.add_argument('--tokens-per-second', type=float, default=2000.0, help='Mock generation rate')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of mock calls that fail transiently')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    skip = {suite for suite in args.skip.split(',') if suite}
+    backend_options = {
+        'latency': args.latency,
+        'tokens_per_second': args.tokens_per_second,
+        'failure_rate': args.failure_rate
+    }
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'runs': args.runs, 'sizes': sizes, 'mock_backend': backend_options},
+        'results': {}
+    }
+    suites = {
+        'analyzer': lambda: bench_analyzer(args.runs, backend_options),
+        'blue_step': lambda: bench_blue_step(args.runs, backend_options),
+        'render': lambda: bench_render(args.runs, backend_options),
+        'history': lambda: bench_history(sizes, args.runs),
+        'formatter': lambda: bench_formatter(sizes, args.runs),
+        'startup': lambda: bench_startup(args.runs),
+    }
+    for name, run in suites.items():
+        if name not in skip:
+            print(f"Running {name} benchmarks...", file=sys.stderr)
+            report['results'][name] = run()
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,18 @@
-from typing import List, Dict
-from rich.console import Console
+import math
+from typing import List, Dict, Optional, Tuple
+from rich.console import Console, Group
 from rich.panel import Panel
 from rich.text import Text
 from rich.table import Table
-from rich.layout import Layout
 from rich.tree import Tree
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeElapsedColumn
 from datetime import datetime
-from collections import Counter
+from collections import Counter, defaultdict
+from hat_handlers import Message
 
 class ConsoleFormatter:
-    def __init__(self):
-        self.console = Console()
+    def __init__(self, console: Optional[Console] = None):
+        self.console = console or Console()
         self.hat_colors = {
             'blue': '#0000FF',
             'white': '#FFFFFF',
@@ -34,6 +35,9 @@ class ConsoleFormatter:
             BarColumn(),
             TextColumn("[progress.percentage]{task.percentage:>3.0f}%"),
             TimeElapsedColumn(),
+            console=self.console,
+            # Stream mode writes JSON to stdout while the bar is shown
+            redirect_stdout=False,
         )
 
     def print_header(self, topic: str) -> None:
@@ -61,22 +65,22 @@ class ConsoleFormatter:
             )
         )
 
-    def print_message(self, message: Dict) -> None:
+    def print_message(self, message: Message) -> None:
         """
         Prints a message from a specific hat with context
         """
-        hat_color = message['hat']
-        content = message['content']
-        response_to = message.get('response_to')
+        hat_color = message.hat
+        content = message.content
+        response_to = message.response_to
         emoji = self.hat_emoji.get(hat_color, '🎩')
         color = self.hat_colors.get(hat_color, 'white')
 
-        # Create a nested layout for the message
-        message_layout = Layout()
+        # Collect the panels for the message
+        panels = []
 
         # Add response context if this is a reply
         if response_to:
-            message_layout.add(
+            panels.append(
                 Panel(
                     Text(f"Responding to: {response_to}", style="dim"),
                     border_style="dim",
@@ -85,71 +89,68 @@ class ConsoleFormatter:
             )
 
         # Add the main message
-        message_layout.add(
+        panels.append(
             Panel(
                 Text(content, style=color),
                 title=f"{emoji} {hat_color.upper()} Hat",
                 title_align="left",
                 border_style=color,
-                subtitle=f"Message ID: {message['id']} | {datetime.fromisoformat(message['timestamp']).strftime('%H:%M:%S')}"
+                subtitle=f"Message ID: {message.id} | {message.wall_time().strftime('%H:%M:%S')}"
             )
         )
 
-        self.console.print(message_layout)
+        # Stack the panels at their natural height; a Layout would fill the
+        # whole terminal height for every message
+        self.console.print(Group(*panels))
 
-    def print_dialogue_tree(self, conversation_history: List[Dict]) -> None:
+    def print_dialogue_tree(self, conversation_history: List[Message]) -> None:
         """
         Prints the dialogue as a tree structure
         """
         tree = Tree("🎭 Dialogue Flow")
+        ids = {msg.id for msg in conversation_history}
 
-        # Create message lookup for faster access
-        message_lookup = {msg['id']: msg for msg in conversation_history}
-
-        # Find root messages (no response_to)
-        root_messages = [msg for msg in conversation_history if not msg.get('response_to')]
+        # Map each message to its replies once; replies to unknown messages become roots
+        children: Dict[Optional[str], List[Message]] = defaultdict(list)
+        for msg in conversation_history:
+            parent_id = msg.response_to
+            children[parent_id if parent_id in ids else None].append(msg)
 
-        for root_msg in root_messages:
-            self._add_message_to_tree(tree, root_msg, message_lookup, conversation_history)
+        # Walk the tree iteratively so long reply chains cannot hit the recursion limit
+        stack = [(tree, msg) for msg in reversed(children[None])]
+        while stack:
+            parent, message = stack.pop()
+            node = parent.add(self.message_label(message))
+            stack.extend((node, reply) for reply in reversed(children.get(message.id, ())))
 
         self.console.print(tree)
 
-    def _add_message_to_tree(self, parent: Tree, message: Dict, lookup: Dict, all_messages: List[Dict]) -> None:
+    def message_label(self, message: Message) -> str:
         """
-        Recursively adds messages to the tree
+        Builds the one-line label of a message used in the dialogue tree
         """
-        color = self.hat_colors.get(message['hat'], 'white')
-        emoji = self.hat_emoji.get(message['hat'], '🎩')
+        color = self.hat_colors.get(message.hat, 'white')
+        emoji = self.hat_emoji.get(message.hat, '🎩')
 
         # Create node label
-        time = datetime.fromisoformat(message['timestamp']).strftime("%H:%M:%S")
-        content_preview = message['content'][:50] + "..." if len(message['content']) > 50 else message['content']
-        label = f"{emoji} [{color}]{message['hat'].upper()}[/] ({time}): {content_preview}"
-
-        # Add node to tree
-        node = parent.add(label)
+        time = message.wall_time().strftime("%H:%M:%S")
+        content_preview = message.content[:50] + "..." if len(message.content) > 50 else message.content
+        return f"{emoji} [{color}]{message.hat.upper()}[/] ({time}): {content_preview}"
 
-        # Find and add replies
-        replies = [msg for msg in all_messages if msg.get('response_to') == message['id']]
-        for reply in replies:
-            self._add_message_to_tree(node, reply, lookup, all_messages)
-
-    def print_analysis_statistics(self, conversation_history: List[Dict]) -> None:
+    def print_analysis_statistics(self, conversation_history: List[Message]) -> None:
         """
         Prints statistics about the dialogue
         """
         # Count messages per hat
-        hat_counts = Counter(msg['hat'] for msg in conversation_history)
+        hat_counts = Counter(msg.hat for msg in conversation_history)
 
-        # Calculate response times
-        response_times = []
+        # Calculate response times from the monotonic timestamps
+        times = {msg.id: msg.timestamp for msg in conversation_history}
+        response_times: Dict[str, List[float]] = defaultdict(list)
         for msg in conversation_history:
-            if msg.get('response_to'):
-                response_to = next((m for m in conversation_history if m['id'] == msg['response_to']), None)
-                if response_to:
-                    time_diff = (datetime.fromisoformat(msg['timestamp']) - 
-                               datetime.fromisoformat(response_to['timestamp'])).total_seconds()
-                    response_times.append(time_diff)
+            parent_time = times.get(msg.response_to)
+            if parent_time is not None:
+                response_times[msg.hat].append(msg.timestamp - parent_time)
 
         # Create statistics table
         table = Table(
@@ -161,6 +162,9 @@ class ConsoleFormatter:
         table.add_column("Hat", style="bold")
         table.add_column("Messages", justify="right")
         table.add_column("Participation", justify="right")
+        table.add_column("Mean response", justify="right")
+        table.add_column("p50", justify="right")
+        table.add_column("p95", justify="right")
 
         total_messages = len(conversation_history)
         for hat, count in hat_counts.items():
@@ -169,11 +173,40 @@ class ConsoleFormatter:
             table.add_row(
                 f"{emoji} {hat.upper()}",
                 str(count),
-                f"{percentage:.1f}%"
+                f"{percentage:.1f}%",
+                *self._format_response_times(response_times.get(hat, []))
             )
 
+        all_response_times = [t for times_for_hat in response_times.values() for t in times_for_hat]
+        table.add_section()
+        table.add_row(
+            "ALL",
+            str(total_messages),
+            "100.0%" if total_messages else "-",
+            *self._format_response_times(all_response_times)
+        )
+
         self.console.print(table)
 
+    @staticmethod
+    def _format_response_times(values: List[float]) -> Tuple[str, str, str]:
+        """
+        Formats mean, p50 and p95 (nearest rank) of response times in seconds
+        """
+        if not values:
+            return "-", "-", "-"
+        ordered = sorted(values)
+
+        def percentile(p: float) -> float:
+            rank = max(1, math.ceil(p / 100 * len(ordered)))
+            return ordered[rank - 1]
+
+        return (
+            f"{sum(ordered) / len(ordered):.2f}s",
+            f"{percentile(50):.2f}s",
+            f"{percentile(95):.2f}s"
+        )
+
     def create_progress_tracker(self, total_steps: int) -> None:
         """
         Creates a progress tracker for the analysis process
@@ -219,7 +252,7 @@ class ConsoleFormatter:
             )
         )
 
-    def print_dialogue_summary(self, conversation_history: List[Dict]) -> None:
+    def print_dialogue_summary(self, conversation_history: List[Message]) -> None:
         """
         Prints an interactive summary of the dialogue
         """
@@ -235,10 +268,10 @@ class ConsoleFormatter:
         table.add_column("Response To", style="dim")
 
         for message in conversation_history:
-            time = datetime.fromisoformat(message['timestamp']).strftime("%H:%M:%S")
-            hat = message['hat'].upper()
-            content = message['content'][:50] + "..." if len(message['content']) > 50 else message['content']
-            response_to = message.get('response_to', '-')
+            time = message.wall_time().strftime("%H:%M:%S")
+            hat = message.hat.upper()
+            content = message.content[:50] + "..." if len(message.content) > 50 else message.content
+            response_to = message.response_to or '-'
 
             table.add_row(
                 time,
@@ -0,0 +1,181 @@
+import re
+from collections import deque
+from itertools import chain
+from typing import Deque, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from hat_handlers import DialogueLog, Message
+
+DEFAULT_CONTEXT_TOKENS = 2000
+
+_SENTENCE_END = re.compile(r'(?<=[.!?…])\s')
+_WHITESPACE = re.compile(r'\s+')
+
+def count_tokens(text: str) -> int:
+    """
+    Local token estimate: about four bytes of UTF-8 per token, which keeps
+    Cyrillic text (two bytes per letter) from being undercounted
+    """
+    return (len(text.encode('utf-8')) + 3) // 4
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cuts text down to roughly max_tokens
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    cut = text.encode('utf-8')[:max(0, max_tokens * 4 - 3)].decode('utf-8', errors='ignore')
+    return cut.rstrip() + '…'
+
+class ContextBuilder:
+    """
+    Builds the discussion context for the next turn within a token budget.
+
+    The most recent messages of every hat are kept verbatim. Messages that no
+    longer fit are folded, oldest first, into a rolling summary of one short
+    digest per message; each message is digested once and the summary is only
+    extended, never rebuilt, and drops its oldest digests when it outgrows its
+    share of the budget.
+    """
+
+    def __init__(
+        self,
+        dialogue_log: "DialogueLog",
+        max_tokens: int = DEFAULT_CONTEXT_TOKENS,
+        summary_share: float = 0.3,
+        digest_tokens: int = 40
+    ):
+        self.dialogue_log = dialogue_log
+        self.max_tokens = max_tokens
+        self.summary_tokens = int(max_tokens * summary_share)
+        self.digest_tokens = digest_tokens
+        # Token counts of rendered messages, by message ID
+        self._line_tokens: Dict[str, int] = {}
+        # Rolling summary: digest lines with their token counts, and how many log
+        # messages have been folded into it
+        self._summary: Deque[Tuple[str, int]] = deque()
+        self._summary_total = 0
+        self._folded = 0
+        self._summary_text: Optional[str] = None
+        # Digests of a warm start, kept for contexts built without the rolling summary
+        self._warm: List[Tuple[str, int]] = []
+
+    @staticmethod
+    def render(message: "Message") -> str:
+        return f"{message.hat.upper()} hat: {message.content}"
+
+    def build(self, end: Optional[int] = None) -> str:
+        """
+        Returns the context for the next turn: the rolling summary of older
+        messages followed by the newest messages verbatim. end limits it to the
+        first end messages of the log.
+        """
+        messages = self.dialogue_log.messages
+        end = len(messages) if end is None else min(end, len(messages))
+        if end < self._folded:
+            # The rolling summary already covers messages after end
+            return self._build_detached(end)
+        if end == 0:
+            return self._rolling_summary()
+
+        verbatim_budget = self.max_tokens - (self.summary_tokens if end > 1 or self._summary else 0)
+        start, used = self._recent_start(end, self._folded, verbatim_budget)
+
+        # The boundary only moves forward as messages are added, so older
+        # messages are folded exactly once
+        for message in messages[self._folded:start]:
+            self._fold(self._digest(message))
+        self._folded = start
+
+        return self._join(self._rolling_summary(), messages[start:end], used, verbatim_budget)
+
+    def warm_start(self, messages: List["Message"]) -> None:
+        """
+        Seeds the rolling summary with digests of an earlier analysis of a
+        similar topic; as the new discussion is folded in they are dropped first
+        """
+        for message in messages:
+            digest = self._digest(message, " (earlier analysis)")
+            self._warm.append(digest)
+            self._fold(digest)
+
+    def _build_detached(self, end: int) -> str:
+        """
+        Builds the context of the first end messages without touching the
+        rolling summary: the summary of the messages before the verbatim ones
+        is digested again, newest first, until it reaches its share
+        """
+        messages = self.dialogue_log.messages
+        verbatim_budget = self.max_tokens - (self.summary_tokens if end > 1 or self._warm else 0)
+        start, used = self._recent_start(end, 0, verbatim_budget)
+
+        kept: List[str] = []
+        total = 0
+        digests = chain((self._digest(message) for message in reversed(messages[:start])), reversed(self._warm))
+        for digest, tokens in digests:
+            if kept and total + tokens > self.summary_tokens:
+                break
+            kept.append(digest)
+            total += tokens
+        summary = "Earlier discussion (summarized):\n" + "\n".join(reversed(kept)) if kept else ""
+        return self._join(summary, messages[start:end], used, verbatim_budget)
+
+    def _recent_start(self, end: int, floor: int, verbatim_budget: int) -> Tuple[int, int]:
+        """
+        Walks back from message end while the verbatim budget lasts, never past
+        floor; returns the first verbatim message and the tokens used. The newest
+        message is always kept.
+        """
+        messages = self.dialogue_log.messages
+        start = end
+        used = 0
+        while start > floor:
+            tokens = self._tokens(messages[start - 1])
+            if used + tokens > verbatim_budget and start < end:
+                break
+            used += tokens
+            start -= 1
+        return start, used
+
+    def _join(self, summary: str, recent: List["Message"], used: int, verbatim_budget: int) -> str:
+        lines = [self.render(message) for message in recent]
+        if len(lines) == 1 and used > verbatim_budget:
+            lines[0] = truncate_to_tokens(lines[0], verbatim_budget)
+        if summary and lines:
+            return f"{summary}\n\nRecent discussion:\n" + "\n".join(lines)
+        return summary or "\n".join(lines)
+
+    def _tokens(self, message: "Message") -> int:
+        tokens = self._line_tokens.get(message.id)
+        if tokens is None:
+            tokens = count_tokens(self.render(message))
+            self._line_tokens[message.id] = tokens
+        return tokens
+
+    def _digest(self, message: "Message", source: str = "") -> Tuple[str, int]:
+        """
+        Returns a message's one-line digest and its token count
+        """
+        text = _WHITESPACE.sub(' ', message.content).strip()
+        first_sentence = _SENTENCE_END.split(text, 1)[0]
+        digest = f"- {message.hat.upper()} hat{source}: {truncate_to_tokens(first_sentence, self.digest_tokens)}"
+        return digest, count_tokens(digest)
+
+    def _fold(self, digest: Tuple[str, int]) -> None:
+        """
+        Adds a message's digest to the rolling summary
+        """
+        self._summary.append(digest)
+        _, tokens = digest
+        self._summary_total += tokens
+        while self._summary_total > self.summary_tokens and len(self._summary) > 1:
+            _, dropped = self._summary.popleft()
+            self._summary_total -= dropped
+        self._summary_text = None
+
+    def _rolling_summary(self) -> str:
+        if not self._summary:
+            return ""
+        if self._summary_text is None:
+            self._summary_text = "Earlier discussion (summarized):\n" + "\n".join(line for line, _ in self._summary)
+        return self._summary_text
@@ -0,0 +1,157 @@
+import re
+import zlib
+import logging
+from typing import Dict, FrozenSet, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from six_hats_prompt import SixHatsAnalyzer
+
+logger = logging.getLogger(__name__)
+
+# Consecutive Blue summaries (or a hat's consecutive contributions) at least this
+# similar count as unchanged
+DEFAULT_CONVERGENCE_THRESHOLD = 0.8
+# A round adding less than this share of previously unseen content ends the debate
+DEFAULT_MIN_NOVELTY = 0.15
+
+_WORD = re.compile(r'\w+')
+
+def shingles(text: str, size: int = 3) -> FrozenSet[int]:
+    """
+    Hashes the overlapping word n-grams of normalized text
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return frozenset([zlib.crc32(' '.join(words).encode('utf-8'))]) if words else frozenset()
+    return frozenset(
+        zlib.crc32(' '.join(words[i:i + size]).encode('utf-8'))
+        for i in range(len(words) - size + 1)
+    )
+
+def similarity(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+    """
+    Jaccard similarity of two shingle sets
+    """
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+class ConvergenceTracker:
+    """
+    Compares each round with the previous one using local shingle similarity,
+    so deciding to stop costs no model calls
+    """
+
+    def __init__(self, threshold: float = DEFAULT_CONVERGENCE_THRESHOLD, min_novelty: float = DEFAULT_MIN_NOVELTY):
+        self.threshold = threshold
+        self.min_novelty = min_novelty
+        self.seen: set = set()
+        self.last_by_hat: Dict[str, FrozenSet[int]] = {}
+        self.last_summary: Optional[FrozenSet[int]] = None
+
+    def observe_round(self, contributions: Dict[str, str]) -> Dict:
+        """
+        Takes the round's latest contribution per hat and returns how much it
+        changed: Blue summary similarity, share of new content and the hats
+        whose contributions stopped changing
+        """
+        round_shingles = {hat: shingles(text) for hat, text in contributions.items()}
+
+        combined = frozenset().union(*round_shingles.values()) if round_shingles else frozenset()
+        novelty = len(combined - self.seen) / len(combined) if combined else 0.0
+        self.seen |= combined
+
+        settled = []
+        for hat, current in round_shingles.items():
+            previous = self.last_by_hat.get(hat)
+            if hat != 'blue' and previous is not None and similarity(previous, current) >= self.threshold:
+                settled.append(hat)
+            self.last_by_hat[hat] = current
+
+        summary_similarity = None
+        if 'blue' in round_shingles:
+            if self.last_summary is not None:
+                summary_similarity = similarity(self.last_summary, round_shingles['blue'])
+            self.last_summary = round_shingles['blue']
+
+        return {
+            'novelty': round(novelty, 3),
+            'summary_similarity': round(summary_similarity, 3) if summary_similarity is not None else None,
+            'settled': settled
+        }
+
+class DebateEngine:
+    """
+    Runs up to max_rounds passes over the hats. Between rounds it checks for
+    convergence and stops early when Blue's summary stops changing, a round
+    adds too little new content, or every hat has settled; settled hats are
+    skipped in later rounds.
+    """
+
+    def __init__(self, analyzer: "SixHatsAnalyzer", max_rounds: int, tracker: Optional[ConvergenceTracker] = None):
+        self.analyzer = analyzer
+        self.max_rounds = max(1, max_rounds)
+        self.tracker = tracker or ConvergenceTracker()
+
+    async def run(
+        self,
+        topic: str,
+        hats_order: List[str],
+        dialog_mode: bool,
+        progress_task: int,
+        resumed: int = 0
+    ) -> Dict:
+        """
+        Runs the rounds; the first resumed messages of the log were restored from
+        a journal, and the rounds they cover are replayed without model calls
+        """
+        log = self.analyzer.hat_manager.dialogue_log
+        settled: set = set()
+        rounds: List[Dict] = []
+        stop_reason = 'max_rounds'
+        start = len(log) - resumed
+        restored_end = len(log)
+
+        for round_number in range(1, self.max_rounds + 1):
+            round_hats = [hat for hat in hats_order if hat not in settled]
+            # Settling is decided from message contents, so replaying restored
+            # rounds reproduces the same hat lists
+            restored = log.messages[start:min(restored_end, start + len(round_hats))]
+            if len(restored) < len(round_hats):
+                await self.analyzer._run_round(topic, round_hats, dialog_mode, progress_task, restored)
+
+            end = start + len(round_hats)
+            contributions = {message.hat: message.content for message in log.messages[start:end]}
+            start = end
+            check = self.tracker.observe_round(contributions)
+            # Only hats that already spoke in an earlier round can settle
+            newly_settled = [hat for hat in check['settled'] if hat not in settled]
+            settled.update(newly_settled)
+            rounds.append({
+                'round': round_number,
+                'hats': round_hats,
+                'novelty': check['novelty'],
+                'summary_similarity': check['summary_similarity'],
+                'settled': newly_settled
+            })
+            logger.info(f"Round {round_number}: {rounds[-1]}")
+
+            if round_number == self.max_rounds:
+                break
+            similar = check['summary_similarity']
+            if similar is not None and similar >= self.tracker.threshold:
+                stop_reason = 'converged'
+                break
+            if round_number > 1 and check['novelty'] < self.tracker.min_novelty:
+                stop_reason = 'no_new_content'
+                break
+            if all(hat in settled for hat in hats_order if hat != 'blue'):
+                stop_reason = 'all_hats_settled'
+                break
+
+        return {
+            'rounds': len(rounds),
+            'max_rounds': self.max_rounds,
+            'stop_reason': stop_reason,
+            'history': rounds
+        }
@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import time
+import zlib
+import random
+import sqlite3
+import logging
+from array import array
+from typing import Dict, FrozenSet, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_DB = os.environ.get('SIX_HATS_HISTORY_DB')
+# Estimated Jaccard similarity of topic shingles at which a past run counts as
+# the same topic
+DEFAULT_DUPLICATE_THRESHOLD = 0.85
+# Only runs this recent (seconds) are offered for reuse
+DEFAULT_REUSE_MAX_AGE = 7 * 24 * 3600
+
+_WORD = re.compile(r'\w+')
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+def normalize_topic(topic: str) -> str:
+    """
+    Lowercases a topic and reduces it to its words, so punctuation, case and
+    spacing do not make two topics differ
+    """
+    return ' '.join(_WORD.findall(topic.lower()))
+
+def topic_shingles(normalized: str, size: int = 5) -> FrozenSet[int]:
+    """
+    Hashes the overlapping character n-grams of a normalized topic; topics are
+    too short for word n-grams to survive a single changed word
+    """
+    if len(normalized) <= size:
+        return frozenset([zlib.crc32(normalized.encode('utf-8'))]) if normalized else frozenset()
+    return frozenset(
+        zlib.crc32(normalized[i:i + size].encode('utf-8'))
+        for i in range(len(normalized) - size + 1)
+    )
+
+class MinHasher:
+    """
+    MinHash signatures whose agreement estimates the Jaccard similarity of two
+    shingle sets, split into bands for locality-sensitive lookup
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+        self.bands = bands
+        self.rows = num_perm // bands
+
+    def signature(self, shingles: FrozenSet[int]) -> List[int]:
+        if not shingles:
+            return [_MAX_HASH] * len(self.permutations)
+        return [min(((a * x + b) % _PRIME) & _MAX_HASH for x in shingles) for a, b in self.permutations]
+
+    def band_buckets(self, signature: List[int]) -> List[int]:
+        """
+        Returns one bucket per band; topics sharing any bucket are candidates
+        """
+        return [
+            zlib.crc32(array('I', signature[band * self.rows:(band + 1) * self.rows]).tobytes())
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def similarity(a: List[int], b: List[int]) -> float:
+        return sum(x == y for x, y in zip(a, b)) / len(a)
+
+class DecisionHistory:
+    """
+    Local SQLite store of completed analyses.
+
+    Every run is kept with its topic, hats order, messages and Blue summary. An
+    FTS5 index serves full-text search over past runs, and MinHash band buckets
+    of the normalized topic find near-duplicate topics with an indexed lookup
+    instead of a scan.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        duplicate_threshold: float = DEFAULT_DUPLICATE_THRESHOLD,
+        max_age: Optional[float] = DEFAULT_REUSE_MAX_AGE
+    ):
+        self.duplicate_threshold = duplicate_threshold
+        self.max_age = max_age
+        self.hasher = MinHasher()
+        self._db = sqlite3.connect(db_path)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, topic TEXT NOT NULL, normalized_topic TEXT NOT NULL, "
+                "hats_order TEXT NOT NULL, dialog_mode INTEGER NOT NULL, max_rounds INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, conversation TEXT NOT NULL, blue_summary TEXT, signature BLOB NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS runs_normalized_topic ON runs (normalized_topic)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS topic_bands ("
+                "band INTEGER NOT NULL, bucket INTEGER NOT NULL, run_id TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS topic_bands_lookup ON topic_bands (band, bucket)")
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS runs_fts USING fts5("
+                "run_id UNINDEXED, topic, messages, blue_summary, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+
+    def record(
+        self,
+        run_id: str,
+        topic: str,
+        hats_order: List[str],
+        dialog_mode: bool,
+        max_rounds: int,
+        conversation: List[Dict]
+    ) -> None:
+        """
+        Stores a completed run, replacing an earlier record of the same run
+        """
+        normalized = normalize_topic(topic)
+        signature = self.hasher.signature(topic_shingles(normalized))
+        blue_summary = next((m['content'] for m in reversed(conversation) if m['hat'] == 'blue'), None)
+        messages = "\n".join(f"{m['hat'].upper()} hat: {m['content']}" for m in conversation)
+
+        with self._db:
+            self._delete(run_id)
+            self._db.execute(
+                "INSERT INTO runs (run_id, topic, normalized_topic, hats_order, dialog_mode, max_rounds, "
+                "created_at, conversation, blue_summary, signature) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id, topic, normalized, json.dumps(hats_order), int(dialog_mode), max_rounds,
+                    time.time(), json.dumps(conversation, ensure_ascii=False), blue_summary,
+                    array('I', signature).tobytes()
+                )
+            )
+            self._db.executemany(
+                "INSERT INTO topic_bands (band, bucket, run_id) VALUES (?, ?, ?)",
+                [(band, bucket, run_id) for band, bucket in enumerate(self.hasher.band_buckets(signature))]
+            )
+            self._db.execute(
+                "INSERT INTO runs_fts (run_id, topic, messages, blue_summary) VALUES (?, ?, ?, ?)",
+                (run_id, topic, messages, blue_summary or "")
+            )
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Full-text search over topics, messages and Blue summaries, best matches
+        first. query may use FTS5 syntax; if it does not parse, its words are
+        searched for instead.
+        """
+        sql = (
+            "SELECT runs.run_id, runs.topic, runs.created_at, runs.blue_summary, "
+            "snippet(runs_fts, 2, '[', ']', '…', 12) AS snippet "
+            "FROM runs_fts JOIN runs ON runs.run_id = runs_fts.run_id "
+            "WHERE runs_fts MATCH ? ORDER BY runs_fts.rank LIMIT ?"
+        )
+        try:
+            rows = self._db.execute(sql, (query, limit)).fetchall()
+        except sqlite3.OperationalError:
+            words = _WORD.findall(query)
+            if not words:
+                return []
+            rows = self._db.execute(sql, (' '.join(f'"{word}"' for word in words), limit)).fetchall()
+        return [dict(row) for row in rows]
+
+    def find_similar(self, topic: str) -> Optional[Dict]:
+        """
+        Returns the most similar recent run whose topic is at least
+        duplicate_threshold similar, or None
+        """
+        normalized = normalize_topic(topic)
+        signature = self.hasher.signature(topic_shingles(normalized))
+        buckets = self.hasher.band_buckets(signature)
+        min_created = time.time() - self.max_age if self.max_age else 0.0
+
+        candidates = self._db.execute(
+            "SELECT * FROM runs WHERE created_at >= ? AND run_id IN ("
+            "SELECT run_id FROM topic_bands WHERE "
+            + " OR ".join("(band = ? AND bucket = ?)" for _ in buckets) + ")",
+            [min_created] + [value for band, bucket in enumerate(buckets) for value in (band, bucket)]
+        ).fetchall()
+
+        best = None
+        best_key = None
+        for row in candidates:
+            if row['normalized_topic'] == normalized:
+                similarity = 1.0
+            else:
+                similarity = MinHasher.similarity(signature, array('I', row['signature']).tolist())
+            key = (similarity, row['created_at'])
+            if similarity >= self.duplicate_threshold and (best_key is None or key > best_key):
+                best, best_key = row, key
+
+        if best is None:
+            return None
+        match = self._to_dict(best)
+        match['similarity'] = round(best_key[0], 3)
+        return match
+
+    def get(self, run_id: str) -> Optional[Dict]:
+        row = self._db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _delete(self, run_id: str) -> None:
+        self._db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+        self._db.execute("DELETE FROM topic_bands WHERE run_id = ?", (run_id,))
+        self._db.execute("DELETE FROM runs_fts WHERE run_id = ?", (run_id,))
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict:
+        return {
+            'run_id': row['run_id'],
+            'topic': row['topic'],
+            'hats_order': json.loads(row['hats_order']),
+            'dialog_mode': bool(row['dialog_mode']),
+            'max_rounds': row['max_rounds'],
+            'created_at': row['created_at'],
+            'conversation': json.loads(row['conversation']),
+            'blue_summary': row['blue_summary']
+        }
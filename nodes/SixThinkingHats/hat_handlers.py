@@ -1,35 +1,142 @@
+import sys
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import logging
 from abc import ABC, abstractmethod
+from context_builder import DEFAULT_CONTEXT_TOKENS, ContextBuilder
 
 logger = logging.getLogger(__name__)
 
+# Offset turning time.monotonic() readings into wall-clock epoch seconds
+_WALL_CLOCK_OFFSET = time.time() - time.monotonic()
+
+@dataclass(slots=True)
+class Message:
+    """
+    A single hat turn.
+
+    Stores a monotonic timestamp and the per-hat sequence number instead of an ISO
+    string and a formatted ID; both are only rendered by to_dict() at the output
+    boundary, which produces the JSON shape the node and visualizer expect.
+    """
+    hat: str
+    seq: int
+    content: str
+    timestamp: float
+    response_to: Optional[str] = None
+    # How the response was produced: model tier ("cache" for cache hits), model
+    # and call latency
+    tier: Optional[str] = None
+    model: Optional[str] = None
+    latency_ms: Optional[float] = None
+
+    @property
+    def id(self) -> str:
+        return f"{self.hat}_{self.seq}"
+
+    def wall_time(self) -> datetime:
+        """
+        Returns the local wall-clock time the message was added
+        """
+        return datetime.fromtimestamp(self.timestamp + _WALL_CLOCK_OFFSET)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Message":
+        """
+        Rebuilds a message from its JSON output shape
+        """
+        hat, seq = data['id'].rsplit('_', 1)
+        timestamp = datetime.fromisoformat(data['timestamp']).timestamp() - _WALL_CLOCK_OFFSET
+        return cls(
+            sys.intern(hat),
+            int(seq),
+            data['content'],
+            timestamp,
+            data.get('response_to'),
+            data.get('tier'),
+            data.get('model'),
+            data.get('latency_ms')
+        )
+
+    def to_dict(self) -> Dict:
+        data = {
+            'id': self.id,
+            'hat': self.hat,
+            'content': self.content,
+            'timestamp': self.wall_time().isoformat(),
+            'response_to': self.response_to
+        }
+        if self.tier is not None:
+            data['tier'] = self.tier
+            data['model'] = self.model
+            data['latency_ms'] = self.latency_ms
+        return data
+
+class DialogueLog:
+    """
+    Append-only log of the whole conversation.
+
+    A message's position in the log is its global sequence number, so the
+    history needs no re-sorting and ties between equal timestamps cannot
+    reorder it.
+    """
+
+    def __init__(self):
+        self.messages: List[Message] = []
+        self.index: Dict[str, Message] = {}
+        # Checkpoint journal receiving every appended message, if any
+        self.journal = None
+
+    def append(self, message: Message) -> int:
+        """
+        Appends a message and returns its sequence number
+        """
+        self.messages.append(message)
+        self.index[message.id] = message
+        if self.journal is not None:
+            self.journal.record_message(message)
+        return len(self.messages) - 1
+
+    def get(self, message_id: str) -> Optional[Message]:
+        return self.index.get(message_id)
+
+    def last(self) -> Optional[Message]:
+        return self.messages[-1] if self.messages else None
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
 class HatHandler(ABC):
+    # Colours of earlier hats whose output this hat needs before it can speak
+    depends_on: Tuple[str, ...] = ()
+
     def __init__(self, name: str, color: str):
         self.name = name
-        self.color = color
-        self.messages: List[Dict] = []
+        self.color = sys.intern(color)
+        self.messages: List[Message] = []
         self.previous_responses: List[Dict] = []
+        # Shared conversation log and its context builder, attached by HatManager
+        self.dialogue_log: Optional[DialogueLog] = None
+        self.context_builder: Optional[ContextBuilder] = None
 
-    def add_message(self, content: str, response_to: Optional[str] = None) -> None:
+    def add_message(self, content: str, response_to: Optional[str] = None, call: Optional[Dict] = None) -> None:
         """
         Adds a message to the hat's conversation history
         Args:
             content: The message content
             response_to: ID of the message this is responding to
+            call: tier, model and latency_ms of the model call that produced it
         """
-        message = {
-            'id': f"{self.color}_{len(self.messages)}",
-            'hat': self.color,
-            'content': content,
-            'timestamp': datetime.now().isoformat(),
-            'response_to': response_to
-        }
+        message = Message(self.color, len(self.messages), content, time.monotonic(), response_to, **(call or {}))
         self.messages.append(message)
-        logger.info(f"{self.color} hat added message: {message['id']}")
+        if self.dialogue_log is not None:
+            self.dialogue_log.append(message)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Hat added message", extra={'hat': self.color, 'message_id': message.id})
 
-    def get_history(self) -> List[Dict]:
+    def get_history(self) -> List[Message]:
         """
         Returns the hat's message history
         """
@@ -37,12 +144,11 @@ class HatHandler(ABC):
 
     def get_context_for_response(self) -> str:
         """
-        Gets context from previous messages for generating responses
+        Gets the token-budgeted discussion context (all hats) for this hat's next response
         """
-        context = []
-        for msg in self.messages[-3:]:  # Last 3 messages for context
-            context.append(f"{msg['hat'].upper()} hat: {msg['content']}")
-        return "\n".join(context)
+        if self.context_builder is not None:
+            return self.context_builder.build()
+        return "\n".join(ContextBuilder.render(msg) for msg in self.messages[-3:])
 
     @abstractmethod
     def get_prompt_context(self) -> str:
@@ -53,6 +159,8 @@ class HatHandler(ABC):
         pass
 
 class BlueHat(HatHandler):
+    depends_on = ('white', 'red', 'black', 'yellow', 'green')
+
     def __init__(self):
         super().__init__('Process Control', 'blue')
 
@@ -106,6 +214,8 @@ class RedHat(HatHandler):
         """
 
 class BlackHat(HatHandler):
+    depends_on = ('white', 'yellow')
+
     def __init__(self):
         super().__init__('Caution', 'black')
 
@@ -123,6 +233,8 @@ class BlackHat(HatHandler):
         """
 
 class YellowHat(HatHandler):
+    depends_on = ('black',)
+
     def __init__(self):
         super().__init__('Benefits', 'yellow')
 
@@ -140,6 +252,8 @@ class YellowHat(HatHandler):
         """
 
 class GreenHat(HatHandler):
+    depends_on = ('white', 'red')
+
     def __init__(self):
         super().__init__('Creativity', 'green')
 
@@ -157,7 +271,7 @@ class GreenHat(HatHandler):
         """
 
 class HatManager:
-    def __init__(self):
+    def __init__(self, context_tokens: int = DEFAULT_CONTEXT_TOKENS):
         self.hats = {
             'blue': BlueHat(),
             'white': WhiteHat(),
@@ -166,6 +280,11 @@ class HatManager:
             'yellow': YellowHat(),
             'green': GreenHat()
         }
+        self.dialogue_log = DialogueLog()
+        self.context_builder = ContextBuilder(self.dialogue_log, context_tokens)
+        for hat in self.hats.values():
+            hat.dialogue_log = self.dialogue_log
+            hat.context_builder = self.context_builder
 
     def get_hat(self, color: str) -> Optional[HatHandler]:
         """
@@ -173,14 +292,44 @@ class HatManager:
         """
         return self.hats.get(color)
 
-    def get_dialogue_history(self) -> List[Dict]:
+    def get_dialogue_history(self) -> List[Message]:
         """
-        Returns the complete dialogue history across all hats
+        Returns the complete dialogue history across all hats in the order the
+        messages were added; the list is the live log and must not be modified
         """
-        history = []
-        for hat in self.hats.values():
-            history.extend(hat.get_history())
-        return sorted(history, key=lambda x: x['timestamp'])
+        return self.dialogue_log.messages
+
+    def get_last_message(self) -> Optional[Message]:
+        """
+        Returns the most recent message of any hat
+        """
+        return self.dialogue_log.last()
+
+    def restore(self, messages: List[Dict]) -> None:
+        """
+        Replays messages exported by export_dialogue (or a run journal) into the
+        hats and the dialogue log
+        """
+        journal, self.dialogue_log.journal = self.dialogue_log.journal, None
+        try:
+            for data in messages:
+                message = Message.from_dict(data)
+                self.hats[message.hat].messages.append(message)
+                self.dialogue_log.append(message)
+        finally:
+            self.dialogue_log.journal = journal
+
+    def get_message(self, message_id: str) -> Optional[Message]:
+        """
+        Looks up a message by its ID
+        """
+        return self.dialogue_log.get(message_id)
+
+    def export_dialogue(self) -> List[Dict]:
+        """
+        Returns the dialogue history in its JSON output shape
+        """
+        return [message.to_dict() for message in self.dialogue_log.messages]
 
     def get_blue_hat_summary(self) -> str:
         """
@@ -188,5 +337,5 @@ class HatManager:
         """
         blue_hat = self.hats['blue']
         if blue_hat.messages:
-            return blue_hat.messages[-1]['content']
+            return blue_hat.messages[-1].content
         return "No summary available yet."
\ No newline at end of file
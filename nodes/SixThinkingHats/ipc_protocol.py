@@ -0,0 +1,59 @@
+"""
+Framed IPC protocol between the n8n node and the worker.
+
+Every message is a frame: a 4-byte big-endian payload length followed by that
+many bytes of UTF-8 JSON. Frames are decoded whole, so a multibyte character
+split across pipe reads can never be cut, and results travel on their own file
+descriptor, so stray output on stdout cannot corrupt them.
+
+Every payload is a JSON object with the protocol version "v", a "type" and,
+except for hello, the job "id":
+
+    worker -> node  {"v": 1, "type": "hello", "pid": ...}            once, on start
+    node -> worker  {"v": 1, "type": "job", "id": ..., <job fields>}
+    worker -> node  {"v": 1, "type": "event", "id": ..., "event": "token", ...}
+    worker -> node  {"v": 1, "type": "result", "id": ..., "status": ..., ...}
+
+Job fields and result fields are the same as in the NDJSON worker protocol.
+"""
+import json
+import struct
+import asyncio
+from typing import Dict, Optional
+
+PROTOCOL_VERSION = 1
+# Anything larger means the stream is out of sync
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+_HEADER = struct.Struct('>I')
+
+class ProtocolError(Exception):
+    """
+    A frame that cannot be decoded; the stream cannot be trusted after it
+    """
+
+def encode_frame(message: Dict) -> bytes:
+    payload = json.dumps({'v': PROTOCOL_VERSION, **message}, ensure_ascii=False).encode('utf-8')
+    if len(payload) > MAX_FRAME_BYTES:
+        raise ProtocolError(f"Frame of {len(payload)} bytes exceeds {MAX_FRAME_BYTES}")
+    return _HEADER.pack(len(payload)) + payload
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """
+    Reads the next frame's payload, or returns None at a clean end of stream.
+    A payload that is not valid JSON only fails its own job; a broken frame
+    header raises ProtocolError.
+    """
+    try:
+        header = await reader.readexactly(_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ProtocolError("Stream ended inside a frame header")
+        return None
+    (length,) = _HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ProtocolError(f"Frame of {length} bytes exceeds {MAX_FRAME_BYTES}")
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise ProtocolError("Stream ended inside a frame")
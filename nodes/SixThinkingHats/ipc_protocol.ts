@@ -0,0 +1,103 @@
+// Кадровый протокол обмена с Python-воркером (см. ipc_protocol.py): каждый кадр —
+// 4 байта длины (big-endian) и JSON в UTF-8. Результаты идут по отдельному
+// дескриптору, поэтому посторонний вывод в stdout их не ломает.
+
+export const PROTOCOL_VERSION = 1;
+// Кадр больше этого означает рассинхронизацию потока
+export const MAX_FRAME_BYTES = 64 * 1024 * 1024;
+
+const HEADER_BYTES = 4;
+
+export interface IProtocolMessage {
+    v: number;
+    type: 'hello' | 'event' | 'result' | 'job';
+    id?: string | number | null;
+    [key: string]: unknown;
+}
+
+// Поток кадров нарушен; messages — кадры, успешно декодированные до ошибки
+export class ProtocolError extends Error {
+    constructor(message: string, readonly messages: IProtocolMessage[] = []) {
+        super(message);
+        this.name = 'ProtocolError';
+    }
+}
+
+export function encodeFrame(message: Omit<IProtocolMessage, 'v'>): Buffer {
+    const payload = Buffer.from(JSON.stringify({ v: PROTOCOL_VERSION, ...message }), 'utf8');
+    const header = Buffer.alloc(HEADER_BYTES);
+    header.writeUInt32BE(payload.length, 0);
+    return Buffer.concat([header, payload]);
+}
+
+// Инкрементальный декодер: принимает куски потока как есть и отдаёт готовые
+// сообщения. Куски не склеиваются в одну строку — копируется только кадр,
+// разорванный границей чанка, а UTF-8 декодируется целым кадром.
+export class FrameDecoder {
+    private chunks: Buffer[] = [];
+    private buffered = 0;
+    private frameLength: number | null = null;
+
+    push(chunk: Buffer): IProtocolMessage[] {
+        this.chunks.push(chunk);
+        this.buffered += chunk.length;
+
+        const messages: IProtocolMessage[] = [];
+        for (;;) {
+            if (this.frameLength === null) {
+                if (this.buffered < HEADER_BYTES) break;
+                this.frameLength = this.take(HEADER_BYTES).readUInt32BE(0);
+                if (this.frameLength > MAX_FRAME_BYTES) {
+                    throw new ProtocolError(`Кадр размером ${this.frameLength} байт превышает ${MAX_FRAME_BYTES}`, messages);
+                }
+            }
+            if (this.buffered < this.frameLength) break;
+
+            const payload = this.take(this.frameLength);
+            this.frameLength = null;
+            // Из испорченного кадра не прочитать id задания, поэтому отклонить
+            // можно только все ожидающие задания сразу
+            let message: unknown;
+            try {
+                message = JSON.parse(payload.toString('utf8'));
+            } catch (error) {
+                throw new ProtocolError(`Кадр с некорректным JSON: ${(error as Error).message}`, messages);
+            }
+            if (message === null || typeof message !== 'object' || Array.isArray(message)) {
+                throw new ProtocolError('Кадр не является JSON-объектом', messages);
+            }
+            messages.push(message as IProtocolMessage);
+        }
+        return messages;
+    }
+
+    // Снимает первые length байт; если они лежат в одном чанке, без копирования
+    private take(length: number): Buffer {
+        if (length === 0) return Buffer.alloc(0);
+        this.buffered -= length;
+        const first = this.chunks[0];
+        if (first.length >= length) {
+            if (first.length === length) {
+                this.chunks.shift();
+            } else {
+                this.chunks[0] = first.subarray(length);
+            }
+            return first.subarray(0, length);
+        }
+
+        const out = Buffer.allocUnsafe(length);
+        let offset = 0;
+        while (offset < length) {
+            const chunk = this.chunks[0];
+            const size = Math.min(chunk.length, length - offset);
+            chunk.copy(out, offset, 0, size);
+            offset += size;
+            if (size === chunk.length) {
+                this.chunks.shift();
+            } else {
+                this.chunks[0] = chunk.subarray(size);
+            }
+        }
+        return out;
+    }
+}
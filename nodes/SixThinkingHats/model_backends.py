@@ -0,0 +1,180 @@
+import os
+import asyncio
+import hashlib
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+# A model backend is any object shaped like the Anthropic async client as far as
+# SixHatsAnalyzer uses it:
+#
+#   backend.messages.create(model, max_tokens, system, messages) -> message
+#   backend.messages.stream(model, max_tokens, system, messages) -> async context
+#       manager with an async text_stream and get_final_message()
+#
+# where a message has content[0].text and usage.input_tokens/output_tokens.
+
+DEFAULT_BACKEND = os.environ.get('SIX_HATS_BACKEND', 'anthropic')
+
+class TransientBackendError(Exception):
+    """
+    A failure the request scheduler should retry, e.g. injected throttling
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def create_anthropic_backend():
+    """
+    Creates the Anthropic client; a single instance can be shared between analyzers
+    so that its HTTP connection pool stays warm across jobs
+    """
+    from anthropic import AsyncAnthropic
+
+    api_key = os.environ.get('ANTHROPIC_API_KEY')
+    if not api_key:
+        raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
+    # Retries are handled by RequestScheduler; ANTHROPIC_BASE_URL can point the
+    # client at a local stand-in server
+    return AsyncAnthropic(api_key=api_key, max_retries=0)
+
+def _parse_model_values(spec: str) -> Dict[str, float]:
+    values = {}
+    for item in spec.split(','):
+        if '=' in item:
+            model, value = item.rsplit('=', 1)
+            values[model.strip()] = float(value)
+    return values
+
+class MockBackend:
+    """
+    Offline stand-in for the Anthropic client.
+
+    Replies are derived from a hash of the request, so the same prompt always gets
+    the same text, token counts and injected failures regardless of how calls are
+    interleaved. A call takes latency seconds to the first token plus
+    output_tokens / tokens_per_second; failure_rate of the attempts for a given
+    request raise TransientBackendError. model_latency and model_failure_rate
+    override both per model name, e.g. to make one routing tier slow or throttled.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        tokens_per_second: float = 500.0,
+        output_tokens: int = 60,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+        model_latency: Optional[Dict[str, float]] = None,
+        model_failure_rate: Optional[Dict[str, float]] = None
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.model_latency = model_latency or {}
+        self.model_failure_rate = model_failure_rate or {}
+        self.calls = 0
+        self.failures = 0
+        self._attempts: Dict[str, int] = {}
+        self.messages = SimpleNamespace(create=self._create, stream=self._stream)
+
+    @classmethod
+    def from_env(cls) -> "MockBackend":
+        return cls(
+            latency=float(os.environ.get('SIX_HATS_MOCK_LATENCY', 0.05)),
+            tokens_per_second=float(os.environ.get('SIX_HATS_MOCK_TOKENS_PER_SECOND', 500)),
+            output_tokens=int(os.environ.get('SIX_HATS_MOCK_OUTPUT_TOKENS', 60)),
+            failure_rate=float(os.environ.get('SIX_HATS_MOCK_FAILURE_RATE', 0)),
+            seed=int(os.environ.get('SIX_HATS_MOCK_SEED', 0)),
+            # "model=value,model=value"
+            model_latency=_parse_model_values(os.environ.get('SIX_HATS_MOCK_MODEL_LATENCY', '')),
+            model_failure_rate=_parse_model_values(os.environ.get('SIX_HATS_MOCK_MODEL_FAILURE_RATE', ''))
+        )
+
+    def latency_for(self, model: str) -> float:
+        return self.model_latency.get(model, self.latency)
+
+    def _request_key(self, system: List[Dict], messages: List[Dict]) -> str:
+        prompt = "".join(block['text'] for block in system) + "".join(m['content'] for m in messages)
+        return hashlib.sha256(f"{self.seed}:{prompt}".encode('utf-8')).hexdigest()
+
+    def _start_call(self, model: str, system: List[Dict], messages: List[Dict]):
+        """
+        Counts the attempt, injects a failure if due and builds the reply
+        """
+        self.calls += 1
+        key = self._request_key(system, messages)
+        attempt = self._attempts.get(key, 0)
+        self._attempts[key] = attempt + 1
+
+        roll = int(hashlib.sha256(f"{key}:{attempt}".encode('utf-8')).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if roll < self.model_failure_rate.get(model, self.failure_rate):
+            self.failures += 1
+            raise TransientBackendError("Injected mock backend failure", retry_after=0)
+
+        words = [f"{key[i % 56:i % 56 + 8]}" for i in range(self.output_tokens)]
+        text = f"[mock {model}] " + " ".join(words)
+        input_tokens = sum(len(block['text']) for block in system) // 4 + sum(len(m['content']) for m in messages) // 4
+        return SimpleNamespace(
+            content=[SimpleNamespace(type='text', text=text)],
+            model=model,
+            usage=SimpleNamespace(
+                input_tokens=input_tokens,
+                output_tokens=self.output_tokens,
+                cache_read_input_tokens=0,
+                cache_creation_input_tokens=0
+            )
+        )
+
+    async def _create(self, *, model: str, max_tokens: int, system: List[Dict], messages: List[Dict], **kwargs):
+        reply = self._start_call(model, system, messages)
+        await asyncio.sleep(self.latency_for(model) + self.output_tokens / self.tokens_per_second)
+        return reply
+
+    def _stream(self, *, model: str, max_tokens: int, system: List[Dict], messages: List[Dict], **kwargs):
+        return _MockStream(self, model, system, messages)
+
+class _MockStream:
+    """
+    Async context manager mirroring the SDK's message stream
+    """
+
+    def __init__(self, backend: MockBackend, model: str, system: List[Dict], messages: List[Dict]):
+        self.backend = backend
+        self.reply = None
+        self._request = (model, system, messages)
+
+    async def __aenter__(self) -> "_MockStream":
+        self.reply = self.backend._start_call(*self._request)
+        await asyncio.sleep(self.backend.latency_for(self._request[0]))
+        return self
+
+    async def __aexit__(self, *exc_info) -> bool:
+        return False
+
+    @property
+    def text_stream(self):
+        async def deltas():
+            delay = 1 / self.backend.tokens_per_second
+            for i, word in enumerate(self.reply.content[0].text.split(' ')):
+                await asyncio.sleep(delay)
+                yield word if i == 0 else ' ' + word
+        return deltas()
+
+    async def get_final_message(self):
+        return self.reply
+
+BACKENDS: Dict[str, Callable[[], object]] = {
+    'anthropic': create_anthropic_backend,
+    'mock': MockBackend.from_env,
+}
+
+def create_backend(name: str = DEFAULT_BACKEND):
+    """
+    Creates a model backend by name
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {name}")
+    return BACKENDS[name]()
@@ -0,0 +1,101 @@
+import os
+import json
+import logging
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ModelTier:
+    """
+    A model with the limits it is called with
+    """
+    name: str
+    model: str
+    max_tokens: int = 1024
+    # Seconds per attempt; None keeps the request scheduler's timeout
+    timeout: Optional[float] = None
+    # Retries on this tier before a route falls back to its next tier; the last
+    # tier of a route gets the request scheduler's full retry budget
+    fallback_after: int = 1
+
+# A slow primary falls back after (fallback_after + 1) attempts of timeout
+# seconds each: 90s for the standard tier rather than minutes
+DEFAULT_TIERS: Dict[str, ModelTier] = {
+    'standard': ModelTier('standard', 'claude-3-5-sonnet-20241022', 1024, timeout=45.0, fallback_after=1),
+    'fast': ModelTier('fast', 'claude-3-5-haiku-20241022', 1024, timeout=60.0),
+    'focus': ModelTier('focus', 'claude-3-5-haiku-20241022', 256, timeout=30.0),
+}
+
+# Route keys, most specific first: "step:hat", step, hat colour, "default".
+# Steps are "hat" (a hat's turn), "blue-focus" and "blue-merged".
+DEFAULT_ROUTES: Dict[str, List[str]] = {
+    'default': ['standard', 'fast'],
+    # Gut reactions and the one-line focus direction do not need the large model
+    'red': ['fast'],
+    'blue-focus': ['focus', 'fast'],
+}
+
+DEFAULT_ROUTING_FILE = os.environ.get('SIX_HATS_ROUTING')
+
+class ModelRouter:
+    """
+    Chooses the tiers a model call is tried on, in order, by step and hat colour
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, ModelTier]] = None,
+        routes: Optional[Dict[str, List[str]]] = None
+    ):
+        self.tiers = dict(DEFAULT_TIERS if tiers is None else tiers)
+        self.routes = dict(DEFAULT_ROUTES if routes is None else routes)
+        if 'default' not in self.routes:
+            raise ValueError("Routing needs a 'default' route")
+        for key, names in self.routes.items():
+            if not names:
+                raise ValueError(f"Route {key!r} has no tiers")
+            for name in names:
+                if name not in self.tiers:
+                    raise ValueError(f"Route {key!r} uses unknown tier {name!r}")
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> "ModelRouter":
+        """
+        Loads routing from a JSON file shaped like
+
+            {"tiers": {"fast": {"model": "...", "max_tokens": 512, "timeout": 30}},
+             "routes": {"red": ["fast"], "blue-focus": ["fast"]}}
+
+        Tiers and routes are merged over the defaults; without a path the
+        defaults are used
+        """
+        if not path:
+            return cls()
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+
+        tiers = dict(DEFAULT_TIERS)
+        for name, options in config.get('tiers', {}).items():
+            base = tiers.get(name)
+            tiers[name] = replace(base, **options) if base else ModelTier(name=name, **options)
+        routes = {**DEFAULT_ROUTES, **config.get('routes', {})}
+        logger.info(f"Loaded model routing from {path}")
+        return cls(tiers, routes)
+
+    def with_timeout(self, timeout: float) -> "ModelRouter":
+        """
+        Returns a copy of the routing whose tiers all use timeout seconds per attempt
+        """
+        tiers = {name: replace(tier, timeout=timeout) for name, tier in self.tiers.items()}
+        return ModelRouter(tiers, self.routes)
+
+    def route(self, step: str, hat_color: str) -> List[ModelTier]:
+        """
+        Returns the tiers to try for a call, primary first
+        """
+        for key in (f"{step}:{hat_color}", step, hat_color):
+            if key in self.routes:
+                return [self.tiers[name] for name in self.routes[key]]
+        return [self.tiers[name] for name in self.routes['default']]
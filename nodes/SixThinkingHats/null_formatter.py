@@ -0,0 +1,42 @@
+from typing import List
+from hat_handlers import Message
+
+class NullFormatter:
+    """
+    No-op stand-in for ConsoleFormatter used in headless mode.
+
+    Lives in its own module so that headless runs never import rich.
+    """
+
+    def print_header(self, topic: str) -> None:
+        pass
+
+    def print_hat_transition(self, hat_color: str) -> None:
+        pass
+
+    def print_message(self, message: Message) -> None:
+        pass
+
+    def print_dialogue_tree(self, conversation_history: List[Message]) -> None:
+        pass
+
+    def print_analysis_statistics(self, conversation_history: List[Message]) -> None:
+        pass
+
+    def create_progress_tracker(self, total_steps: int) -> int:
+        return 0
+
+    def update_progress(self, task_id: int, advance: int = 1) -> None:
+        pass
+
+    def complete_progress(self) -> None:
+        pass
+
+    def print_blue_hat_summary(self, summary: str) -> None:
+        pass
+
+    def print_error(self, error_message: str) -> None:
+        pass
+
+    def print_dialogue_summary(self, conversation_history: List[Message]) -> None:
+        pass
@@ -0,0 +1,162 @@
+import { spawn, ChildProcess } from 'child_process';
+import { Readable, Writable } from 'stream';
+import { IAnalysisJob, IAnalysisResult, IStreamEvent } from './types';
+import { FrameDecoder, IProtocolMessage, PROTOCOL_VERSION, ProtocolError, encodeFrame } from './ipc_protocol';
+
+interface IPendingJob {
+    resolve: (result: IAnalysisResult) => void;
+    reject: (error: Error) => void;
+    onEvent?: (event: IStreamEvent) => void;
+}
+
+// Дескриптор, по которому воркер пишет кадры результатов
+const IPC_FD = 3;
+
+// Долгоживущий Python-воркер: один процесс с тёплым HTTP-клиентом обслуживает
+// задания всех запусков узла вместо отдельного процесса на каждый запуск.
+// Задания и результаты передаются кадрами (см. ipc_protocol.ts).
+export class PythonWorker {
+    private process: ChildProcess | null = null;
+    private jobs: Writable | null = null;
+    private pending = new Map<string, IPendingJob>();
+    private errorData = '';
+    private nextId = 0;
+
+    constructor(
+        private readonly scriptPath: string,
+        private readonly poolSize: number,
+        // Одновременные вызовы модели внутри одного анализа; больше 1 — шляпы,
+        // не зависящие друг от друга, выполняются параллельно
+        private readonly concurrency: number,
+    ) {}
+
+    // onEvent включает потоковый режим: события шляп приходят по мере генерации
+    analyze(job: IAnalysisJob, onEvent?: (event: IStreamEvent) => void): Promise<IAnalysisResult> {
+        const jobs = this.ensureStarted();
+        const id = String(this.nextId++);
+
+        return new Promise((resolve, reject) => {
+            this.pending.set(id, { resolve, reject, onEvent });
+            jobs.write(encodeFrame({
+                type: 'job',
+                id,
+                topic: job.topic,
+                hats: job.hats,
+                dialog_mode: job.dialogMode,
+                max_rounds: job.maxRounds ?? 1,
+                run_id: job.runId,
+                stream: Boolean(onEvent),
+            }));
+        });
+    }
+
+    private ensureStarted(): Writable {
+        if (this.process && this.jobs) return this.jobs;
+
+        const worker = spawn('python', [
+            this.scriptPath,
+            '--worker',
+            '--headless',
+            '--pool-size', String(this.poolSize),
+            '--concurrency', String(this.concurrency),
+            '--ipc-fd', String(IPC_FD),
+        ], { stdio: ['pipe', 'pipe', 'pipe', 'pipe'] });
+        const results = worker.stdio[IPC_FD] as Readable;
+        const decoder = new FrameDecoder();
+
+        results.on('data', (chunk: Buffer) => {
+            let messages: IProtocolMessage[];
+            try {
+                messages = decoder.push(chunk);
+            } catch (error) {
+                // Кадры до ошибки ещё можно доставить; после неё воркеру больше нельзя доверять
+                if (error instanceof ProtocolError) {
+                    error.messages.forEach((message) => this.handleMessage(message));
+                }
+                this.fail(new Error(`Нарушен протокол Python воркера: ${(error as Error).message}`));
+                worker.kill();
+                return;
+            }
+            messages.forEach((message) => this.handleMessage(message));
+        });
+
+        // stdout не входит в протокол; посторонний вывод сохраняется вместе с stderr
+        const keepTail = (chunk: string) => {
+            // Храним только хвост вывода для сообщений об ошибках
+            this.errorData = (this.errorData + chunk).slice(-4096);
+        };
+        worker.stdout?.setEncoding('utf8').on('data', keepTail);
+        worker.stderr?.setEncoding('utf8').on('data', keepTail);
+
+        worker.on('close', (code) => {
+            this.stop(worker, new Error(`Ошибка Python процесса (код ${code}): ${this.errorData}`));
+        });
+        // Без обработчиков 'error' (python не найден, EPIPE при записи в умерший
+        // воркер) исключение роняет весь процесс n8n, а не только задания
+        worker.on('error', (error) => {
+            this.stop(worker, new Error(`Не удалось запустить Python воркер: ${error.message}`));
+        });
+        worker.stdin?.on('error', (error) => {
+            this.stop(worker, new Error(`Python воркер недоступен: ${error.message}`));
+            worker.kill();
+        });
+
+        this.process = worker;
+        this.jobs = worker.stdin as Writable;
+        return this.jobs;
+    }
+
+    // Отклоняет ожидающие задания и забывает процесс, чтобы следующий analyze()
+    // запустил новый; события уже заменённого процесса игнорируются
+    private stop(worker: ChildProcess, error: Error) {
+        if (this.process !== worker) return;
+        this.fail(error);
+        this.process = null;
+        this.jobs = null;
+    }
+
+    private fail(error: Error) {
+        this.pending.forEach((job) => job.reject(error));
+        this.pending.clear();
+    }
+
+    private handleMessage(message: IProtocolMessage) {
+        const id = message.id === undefined || message.id === null ? null : String(message.id);
+        const job = id === null ? undefined : this.pending.get(id);
+
+        if (message.v !== PROTOCOL_VERSION) {
+            const error = new Error(`Версия протокола воркера ${message.v} не поддерживается (ожидалась ${PROTOCOL_VERSION})`);
+            if (job && id !== null) {
+                // Кадр относится к известному заданию — отклоняем только его
+                this.pending.delete(id);
+                job.reject(error);
+                return;
+            }
+            this.fail(error);
+            this.process?.kill();
+            return;
+        }
+        if (message.type === 'hello') return;
+        if (!job || id === null) return;
+
+        const { v, type, id: _id, ...payload } = message;
+        if (type === 'event') {
+            job.onEvent?.({ ...payload, id } as unknown as IStreamEvent);
+            return;
+        }
+
+        this.pending.delete(id);
+        job.resolve(payload as unknown as IAnalysisResult);
+    }
+}
+
+let sharedWorker: PythonWorker | null = null;
+
+export function getPythonWorker(scriptPath: string): PythonWorker {
+    if (!sharedWorker) {
+        const poolSize = Number(process.env.SIX_HATS_WORKER_POOL_SIZE || 4);
+        const concurrency = Number(process.env.SIX_HATS_CONCURRENCY || 4);
+        sharedWorker = new PythonWorker(scriptPath, poolSize, concurrency);
+    }
+    return sharedWorker;
+}
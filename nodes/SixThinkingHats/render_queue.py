@@ -0,0 +1,192 @@
+import queue
+import logging
+import threading
+from typing import List, Optional, Tuple
+from rich.console import Group
+from rich.live import Live
+from rich.text import Text
+from console_formatter import ConsoleFormatter
+from hat_handlers import Message
+
+logger = logging.getLogger(__name__)
+
+_STOP = 'stop'
+
+class BackgroundRenderer:
+    """
+    Formatter that keeps console output off the event loop.
+
+    Calls made during an analysis only put an item on a bounded queue (or set a
+    counter) and return; a render thread drains the queue in batches, prints
+    messages above a single rich Live view, and the Live view (current hat and
+    progress) is repainted at most refresh_per_second times however many
+    updates arrived. When the queue is full, new items are dropped and counted
+    instead of blocking; when the thread falls behind, all but the newest
+    max_full_messages of a batch are printed as one-line previews. The dialogue
+    tree printed at the end always covers every message.
+    """
+
+    def __init__(
+        self,
+        formatter: ConsoleFormatter,
+        max_pending: int = 256,
+        max_full_messages: int = 4,
+        refresh_per_second: float = 8
+    ):
+        self.formatter = formatter
+        self.console = formatter.console
+        self.max_full_messages = max_full_messages
+        self.refresh_per_second = refresh_per_second
+        self._queue: "queue.Queue[Tuple[str, object]]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._progress_task = None
+        # Written by the analysis, read by the render thread; plain assignments
+        # and increments of these need no lock
+        self._current_hat: Optional[str] = None
+        self._completed = 0
+        self.dropped = 0
+
+    def print_header(self, topic: str) -> None:
+        self._submit('header', topic)
+
+    def print_hat_transition(self, hat_color: str) -> None:
+        # Coalesced into the live view instead of a panel per transition
+        self._current_hat = hat_color
+
+    def print_message(self, message: Message) -> None:
+        self._submit('message', message)
+
+    def print_blue_hat_summary(self, summary: str) -> None:
+        self._submit('blue_summary', summary)
+
+    def create_progress_tracker(self, total_steps: int) -> int:
+        """
+        Starts the render thread and its live view
+        """
+        self._stop()
+        progress = self.formatter.progress
+        self._progress_task = progress.add_task("Analyzing...", total=total_steps)
+        self._completed = 0
+        self._thread = threading.Thread(target=self._run, name='six-hats-render', daemon=True)
+        self._thread.start()
+        return self._progress_task
+
+    def update_progress(self, task_id: int, advance: int = 1) -> None:
+        self._completed += advance
+
+    def complete_progress(self) -> None:
+        """
+        Waits until everything queued has been rendered and removes the live view
+        """
+        self._stop()
+
+    def print_dialogue_tree(self, conversation_history: List[Message]) -> None:
+        self._stop()
+        self.formatter.print_dialogue_tree(conversation_history)
+
+    def print_analysis_statistics(self, conversation_history: List[Message]) -> None:
+        self._stop()
+        self.formatter.print_analysis_statistics(conversation_history)
+
+    def print_error(self, error_message: str) -> None:
+        self._stop()
+        self.formatter.print_error(error_message)
+
+    def print_dialogue_summary(self, conversation_history: List[Message]) -> None:
+        self._stop()
+        self.formatter.print_dialogue_summary(conversation_history)
+
+    def _submit(self, kind: str, payload: object) -> None:
+        if self._thread is None:
+            # Nothing is live yet (e.g. the header), so print in place
+            self._render(kind, payload, full=True)
+            return
+        try:
+            self._queue.put_nowait((kind, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _stop(self) -> None:
+        if self._thread is None:
+            return
+        # The only blocking put: at the end of a run the remaining output must
+        # be printed before whatever comes next
+        while self._thread.is_alive():
+            try:
+                self._queue.put((_STOP, None), timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        self._thread = None
+        # Leftovers of a render thread that failed
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        if self.dropped:
+            logger.warning(f"Renderer dropped {self.dropped} updates under backpressure")
+
+    def _run(self) -> None:
+        try:
+            with Live(
+                self._status(),
+                console=self.console,
+                refresh_per_second=self.refresh_per_second,
+                transient=True,
+                # Stream mode writes JSON to stdout while the view is live
+                redirect_stdout=False,
+                redirect_stderr=False
+            ) as live:
+                stopping = False
+                while not stopping:
+                    batch = self._next_batch()
+                    stopping = any(kind == _STOP for kind, _ in batch)
+                    items = [item for item in batch if item[0] != _STOP]
+                    messages = sum(1 for kind, _ in items if kind == 'message')
+                    for kind, payload in items:
+                        full = kind != 'message' or messages <= self.max_full_messages
+                        if kind == 'message':
+                            messages -= 1
+                        self._render(kind, payload, full)
+                    live.update(self._status(), refresh=stopping)
+        except Exception:
+            # Rendering must never take the analysis down
+            logger.exception("Render thread failed")
+
+    def _next_batch(self) -> List[Tuple[str, object]]:
+        """
+        Waits up to one refresh interval for an item, then takes everything queued
+        """
+        batch = []
+        try:
+            batch.append(self._queue.get(timeout=1 / self.refresh_per_second))
+        except queue.Empty:
+            return batch
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _render(self, kind: str, payload, full: bool) -> None:
+        if kind == 'header':
+            self.formatter.print_header(payload)
+        elif kind == 'message':
+            if full:
+                self.formatter.print_message(payload)
+            else:
+                self.console.print(self.formatter.message_label(payload))
+        elif kind == 'blue_summary':
+            self.formatter.print_blue_hat_summary(payload)
+
+    def _status(self) -> Group:
+        progress = self.formatter.progress
+        if self._progress_task is not None:
+            progress.update(self._progress_task, completed=self._completed)
+        parts = []
+        if self._current_hat:
+            emoji = self.formatter.hat_emoji.get(self._current_hat, '🎩')
+            color = self.formatter.hat_colors.get(self._current_hat, 'white')
+            parts.append(Text(f"{emoji} {self._current_hat.upper()} hat is thinking...", style=f"bold {color}"))
+        parts.append(progress)
+        if self.dropped:
+            parts.append(Text(f"{self.dropped} updates skipped; the dialogue tree below has every message", style="dim"))
+        return Group(*parts)
@@ -0,0 +1,150 @@
+import sys
+import time
+import random
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from model_backends import TransientBackendError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+# Status codes worth retrying besides 5xx: request timeout, conflict, throttling
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed model call is worth retrying: throttling, overload (529) and
+    other 5xx responses, connection problems, timeouts and transient failures
+    raised by other backends. Classified by status code, since the SDK's
+    OverloadedError and ServiceUnavailableError are not InternalServerErrors.
+    """
+    if isinstance(error, (TransientBackendError, asyncio.TimeoutError)):
+        return True
+    # An SDK error means the SDK is loaded; headless and mock runs never import it
+    anthropic = sys.modules.get('anthropic')
+    if anthropic is None:
+        return False
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    # Includes APITimeoutError
+    return isinstance(error, anthropic.APIConnectionError)
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at rate_per_minute.
+
+    The level may go negative after adjust() so that calls which turned out to be
+    more expensive than estimated are paid back before new calls start.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """
+        Waits until amount tokens are available and takes them
+        """
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self.level < amount:
+                await asyncio.sleep((amount - self.level) / self.rate)
+                self._refill()
+            self.level -= amount
+
+    def adjust(self, amount: float) -> None:
+        """
+        Takes (or returns, if negative) tokens once the real cost of a call is known
+        """
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+class RequestScheduler:
+    """
+    Shared gate for model calls: request and token rate limits, per-call timeouts
+    and jittered exponential backoff that honours retry-after headers.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        timeout: Optional[float] = 120.0
+    ):
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+
+    async def call(
+        self,
+        make_request: Callable[[], Awaitable[T]],
+        estimated_tokens: int = 0,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None
+    ) -> T:
+        """
+        Runs make_request under the rate limits, retrying retryable failures;
+        timeout and max_retries override the scheduler's own for this call
+        """
+        timeout = timeout or self.timeout
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            if self.request_bucket is not None:
+                await self.request_bucket.acquire(1)
+            if self.token_bucket is not None:
+                await self.token_bucket.acquire(estimated_tokens)
+
+            try:
+                if timeout:
+                    response = await asyncio.wait_for(make_request(), timeout)
+                else:
+                    response = await make_request()
+            except Exception as e:
+                if not is_retryable(e) or attempt >= max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                logger.warning(f"Model call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if self.token_bucket is not None:
+                usage = getattr(response, 'usage', None)
+                if usage is not None:
+                    actual = (usage.input_tokens or 0) + (usage.output_tokens or 0)
+                    self.token_bucket.adjust(actual - min(estimated_tokens, self.token_bucket.capacity))
+            return response
+
+    def _backoff_delay(self, attempt: int, error: BaseException) -> float:
+        """
+        Uses the server's retry-after when given, otherwise full-jitter exponential backoff
+        """
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        if retry_after is None:
+            retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            try:
+                return min(self.max_delay, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
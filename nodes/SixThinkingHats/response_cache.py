@@ -0,0 +1,103 @@
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class ResponseCache:
+    """
+    Content-addressed cache for model responses.
+
+    Entries live in an in-memory LRU and, when db_path is given, in a local SQLite
+    store so they survive restarts (retries and replays of failed executions hit
+    the same keys). Both layers expire entries after ttl_seconds.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 24 * 3600, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+
+        if db_path:
+            self._db = sqlite3.connect(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - ttl_seconds,))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(**parts) -> str:
+        """
+        Builds a stable key from everything that determines the model's answer
+        """
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached response for key, or None if it is missing or expired
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT created_at, value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row:
+                entry = (row[0], row[1])
+                self._remember(key, entry)
+
+        if entry is None or now - entry[0] > self.ttl_seconds:
+            if entry is not None:
+                self._forget(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: str) -> None:
+        """
+        Stores a response under key in every layer
+        """
+        entry = (time.time(), value)
+        self._remember(key, entry)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, entry[0])
+            )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns hit and miss counters
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key: str, entry: Tuple[float, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
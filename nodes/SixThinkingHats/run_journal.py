@@ -0,0 +1,196 @@
+import os
+import re
+import glob
+import json
+import time
+import asyncio
+import logging
+import tempfile
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from hat_handlers import Message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR = os.environ.get(
+    'SIX_HATS_JOURNAL_DIR',
+    os.path.join(tempfile.gettempdir(), 'six_hats', 'journal')
+)
+# Journals of failed runs not resumed within this many seconds are removed
+DEFAULT_JOURNAL_TTL = float(os.environ.get('SIX_HATS_JOURNAL_TTL', 7 * 24 * 3600))
+
+# Runs the fsyncs of every journal of the process, one at a time
+_sync_executor: Optional[ThreadPoolExecutor] = None
+
+def _fsync_in_background(fd: int) -> Future:
+    global _sync_executor
+    if _sync_executor is None:
+        _sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='six-hats-journal')
+    return _sync_executor.submit(os.fsync, fd)
+
+class RunJournal:
+    """
+    Append-only checkpoint file of one analysis run.
+
+    The first line describes the run; every completed message follows as its own
+    JSON line. Each line is flushed to the OS right away, which is enough to
+    survive the process being killed. fsync (needed only against power loss)
+    covers every fsync_every records or fsync_interval seconds; on an event loop
+    it runs on a background thread, so a write never waits for the disk.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 16, fsync_interval: float = 1.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._file = open(path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._pending_sync: Optional[Future] = None
+
+    @staticmethod
+    def path_for(journal_dir: str, run_id: str) -> str:
+        return os.path.join(journal_dir, re.sub(r'[^\w.-]', '_', run_id) + '.jsonl')
+
+    @classmethod
+    def create(cls, journal_dir: str, run_id: str, header: Dict, ttl: float = DEFAULT_JOURNAL_TTL) -> "RunJournal":
+        """
+        Starts the journal of a new run, first removing journals older than ttl
+        """
+        os.makedirs(journal_dir, exist_ok=True)
+        prune_journals(journal_dir, ttl)
+        path = cls.path_for(journal_dir, run_id)
+        if os.path.exists(path):
+            os.remove(path)
+        journal = cls(path)
+        journal.write({'type': 'run', 'run_id': run_id, **header})
+        return journal
+
+    @staticmethod
+    def load(journal_dir: str, run_id: str) -> Tuple[Dict, List[Dict]]:
+        """
+        Reads a run's header and its recorded messages; a line torn by a crash
+        mid-write is ignored
+        """
+        path = RunJournal.path_for(journal_dir, run_id)
+        if not os.path.exists(path):
+            raise ValueError(f"No journal for run {run_id} in {journal_dir}")
+
+        header: Optional[Dict] = None
+        messages: List[Dict] = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Skipping torn journal line in {path}")
+                    continue
+                if record.get('type') == 'run':
+                    header = record
+                elif record.get('type') == 'message':
+                    messages.append(record)
+        if header is None:
+            raise ValueError(f"Journal for run {run_id} has no header")
+        return header, messages
+
+    def write(self, record: Dict) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            if self._unsynced >= self.fsync_every:
+                self.sync()
+            return
+        if self._unsynced >= self.fsync_every:
+            self._sync_in_background()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.fsync_interval, self._sync_in_background)
+
+    def record_message(self, message: "Message") -> None:
+        self.write({'type': 'message', 'seq': message.seq, **message.to_dict()})
+
+    def _sync_in_background(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._unsynced or self._file.closed:
+            return
+        if self._pending_sync is not None and not self._pending_sync.done():
+            # The running fsync may have missed the latest records; check again later
+            self._timer = asyncio.get_running_loop().call_later(self.fsync_interval, self._sync_in_background)
+            return
+        self._unsynced = 0
+        self._pending_sync = _fsync_in_background(self._file.fileno())
+
+    def sync(self) -> None:
+        """
+        Waits for a background fsync and fsyncs whatever it did not cover
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending_sync is not None:
+            self._pending_sync.result()
+            self._pending_sync = None
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def close(self, delete: bool = False) -> None:
+        """
+        Closes the journal; a finished run's journal is deleted since there is
+        nothing left to resume
+        """
+        if self._file.closed:
+            return
+        if delete:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending_sync is not None:
+                # The file descriptor must outlive the fsync using it
+                self._pending_sync.result()
+            self._file.close()
+            os.remove(self.path)
+            return
+        self.sync()
+        self._file.close()
+
+def prune_journals(journal_dir: str, ttl: float = DEFAULT_JOURNAL_TTL) -> List[str]:
+    """
+    Deletes journals not written to for ttl seconds; successful runs delete
+    their own, so these are failed runs nobody resumed. Returns the removed paths.
+    """
+    cutoff = time.time() - ttl
+    removed = []
+    for path in glob.glob(os.path.join(journal_dir, '*.jsonl')):
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed.append(path)
+        except OSError:
+            # Removed by a concurrent run
+            pass
+    if removed:
+        logger.info(f"Removed {len(removed)} expired journals from {journal_dir}")
+    return removed
+
+def remaining_turns(hats_order: List[str], recorded_hats: List[str]) -> List[str]:
+    """
+    Removes turns already recorded from hats_order, matching by colour. Fan-out
+    runs record Blue after the other hats, so the recorded turns are not always
+    a prefix of hats_order.
+    """
+    done = Counter(recorded_hats)
+    remaining = []
+    for hat in hats_order:
+        if done[hat]:
+            done[hat] -= 1
+        else:
+            remaining.append(hat)
+    return remaining
@@ -0,0 +1,120 @@
+import time
+from typing import Dict, List, Optional
+
+TOKEN_FIELDS = ('input_tokens', 'output_tokens', 'cache_read_input_tokens', 'cache_creation_input_tokens')
+
+class RunMetrics:
+    """
+    Per-call latency, token and retry records of an analyzer, reduced to
+    per-hat and per-run figures for the result's metrics block
+    """
+
+    def __init__(self):
+        self.calls: List[Dict] = []
+        self.cache_hits: List[Dict] = []
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self.started
+
+    def record_call(
+        self,
+        step: str,
+        hat_color: str,
+        usage,
+        attempts: int,
+        latency: float,
+        ttft: Optional[float] = None,
+        tier: Optional[str] = None,
+        fallbacks: int = 0
+    ) -> None:
+        """
+        Records one model call; latency covers every attempt on every tier, ttft
+        the first token of the successful one when it was streamed, and fallbacks
+        the tiers given up on before tier answered
+        """
+        call = {'step': step, 'hat': hat_color, 'tier': tier}
+        for field in TOKEN_FIELDS:
+            call[field] = (getattr(usage, field, None) or 0) if usage is not None else 0
+        call['attempts'] = attempts
+        call['latency_ms'] = round(latency * 1000, 3)
+        call['ttft_ms'] = round(ttft * 1000, 3) if ttft is not None else None
+        call['fallbacks'] = fallbacks
+        self.calls.append(call)
+
+    def record_cache_hit(self, step: str, hat_color: str) -> None:
+        self.cache_hits.append({'step': step, 'hat': hat_color})
+
+    def usage_report(self) -> Dict:
+        """
+        Returns per-call usage together with totals over the run
+        """
+        totals = {field: sum(call[field] for call in self.calls) for field in TOKEN_FIELDS}
+        return {'calls': self.calls, 'totals': totals}
+
+    def report(self) -> Dict:
+        """
+        Returns per-hat and per-run latency, time to first token, tokens,
+        cache hits, retries and tier fallbacks, plus calls per tier
+        """
+        hats: Dict[str, Dict] = {}
+        tiers: Dict[str, Dict[str, int]] = {}
+        for call in self.calls:
+            hat = hats.setdefault(call['hat'], self._empty_hat())
+            hat['model_calls'] += 1
+            hat['retries'] += call['attempts'] - 1
+            hat['fallbacks'] += call['fallbacks']
+            if call['tier'] is not None:
+                hat_tiers = tiers.setdefault(call['hat'], {})
+                hat_tiers[call['tier']] = hat_tiers.get(call['tier'], 0) + 1
+            hat['latency_ms'].append(call['latency_ms'])
+            if call['ttft_ms'] is not None:
+                hat['ttft_ms'].append(call['ttft_ms'])
+            for field in TOKEN_FIELDS:
+                hat[field] += call[field]
+        for hit in self.cache_hits:
+            hats.setdefault(hit['hat'], self._empty_hat())['cache_hits'] += 1
+
+        run = self._empty_hat()
+        for hat in hats.values():
+            for key, value in hat.items():
+                run[key] += value
+            hat['latency_ms'] = self._summarize(hat['latency_ms'])
+            hat['ttft_ms'] = self._summarize(hat['ttft_ms'])
+        for hat_color, hat_tiers in tiers.items():
+            hats[hat_color]['tiers'] = hat_tiers
+        run['latency_ms'] = self._summarize(run['latency_ms'])
+        run['ttft_ms'] = self._summarize(run['ttft_ms'])
+        if self.duration is not None:
+            run['duration_ms'] = round(self.duration * 1000, 3)
+
+        return {'run': run, 'hats': hats}
+
+    @staticmethod
+    def _empty_hat() -> Dict:
+        return {
+            'model_calls': 0,
+            'retries': 0,
+            'fallbacks': 0,
+            'cache_hits': 0,
+            'latency_ms': [],
+            'ttft_ms': [],
+            **{field: 0 for field in TOKEN_FIELDS}
+        }
+
+    @staticmethod
+    def _summarize(values: List[float]) -> Optional[Dict]:
+        if not values:
+            return None
+        return {
+            'count': len(values),
+            'mean': round(sum(values) / len(values), 3),
+            'max': max(values),
+            # Raw samples let consumers aggregate them into histograms
+            'samples': values
+        }
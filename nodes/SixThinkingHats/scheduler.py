@@ -0,0 +1,102 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from hat_handlers import HatManager
+
+@dataclass
+class HatTurn:
+    """
+    A single hat turn in the hats order together with the earlier turns it needs
+    """
+    index: int
+    color: str
+    depends_on: List[int] = field(default_factory=list)
+
+class DialogueSchedule:
+    """
+    Dependency graph over the turns of one hats order.
+
+    A turn depends on the latest earlier turn of every colour its hat declares in
+    ``depends_on``, on the previous turn of its own colour (a hat continues its own
+    line of thought) and on the latest earlier Blue turn (Blue sets the direction).
+    Only earlier turns are considered, so the graph is always acyclic.
+    """
+
+    def __init__(self, hats_order: List[str], hat_manager: HatManager):
+        self.turns: List[HatTurn] = []
+        latest_turn: Dict[str, int] = {}
+
+        for index, color in enumerate(hats_order):
+            hat = hat_manager.get_hat(color)
+            if not hat:
+                raise ValueError(f"Invalid hat color: {color}")
+
+            needed = set(hat.depends_on) | {color, 'blue'}
+            depends_on = sorted(latest_turn[c] for c in needed if c in latest_turn)
+            self.turns.append(HatTurn(index, color, depends_on))
+            latest_turn[color] = index
+
+    def critical_path(self) -> List[int]:
+        """
+        Returns the longest chain of dependent turns, which bounds the run's latency
+        in model round-trips no matter how much concurrency is available
+        """
+        best: Dict[int, List[int]] = {}
+        for turn in self.turns:
+            longest: List[int] = []
+            for dependency in turn.depends_on:
+                if len(best[dependency]) > len(longest):
+                    longest = best[dependency]
+            best[turn.index] = longest + [turn.index]
+        return max(best.values(), key=len, default=[])
+
+    async def run(
+        self,
+        run_turn: Callable[[HatTurn, Dict[int, str]], Awaitable[str]],
+        commit_turn: Callable[[HatTurn, str], None],
+        max_concurrency: int,
+        completed: Optional[Dict[int, str]] = None
+    ) -> None:
+        """
+        Runs every turn as soon as all of its dependencies have finished.
+
+        run_turn receives the turn and the responses of its dependencies. Finished
+        responses are handed to commit_turn strictly in hats order, so the recorded
+        conversation is the same however the calls interleave. On failure the
+        completed prefix is still committed before the error propagates.
+
+        completed holds the responses of turns that already finished (e.g. restored
+        from a journal); they count as done and are neither run nor committed.
+        """
+        completed = completed or {}
+        semaphore = asyncio.Semaphore(max_concurrency)
+        responses: Dict[int, str] = dict(completed)
+        done: Dict[int, asyncio.Event] = {turn.index: asyncio.Event() for turn in self.turns}
+        for index in completed:
+            done[index].set()
+        next_commit = 0
+
+        def commit_ready() -> None:
+            nonlocal next_commit
+            while next_commit < len(self.turns) and next_commit in responses:
+                if next_commit not in completed:
+                    commit_turn(self.turns[next_commit], responses[next_commit])
+                next_commit += 1
+
+        async def execute(turn: HatTurn) -> None:
+            for dependency in turn.depends_on:
+                await done[dependency].wait()
+            async with semaphore:
+                inputs = {dependency: responses[dependency] for dependency in turn.depends_on}
+                responses[turn.index] = await run_turn(turn, inputs)
+            commit_ready()
+            done[turn.index].set()
+
+        tasks = [asyncio.create_task(execute(turn)) for turn in self.turns if turn.index not in completed]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            commit_ready()
@@ -1,45 +1,433 @@
 import os
+import re
 import sys
 import json
 import logging
 import argparse
 import asyncio
+import contextlib
+import time
+import uuid
+import sqlite3
 from datetime import datetime
-from typing import List, Dict, Optional
-from anthropic import Anthropic
-from console_formatter import ConsoleFormatter
-from hat_handlers import HatManager
-
-# Configure logging
-logging.basicConfig(
-    filename='six_hats.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from typing import Callable, List, Dict, Optional, Sequence, Tuple, TYPE_CHECKING
+from hat_handlers import HatManager, Message
+from context_builder import DEFAULT_CONTEXT_TOKENS, count_tokens
+from run_journal import DEFAULT_JOURNAL_DIR, RunJournal, remaining_turns
+from decision_history import (
+    DEFAULT_DUPLICATE_THRESHOLD, DEFAULT_HISTORY_DB, DEFAULT_REUSE_MAX_AGE, DecisionHistory
 )
+from debate import DEFAULT_CONVERGENCE_THRESHOLD, DEFAULT_MIN_NOVELTY, ConvergenceTracker, DebateEngine
+from scheduler import DialogueSchedule, HatTurn
+from response_cache import ResponseCache
+from request_scheduler import RequestScheduler, is_retryable
+from model_backends import BACKENDS, DEFAULT_BACKEND, create_backend
+from model_routing import DEFAULT_ROUTING_FILE, ModelRouter, ModelTier
+from run_metrics import RunMetrics
+from structured_logging import DEFAULT_LOG_DIR, DEFAULT_LOG_LEVEL, configure_logging, current_run_id, span
+
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+    from console_formatter import ConsoleFormatter
+
+# Handlers are installed by configure_logging() when run as a script
 logger = logging.getLogger(__name__)
 
+# Models, max_tokens and timeouts per hat and step are chosen by model_routing
+
+# headless: no rendering and no rich import; stderr: rich output on stderr, keeping
+# stdout for JSON; pretty: rich output on stdout alongside the result
+OUTPUT_MODES = ('headless', 'stderr', 'pretty')
+DEFAULT_OUTPUT_MODE = os.environ.get('SIX_HATS_OUTPUT_MODE', 'stderr')
+# Where rendering runs. background: a render thread fed by a bounded queue, so
+# printing never holds up the next model call; inline: in the analysis itself
+RENDER_MODES = ('background', 'inline')
+DEFAULT_RENDER_MODE = os.environ.get('SIX_HATS_RENDER_MODE', 'background')
+
+# How a Blue turn that follows other messages gets its focus. two-call: a focus
+# call, then Blue's turn; speculative: the focus call starts as soon as the
+# preceding response is recorded and overlaps its rendering; merged: one call
+# returns both the focus and Blue's contribution
+BLUE_STEPS = ('two-call', 'speculative', 'merged')
+DEFAULT_BLUE_STEP = os.environ.get('SIX_HATS_BLUE_STEP', 'speculative')
+
+# Simultaneous model calls per analysis; above 1 independent hats run
+# concurrently (fanned out without dialog mode, as a dependency graph with it)
+DEFAULT_CONCURRENCY = int(os.environ.get('SIX_HATS_CONCURRENCY', 1))
+
+# What to do with a recent past run of a near-identical topic. report: only name
+# it in the result; warm: seed the discussion context with its digest; serve:
+# return it without calling the model when its hats order and mode match
+REUSE_MODES = ('report', 'warm', 'serve')
+
+MERGED_BLUE_REQUEST = """First decide what the next focus of the discussion should be: a clear, concise
+direction that addresses the most pressing aspects revealed in the dialogue so far.
+Then give your contribution as the Blue hat on that focus.
+
+Answer in exactly this format:
+<focus>the next focus</focus>
+<contribution>your contribution</contribution>"""
+
+_FOCUS_TAG = re.compile(r'<focus>(.*?)</focus>', re.DOTALL)
+_CONTRIBUTION_TAG = re.compile(r'<contribution>(.*?)(?:</contribution>|$)', re.DOTALL)
+
+def create_client(backend: str = DEFAULT_BACKEND) -> "AsyncAnthropic":
+    """
+    Creates the model client for a backend (env: SIX_HATS_BACKEND); a single
+    instance can be shared between analyzers so that its HTTP connection pool
+    stays warm across jobs
+    """
+    return create_backend(backend)
+
+def create_formatter(output_mode: str = DEFAULT_OUTPUT_MODE, render_mode: str = DEFAULT_RENDER_MODE):
+    """
+    Creates the console formatter for an output mode; rich is only imported
+    when something is actually rendered
+    """
+    if output_mode == 'headless':
+        from null_formatter import NullFormatter
+        return NullFormatter()
+
+    from rich.console import Console
+    from console_formatter import ConsoleFormatter
+    formatter = ConsoleFormatter(Console(stderr=output_mode != 'pretty'))
+    if render_mode == 'inline':
+        return formatter
+
+    from render_queue import BackgroundRenderer
+    return BackgroundRenderer(formatter)
+
+def parse_blue_turn(text: str, topic: str) -> Tuple[str, str]:
+    """
+    Splits a merged Blue response into (focus, contribution). Without a focus tag
+    the focus stays on the topic, as when the focus call fails; without a
+    contribution tag everything outside the focus tag is the contribution.
+    """
+    focus_match = _FOCUS_TAG.search(text)
+    contribution_match = _CONTRIBUTION_TAG.search(text)
+    focus = focus_match.group(1).strip() if focus_match else ""
+    if contribution_match:
+        contribution = contribution_match.group(1).strip()
+    else:
+        contribution = _FOCUS_TAG.sub('', text).strip()
+    return focus or topic, contribution or text.strip()
+
 class SixHatsAnalyzer:
-    def __init__(self):
-        self.api_key = os.environ.get('ANTHROPIC_API_KEY')
-        if not self.api_key:
-            raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
-
-        self.client = Anthropic(api_key=self.api_key)
-        self.hat_manager = HatManager()
-        self.console = ConsoleFormatter()
+    def __init__(
+        self,
+        client: Optional["AsyncAnthropic"] = None,
+        console: Optional["ConsoleFormatter"] = None,
+        max_concurrency: int = 1,
+        cache: Optional[ResponseCache] = None,
+        on_event: Optional[Callable[[Dict], None]] = None,
+        call_limiter: Optional[asyncio.Semaphore] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        context_tokens: int = DEFAULT_CONTEXT_TOKENS,
+        convergence_threshold: float = DEFAULT_CONVERGENCE_THRESHOLD,
+        min_novelty: float = DEFAULT_MIN_NOVELTY,
+        journal_dir: Optional[str] = None,
+        blue_step: str = DEFAULT_BLUE_STEP,
+        router: Optional[ModelRouter] = None,
+        history: Optional[DecisionHistory] = None,
+        reuse: str = 'report'
+    ):
+        self.client = client or create_client()
+        # Upper bound on simultaneous model calls when hats run concurrently
+        self.max_concurrency = max(1, max_concurrency)
+        # Shared response cache; None bypasses caching entirely
+        self.cache = cache
+        # Receives hat_start/token/hat_end events; when set, completions are streamed
+        self.on_event = on_event
+        # Semaphore shared by analyzers of one process to cap model calls globally
+        self.call_limiter = call_limiter
+        # Rate limits, timeouts and retries; share one instance to share the limits
+        self.scheduler = scheduler or RequestScheduler()
+        # Token budget for the discussion context sent with each turn
+        self.hat_manager = HatManager(context_tokens)
+        # Early-stop settings for multi-round debates
+        self.convergence_threshold = convergence_threshold
+        self.min_novelty = min_novelty
+        # Directory of checkpoint journals for resuming interrupted runs; None disables them
+        self.journal_dir = journal_dir
+        if blue_step not in BLUE_STEPS:
+            raise ValueError(f"Unknown Blue step {blue_step!r}; expected one of {', '.join(BLUE_STEPS)}")
+        # How Blue turns get their focus, see BLUE_STEPS
+        self.blue_step = blue_step
+        # Model tiers per hat and step, with fallbacks
+        self.router = router or ModelRouter()
+        # Store of completed runs, searched for near-duplicate topics; None disables both
+        if reuse not in REUSE_MODES:
+            raise ValueError(f"Unknown reuse mode {reuse!r}; expected one of {', '.join(REUSE_MODES)}")
+        self.history = history
+        self.reuse = reuse
+        # Tier, model and latency of each turn's call, attached to its message;
+        # keyed by (hat colour, turn) since concurrent turns may share a colour
+        self._turn_calls: Dict[Tuple[str, Optional[int]], Dict] = {}
+        self.console = console or create_formatter()
         self.current_topic: Optional[str] = None
+        # Latency, token usage and retries of every model call of this analyzer
+        self.metrics = RunMetrics()
+
+    async def analyze_topic(
+        self,
+        topic: str,
+        hats_order: List[str],
+        dialog_mode: bool,
+        run_id: Optional[str] = None,
+        max_rounds: int = 1
+    ) -> Dict:
+        run_id = run_id or uuid.uuid4().hex[:12]
+        similar_run = None
+        if self.history is not None:
+            match = self._find_similar_run(topic)
+            if match is not None:
+                if (
+                    self.reuse == 'serve'
+                    and match['hats_order'] == hats_order
+                    and match['dialog_mode'] == dialog_mode
+                    and match['max_rounds'] == max_rounds
+                ):
+                    return self._serve_from_history(topic, run_id, match)
+                similar_run = self._describe_match(match)
+                if self.reuse == 'warm':
+                    self._warm_start(match)
+                    similar_run['used'] = 'warm'
+
+        journal = None
+        if self.journal_dir:
+            journal = RunJournal.create(self.journal_dir, run_id, {
+                'topic': topic,
+                'hats_order': hats_order,
+                'dialog_mode': dialog_mode,
+                'max_rounds': max_rounds,
+                'similar_run': similar_run
+            })
+        return await self._analyze(topic, hats_order, dialog_mode, run_id, max_rounds, journal, similar_run=similar_run)
+
+    async def resume(self, run_id: str) -> Dict:
+        """
+        Continues an interrupted run from its journal: completed messages are
+        restored and only the hat turns that never finished are run
+        """
+        try:
+            if not self.journal_dir:
+                raise ValueError("Resuming requires a journal directory")
+            header, messages = RunJournal.load(self.journal_dir, run_id)
+        except ValueError as e:
+            logger.error(f"Cannot resume run {run_id}: {str(e)}")
+            return {'status': 'error', 'run_id': run_id, 'error': str(e), 'conversation': []}
+
+        similar_run = header.get('similar_run')
+        if similar_run and similar_run.get('used') == 'warm' and self.history is not None:
+            # The remaining turns get the same warm-started context
+            match = self.history.get(similar_run['run_id'])
+            if match is not None:
+                self._warm_start(match)
 
-    async def analyze_topic(self, topic: str, hats_order: List[str], dialog_mode: bool) -> Dict:
+        self.hat_manager.restore(messages)
+        logger.info(f"Resuming run {run_id} after {len(messages)} recorded messages")
+        journal = RunJournal(RunJournal.path_for(self.journal_dir, run_id))
+        return await self._analyze(
+            header['topic'],
+            header['hats_order'],
+            header['dialog_mode'],
+            run_id,
+            header.get('max_rounds', 1),
+            journal,
+            resumed=len(messages),
+            similar_run=similar_run
+        )
+
+    async def _analyze(
+        self,
+        topic: str,
+        hats_order: List[str],
+        dialog_mode: bool,
+        run_id: str,
+        max_rounds: int,
+        journal: Optional[RunJournal],
+        resumed: int = 0,
+        similar_run: Optional[Dict] = None
+    ) -> Dict:
+        # Tags every log record of this analysis, including those of its subtasks
+        current_run_id.set(run_id)
+        self.metrics.start()
+        self.hat_manager.dialogue_log.journal = journal
         try:
             self.current_topic = topic
             logger.info(f"Starting analysis for topic: {topic}")
             self.console.print_header(f"Analyzing: {topic}")
 
+            # Later rounds only make sense when hats hear each other
+            rounds = max_rounds if dialog_mode else 1
+
             # Create progress tracker
-            progress_task = self.console.create_progress_tracker(len(hats_order))
+            progress_task = self.console.create_progress_tracker(len(hats_order) * rounds - resumed)
+
+            with span('analysis', step='analysis'):
+                if rounds > 1:
+                    engine = DebateEngine(
+                        self,
+                        rounds,
+                        ConvergenceTracker(self.convergence_threshold, self.min_novelty)
+                    )
+                    run_info = {'debate': await engine.run(topic, hats_order, dialog_mode, progress_task, resumed)}
+                else:
+                    restored = self.hat_manager.get_dialogue_history()[:resumed]
+                    run_info = await self._run_round(topic, hats_order, dialog_mode, progress_task, restored)
+            if resumed:
+                run_info['resumed_messages'] = resumed
+            if similar_run:
+                run_info['similar_run'] = similar_run
+
+            # Complete progress tracking
+            self.console.complete_progress()
+            self.metrics.finish()
+            if journal is not None:
+                self.hat_manager.dialogue_log.journal = None
+                journal.close(delete=True)
 
-            current_focus = topic
-            for hat_color in hats_order:
+            if self.cache is not None:
+                logger.info(f"Response cache stats: {self.cache.stats()}")
+            self._record_history(run_id, topic, hats_order, dialog_mode, max_rounds)
+
+            # Show dialogue tree and statistics
+            with span('render', step='summary'):
+                self.console.print_dialogue_tree(self.hat_manager.get_dialogue_history())
+                self.console.print_analysis_statistics(self.hat_manager.get_dialogue_history())
+
+            return {
+                'status': 'success',
+                'run_id': run_id,
+                'conversation': self.hat_manager.export_dialogue(),
+                'usage': self.metrics.usage_report(),
+                'metrics': self.metrics.report(),
+                **run_info
+            }
+
+        except Exception as e:
+            logger.exception(f"Analysis failed: {str(e)}")
+            self.metrics.finish()
+            if journal is not None:
+                # Keep the journal so the run can be resumed
+                self.hat_manager.dialogue_log.journal = None
+                journal.close()
+                logger.info(f"Run {run_id} can be resumed with --resume {run_id}")
+            self.console.print_error(str(e))
+            return {
+                'status': 'error',
+                'run_id': run_id,
+                'error': str(e),
+                'conversation': self.hat_manager.export_dialogue(),
+                'usage': self.metrics.usage_report(),
+                'metrics': self.metrics.report()
+            }
+
+    def _find_similar_run(self, topic: str) -> Optional[Dict]:
+        try:
+            with span('history_lookup', step='history'):
+                match = self.history.find_similar(topic)
+        except sqlite3.Error as e:
+            logger.warning(f"Decision history lookup failed: {str(e)}")
+            return None
+        if match is not None:
+            logger.info(f"Found run {match['run_id']} on a similar topic ({match['similarity']}): {match['topic']}")
+        return match
+
+    @staticmethod
+    def _describe_match(match: Dict) -> Dict:
+        return {
+            'run_id': match['run_id'],
+            'topic': match['topic'],
+            'similarity': match['similarity'],
+            'created_at': datetime.fromtimestamp(match['created_at']).isoformat(),
+            'used': None
+        }
+
+    def _warm_start(self, match: Dict) -> None:
+        """
+        Seeds the discussion context with a digest of a past run
+        """
+        self.hat_manager.context_builder.warm_start([Message.from_dict(data) for data in match['conversation']])
+
+    def _serve_from_history(self, topic: str, run_id: str, match: Dict) -> Dict:
+        """
+        Answers with a past run of a near-identical topic instead of calling the model
+        """
+        current_run_id.set(run_id)
+        self.metrics.start()
+        self.current_topic = topic
+        logger.info(f"Serving {topic!r} from run {match['run_id']}")
+        self.console.print_header(f"Analyzing: {topic} (from history)")
+        self.hat_manager.restore(match['conversation'])
+        self.metrics.finish()
+        with span('render', step='summary'):
+            self.console.print_dialogue_tree(self.hat_manager.get_dialogue_history())
+            self.console.print_analysis_statistics(self.hat_manager.get_dialogue_history())
+        return {
+            'status': 'success',
+            'run_id': run_id,
+            'conversation': self.hat_manager.export_dialogue(),
+            'usage': self.metrics.usage_report(),
+            'metrics': self.metrics.report(),
+            'similar_run': {**self._describe_match(match), 'used': 'served'}
+        }
+
+    def _record_history(self, run_id: str, topic: str, hats_order: List[str], dialog_mode: bool, max_rounds: int) -> None:
+        """
+        Stores a completed run in the decision history; a failing store never
+        fails the analysis
+        """
+        if self.history is None:
+            return
+        try:
+            with span('history_record', step='history'):
+                self.history.record(
+                    run_id, topic, hats_order, dialog_mode, max_rounds, self.hat_manager.export_dialogue()
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Could not record run {run_id} in the decision history: {str(e)}")
+
+    async def _run_round(
+        self,
+        topic: str,
+        hats_order: List[str],
+        dialog_mode: bool,
+        progress_task: int,
+        restored: Sequence["Message"] = ()
+    ) -> Dict:
+        """
+        Runs one pass over hats_order with the strategy matching the concurrency
+        settings and returns run information for the result. restored are the
+        pass's messages already recorded before a resume; their turns are not run.
+        """
+        if self.max_concurrency > 1 and dialog_mode:
+            return {'schedule': await self._run_scheduled(topic, hats_order, progress_task, restored)}
+
+        turns = remaining_turns(hats_order, [message.hat for message in restored])
+        if not turns:
+            return {}
+        if self.max_concurrency <= 1:
+            await self._run_sequential(topic, turns, dialog_mode, progress_task)
+        else:
+            await self._run_fan_out(topic, turns, progress_task)
+        return {}
+
+    async def _run_sequential(
+        self,
+        topic: str,
+        hats_order: List[str],
+        dialog_mode: bool,
+        progress_task: int,
+        pending_focus: Optional["asyncio.Task[str]"] = None
+    ) -> None:
+        """
+        Runs the hats one after another, each seeing everything said before it.
+        pending_focus is a focus call already started for a leading Blue turn.
+        """
+        current_focus = topic
+        try:
+            for index, hat_color in enumerate(hats_order):
                 hat_handler = self.hat_manager.get_hat(hat_color)
                 if not hat_handler:
                     raise ValueError(f"Invalid hat color: {hat_color}")
@@ -49,79 +437,407 @@ class SixHatsAnalyzer:
                 # Get context from previous messages if in dialog mode
                 context = hat_handler.get_context_for_response() if dialog_mode else ""
 
-                # Special handling for Blue hat
-                if hat_color == 'blue':
-                    if len(self.hat_manager.get_dialogue_history()) > 0:
-                        # Update focus based on discussion
-                        current_focus = await self._get_blue_hat_focus(topic)
-
-                response = await self.process_hat_thinking(
-                    hat_color, 
-                    current_focus, 
-                    dialog_mode,
-                    context
-                )
+                # Special handling for Blue hat: update focus based on discussion
+                if hat_color == 'blue' and self.hat_manager.get_last_message() is not None:
+                    if self.blue_step == 'merged':
+                        current_focus, response = await self._process_blue_merged(topic, dialog_mode, context)
+                    else:
+                        focus_call, pending_focus = pending_focus or self._blue_focus(topic), None
+                        current_focus = await focus_call
+                        response = await self.process_hat_thinking('blue', current_focus, dialog_mode, context)
+                else:
+                    response = await self.process_hat_thinking(
+                        hat_color, 
+                        current_focus, 
+                        dialog_mode,
+                        context
+                    )
 
                 # Add message to history with proper context
-                last_message = self.hat_manager.get_dialogue_history()[-1] if self.hat_manager.get_dialogue_history() else None
-                response_to = last_message['id'] if last_message and dialog_mode else None
-                hat_handler.add_message(response, response_to)
+                last_message = self.hat_manager.get_last_message()
+                response_to = last_message.id if last_message and dialog_mode else None
+                message = self._add_response(hat_color, response, response_to)
 
-                # Print message with context
-                self.console.print_message(hat_handler.messages[-1])
+                if self.blue_step == 'speculative' and hats_order[index + 1:index + 2] == ['blue']:
+                    # The next focus only needs the dialogue, which is complete now,
+                    # so its call runs while this response is rendered
+                    pending_focus = asyncio.create_task(self._blue_focus(topic))
+                    await asyncio.to_thread(self._render_response, hat_color, message)
+                else:
+                    self._render_response(hat_color, message)
 
                 # Update progress
                 self.console.update_progress(progress_task)
+        finally:
+            if pending_focus is not None:
+                pending_focus.cancel()
 
-                # If it's the Blue hat, show summary after other hats have spoken
-                if hat_color == 'blue' and len(self.hat_manager.get_dialogue_history()) > 1:
-                    self.console.print_blue_hat_summary(response)
+    async def _run_fan_out(self, topic: str, hats_order: List[str], progress_task: int) -> None:
+        """
+        Runs the non-Blue hats concurrently, then the Blue hat turns over their results.
 
-            # Complete progress tracking
-            self.console.complete_progress()
+        Without dialog mode no hat's prompt depends on another hat's output, so only
+        Blue (whose focus is derived from the discussion) has to wait. Responses are
+        recorded in hats_order order, so message IDs and conversation order do not
+        depend on which request finishes first.
+        """
+        for hat_color in hats_order:
+            if not self.hat_manager.get_hat(hat_color):
+                raise ValueError(f"Invalid hat color: {hat_color}")
 
-            # Show dialogue tree and statistics
-            self.console.print_dialogue_tree(self.hat_manager.get_dialogue_history())
-            self.console.print_analysis_statistics(self.hat_manager.get_dialogue_history())
+        independent_hats = [hat_color for hat_color in hats_order if hat_color != 'blue']
+        blue_turns = [hat_color for hat_color in hats_order if hat_color == 'blue']
+        semaphore = asyncio.Semaphore(self.max_concurrency)
 
-            return {
-                'status': 'success',
-                'conversation': self.hat_manager.get_dialogue_history()
-            }
+        async def think(turn: int, hat_color: str) -> str:
+            async with semaphore:
+                response = await self.process_hat_thinking(hat_color, topic, False, turn=turn)
+            self.console.update_progress(progress_task)
+            return response
 
-        except Exception as e:
-            logger.error(f"Analysis failed: {str(e)}")
-            self.console.print_error(str(e))
-            return {
-                'status': 'error',
-                'error': str(e),
-                'conversation': self.hat_manager.get_dialogue_history()
-            }
+        responses = await asyncio.gather(
+            *(think(turn, hat_color) for turn, hat_color in enumerate(independent_hats)),
+            return_exceptions=True
+        )
+
+        # Keep every completed response, then surface the first failure
+        first_error: Optional[BaseException] = None
+        recorded = []
+        for turn, (hat_color, response) in enumerate(zip(independent_hats, responses)):
+            if isinstance(response, BaseException):
+                first_error = first_error or response
+                continue
+            recorded.append((hat_color, self._add_response(hat_color, response, None, turn)))
+
+        pending_focus = None
+        if not first_error and blue_turns and recorded and self.blue_step == 'speculative':
+            pending_focus = asyncio.create_task(self._blue_focus(topic))
+        for hat_color, message in recorded:
+            self.console.print_hat_transition(hat_color)
+            if pending_focus is not None:
+                await asyncio.to_thread(self._render_response, hat_color, message)
+            else:
+                self._render_response(hat_color, message)
+        if first_error:
+            raise first_error
+
+        await self._run_sequential(topic, blue_turns, False, progress_task, pending_focus)
+
+    async def _run_scheduled(
+        self,
+        topic: str,
+        hats_order: List[str],
+        progress_task: int,
+        restored: Sequence["Message"] = ()
+    ) -> Dict:
+        """
+        Runs a dialog-mode analysis as a dependency graph.
+
+        Each hat hears only the earlier hats it declares in depends_on (plus its own
+        previous turn and the latest Blue turn), so hats that do not need each other
+        run concurrently. Turns are committed in hats order, so restored messages
+        are a prefix of the pass; they satisfy their turns, and later turns depend
+        on them as in an uninterrupted run. Returns the schedule's critical path.
+        """
+        schedule = DialogueSchedule(hats_order, self.hat_manager)
+        focus_by_turn: Dict[int, str] = {}
+        message_ids: Dict[int, str] = {index: message.id for index, message in enumerate(restored)}
+        completed = {index: message.content for index, message in enumerate(restored)}
+        # Turns without dependencies in this pass hear the earlier rounds, if any
+        earlier_rounds = self.hat_manager.context_builder.build(len(self.hat_manager.dialogue_log) - len(restored))
+
+        async def run_turn(turn: HatTurn, inputs: Dict[int, str]) -> str:
+            # Hats follow the focus set by the latest Blue turn they depend on
+            blue_turns = [i for i in turn.depends_on if schedule.turns[i].color == 'blue']
+            focus = focus_by_turn.get(blue_turns[-1], topic) if blue_turns else topic
+            context = "\n".join(
+                f"{schedule.turns[i].color.upper()} hat: {inputs[i]}"
+                for i in turn.depends_on
+            ) if turn.depends_on else earlier_rounds
+
+            if turn.color == 'blue' and turn.depends_on:
+                if self.blue_step == 'merged':
+                    focus, response = await self._process_blue_merged(topic, True, context, turn.index)
+                    focus_by_turn[turn.index] = focus
+                    return response
+                # The turn starts as soon as its dependencies finish, which is
+                # already the earliest point a speculative focus call could start
+                focus = await self._blue_focus(topic)
+            focus_by_turn[turn.index] = focus
+            return await self.process_hat_thinking(turn.color, focus, True, context, turn=turn.index)
+
+        def commit_turn(turn: HatTurn, response: str) -> None:
+            self.console.print_hat_transition(turn.color)
+            response_to = message_ids[turn.depends_on[-1]] if turn.depends_on else None
+            message_ids[turn.index] = self._record_response(turn.color, response, response_to, turn.index)
+            self.console.update_progress(progress_task)
+
+        await schedule.run(run_turn, commit_turn, self.max_concurrency, completed)
+
+        critical_path = [message_ids[i] for i in schedule.critical_path()]
+        logger.info(f"Critical path ({len(critical_path)} of {len(hats_order)} turns): {critical_path}")
+        return {
+            'critical_path': critical_path,
+            'critical_path_length': len(critical_path)
+        }
+
+    def _record_response(
+        self,
+        hat_color: str,
+        response: str,
+        response_to: Optional[str],
+        turn: Optional[int] = None
+    ) -> str:
+        """
+        Adds a hat's response to the dialogue, renders it and returns its message ID
+        """
+        message = self._add_response(hat_color, response, response_to, turn)
+        self._render_response(hat_color, message)
+        return message.id
+
+    def _add_response(
+        self,
+        hat_color: str,
+        response: str,
+        response_to: Optional[str],
+        turn: Optional[int] = None
+    ) -> "Message":
+        """
+        Adds a hat's response to the dialogue and announces it; turn identifies
+        the call among concurrent turns of the same colour
+        """
+        hat_handler = self.hat_manager.get_hat(hat_color)
+        hat_handler.add_message(response, response_to, self._turn_calls.pop((hat_color, turn), None))
+        message = hat_handler.messages[-1]
+        self._emit({'event': 'hat_end', 'hat': hat_color, 'message': message.to_dict()})
+        return message
+
+    def _render_response(self, hat_color: str, message: "Message") -> None:
+        """
+        Renders a recorded response; safe to run in a worker thread
+        """
+        with span('render', step='message', hat=hat_color, message_id=message.id):
+            # Print message with context
+            self.console.print_message(message)
+
+            # If it's the Blue hat, show summary after other hats have spoken
+            if hat_color == 'blue' and len(self.hat_manager.get_dialogue_history()) > 1:
+                self.console.print_blue_hat_summary(message.content)
 
     async def process_hat_thinking(
         self, 
         hat_color: str, 
         topic: str, 
         dialog_mode: bool,
-        context: str = ""
+        context: str = "",
+        turn: Optional[int] = None
     ) -> str:
         try:
-            prompt_context = self._build_context(hat_color, dialog_mode, context)
+            system = self._build_system_prompt(hat_color, dialog_mode)
+            self._emit({'event': 'hat_start', 'hat': hat_color})
 
-            # the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
-            response = await self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1024,
-                messages=[{
-                    "role": "user",
-                    "content": f"{prompt_context}\n\nTopic: {topic}\n\nPrevious discussion: {context}"
-                }]
+            cache_key = None
+            if self.cache is not None:
+                tier = self.router.route('hat', hat_color)[0]
+                cache_key = ResponseCache.make_key(
+                    kind='hat',
+                    model=tier.model,
+                    max_tokens=tier.max_tokens,
+                    hat_prompt=self.hat_manager.get_hat(hat_color).get_prompt_context(),
+                    dialog_mode=dialog_mode,
+                    focus=topic,
+                    context=context
+                )
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Cache hit for {hat_color} hat", extra={'hat': hat_color})
+                    self.metrics.record_cache_hit('hat', hat_color)
+                    self._turn_calls[(hat_color, turn)] = {'tier': 'cache'}
+                    self._emit({'event': 'token', 'hat': hat_color, 'delta': cached})
+                    return cached
+
+            # Only the variable part goes into the user turn; the discussion is sent once
+            content = f"Topic: {topic}"
+            if context:
+                content += f"\n\nPrevious discussion:\n{context}"
+            messages = [{"role": "user", "content": content}]
+
+            response, fell_back = await self._complete(
+                'hat', hat_color, system, messages, stream=self.on_event is not None, turn=turn
+            )
+            text = response.content[0].text
+
+            # The key names the primary tier's model, so a fallback answer is not cached
+            if cache_key is not None and not fell_back:
+                self.cache.set(cache_key, text)
+            return text
+
+        except Exception as e:
+            logger.error(f"Error processing hat {hat_color}: {str(e)}", extra={'hat': hat_color})
+            raise
+
+    async def _complete(
+        self,
+        step: str,
+        hat_color: str,
+        system: List[Dict],
+        messages: List[Dict],
+        stream: bool = False,
+        turn: Optional[int] = None
+    ):
+        """
+        Makes one model call through the request scheduler on the tiers routed for
+        the step and hat, falling back to the next tier when one stays throttled
+        or too slow, and records its latency, usage and tier. Returns the response
+        and whether a fallback tier gave it.
+        """
+        tiers = self.router.route(step, hat_color)
+        attempts = 0
+        ttft: Optional[float] = None
+        # Local estimate for the tokens/min bucket
+        estimated_tokens = sum(count_tokens(block['text']) for block in system) + sum(count_tokens(m['content']) for m in messages)
+        started = time.perf_counter()
+
+        for position, tier in enumerate(tiers):
+            fallback = tiers[position + 1] if position + 1 < len(tiers) else None
+
+            async def attempt(tier: ModelTier = tier):
+                nonlocal attempts, ttft
+                attempts += 1
+                if stream:
+                    if attempts > 1:
+                        # Tell consumers to discard the tokens of the failed attempt
+                        self._emit({'event': 'hat_start', 'hat': hat_color, 'retry': attempts - 1})
+                    response, ttft = await self._stream_completion(hat_color, tier, system, messages)
+                    return response
+                async with self._call_slot():
+                    return await self.client.messages.create(
+                        model=tier.model,
+                        max_tokens=tier.max_tokens,
+                        system=system,
+                        messages=messages
+                    )
+
+            try:
+                with span('model_call', step=step, hat=hat_color, tier=tier.name):
+                    response = await self.scheduler.call(
+                        attempt,
+                        estimated_tokens=estimated_tokens,
+                        timeout=tier.timeout,
+                        max_retries=tier.fallback_after if fallback else None
+                    )
+            except Exception as e:
+                if fallback is None or not is_retryable(e):
+                    raise
+                logger.warning(
+                    f"{tier.name} tier failed for {step} of {hat_color} hat ({type(e).__name__}), "
+                    f"falling back to {fallback.name}",
+                    extra={'hat': hat_color}
+                )
+                continue
+
+            latency = time.perf_counter() - started
+            self.metrics.record_call(
+                step,
+                hat_color,
+                getattr(response, 'usage', None),
+                attempts,
+                latency,
+                ttft,
+                tier=tier.name,
+                fallbacks=position
             )
+            if step != 'blue-focus':
+                self._turn_calls[(hat_color, turn)] = {
+                    'tier': tier.name,
+                    'model': tier.model,
+                    'latency_ms': round(latency * 1000, 3)
+                }
+            return response, position > 0
+
+    async def _stream_completion(self, hat_color: str, tier: ModelTier, system: List[Dict], messages: List[Dict]):
+        """
+        Streams a completion, emitting each text delta as a token event, and
+        returns the final message with the time to its first token
+        """
+        ttft: Optional[float] = None
+        async with self._call_slot():
+            started = time.perf_counter()
+            async with self.client.messages.stream(
+                model=tier.model,
+                max_tokens=tier.max_tokens,
+                system=system,
+                messages=messages
+            ) as stream:
+                async for delta in stream.text_stream:
+                    if ttft is None:
+                        ttft = time.perf_counter() - started
+                    self._emit({'event': 'token', 'hat': hat_color, 'delta': delta})
+                return await stream.get_final_message(), ttft
+
+    def _call_slot(self):
+        return self.call_limiter if self.call_limiter is not None else contextlib.nullcontext()
+
+    def _emit(self, event: Dict) -> None:
+        if self.on_event is not None:
+            self.on_event(event)
+
+    async def _blue_focus(self, original_topic: str) -> str:
+        with span('blue_focus', step='blue-focus', hat='blue'):
+            return await self._get_blue_hat_focus(original_topic)
 
-            return response.content[0].text
+    async def _process_blue_merged(
+        self,
+        topic: str,
+        dialog_mode: bool,
+        context: str,
+        turn: Optional[int] = None
+    ) -> Tuple[str, str]:
+        """
+        Gets the next focus and Blue's contribution on it from a single call and
+        returns (focus, contribution). The response is not streamed token by
+        token, since its focus part is not Blue's contribution.
+        """
+        try:
+            system = self._build_system_prompt('blue', dialog_mode)
+            self._emit({'event': 'hat_start', 'hat': 'blue'})
+            # The focus is derived from the discussion even without dialog mode
+            discussion = context or self.hat_manager.context_builder.build()
+
+            cache_key = None
+            text = None
+            if self.cache is not None:
+                tier = self.router.route('blue-merged', 'blue')[0]
+                cache_key = ResponseCache.make_key(
+                    kind='blue-merged',
+                    model=tier.model,
+                    max_tokens=tier.max_tokens,
+                    hat_prompt=self.hat_manager.get_hat('blue').get_prompt_context(),
+                    dialog_mode=dialog_mode,
+                    topic=topic,
+                    context=discussion
+                )
+                text = self.cache.get(cache_key)
+                if text is not None:
+                    logger.info("Cache hit for merged Blue turn", extra={'hat': 'blue'})
+                    self.metrics.record_cache_hit('blue-merged', 'blue')
+                    self._turn_calls[('blue', turn)] = {'tier': 'cache'}
+
+            if text is None:
+                content = f"Topic: {topic}\n\nPrevious discussion:\n{discussion}\n\n{MERGED_BLUE_REQUEST}"
+                response, fell_back = await self._complete(
+                    'blue-merged', 'blue', system, [{"role": "user", "content": content}], turn=turn
+                )
+                text = response.content[0].text
+                if cache_key is not None and not fell_back:
+                    self.cache.set(cache_key, text)
+
+            focus, contribution = parse_blue_turn(text, topic)
+            self._emit({'event': 'token', 'hat': 'blue', 'delta': contribution})
+            return focus, contribution
 
         except Exception as e:
-            logger.error(f"Error processing hat {hat_color}: {str(e)}")
+            logger.error(f"Error processing merged Blue turn: {str(e)}", extra={'hat': 'blue'})
             raise
 
     async def _get_blue_hat_focus(self, original_topic: str) -> str:
@@ -129,16 +845,29 @@ class SixHatsAnalyzer:
         Have the Blue hat analyze the discussion and determine the next focus
         """
         try:
-            history = self.hat_manager.get_dialogue_history()
-            history_context = "\n".join([
-                f"{msg['hat'].upper()} hat: {msg['content']}"
-                for msg in history[-3:]  # Last 3 messages for context
-            ])
-
-            response = await self.client.messages.create(
-                model="claude-3-5-sonnet-20241022",
-                max_tokens=1024,
-                messages=[{
+            history_context = self.hat_manager.context_builder.build()
+
+            cache_key = None
+            if self.cache is not None:
+                tier = self.router.route('blue-focus', 'blue')[0]
+                cache_key = ResponseCache.make_key(
+                    kind='blue-focus',
+                    model=tier.model,
+                    max_tokens=tier.max_tokens,
+                    topic=original_topic,
+                    context=history_context
+                )
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Cache hit for Blue hat focus")
+                    self.metrics.record_cache_hit('blue-focus', 'blue')
+                    return cached
+
+            response, fell_back = await self._complete(
+                'blue-focus',
+                'blue',
+                self._build_system_prompt('blue', False),
+                [{
                     "role": "user",
                     "content": f"""
                     As the Blue hat, analyze the recent discussion about '{original_topic}':
@@ -152,35 +881,234 @@ class SixHatsAnalyzer:
                 }]
             )
 
-            return response.content[0].text
+            text = response.content[0].text
+            if cache_key is not None and not fell_back:
+                self.cache.set(cache_key, text)
+            return text
 
         except Exception as e:
             logger.error(f"Error getting Blue hat focus: {str(e)}")
             return original_topic
 
-    def _build_context(self, hat_color: str, dialog_mode: bool, context: str = "") -> str:
+    def _build_system_prompt(self, hat_color: str, dialog_mode: bool) -> List[Dict]:
+        """
+        Builds the static system prefix for a hat. It is identical across runs, so it
+        is marked for the provider's prompt caching; the topic and discussion go in
+        the user turn.
+        """
         hat = self.hat_manager.get_hat(hat_color)
         base_context = hat.get_prompt_context()
 
         if dialog_mode:
-            base_context += f"\n\nConsider the previous discussion:\n{context}"
+            base_context += "\n\nConsider the previous discussion provided with the topic."
             if hat_color == 'blue':
                 base_context += "\nAs the Blue hat, guide the discussion and maintain focus."
 
-        return base_context
+        return [{"type": "text", "text": base_context, "cache_control": {"type": "ephemeral"}}]
 
 async def async_main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--topic', required=True)
-    parser.add_argument('--hats', required=True)
-    parser.add_argument('--dialog-mode', required=True)
+    parser.add_argument('--topic')
+    parser.add_argument('--hats')
+    parser.add_argument('--dialog-mode')
+    parser.add_argument('--worker', action='store_true',
+                        help='Serve newline-delimited JSON jobs instead of a single topic')
+    parser.add_argument('--socket',
+                        help='Unix socket path for worker mode (defaults to stdin/stdout)')
+    parser.add_argument('--ipc-fd', type=int,
+                        help='With --worker: read framed jobs from stdin and write framed results to this file descriptor')
+    parser.add_argument('--batch',
+                        help='JSONL file of jobs (topic, selectedHats) to analyze, or - for stdin')
+    parser.add_argument('--pool-size', type=int,
+                        help='Number of jobs a worker or batch runs concurrently')
+    parser.add_argument('--global-concurrency', type=int,
+                        help='Maximum simultaneous model calls across all jobs of a worker or batch')
+    parser.add_argument('--requests-per-minute', type=float,
+                        help='Model request rate limit shared by all jobs')
+    parser.add_argument('--tokens-per-minute', type=float,
+                        help='Model token rate limit shared by all jobs')
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help='Retries for throttled, overloaded or failed model calls')
+    parser.add_argument('--request-timeout', type=float,
+                        help='Seconds before a single model call is abandoned and retried; '
+                             'overrides the timeouts of all model routing tiers')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help='Maximum simultaneous model calls per analysis; above 1 independent hats run concurrently '
+                             '(env: SIX_HATS_CONCURRENCY)')
+    parser.add_argument('--context-tokens', type=int, default=DEFAULT_CONTEXT_TOKENS,
+                        help='Token budget for the discussion context sent with each turn')
+    parser.add_argument('--max-rounds', type=int, default=1,
+                        help='Maximum debate rounds in dialog mode; stops early once the discussion converges')
+    parser.add_argument('--convergence-threshold', type=float, default=DEFAULT_CONVERGENCE_THRESHOLD,
+                        help='Similarity of consecutive Blue summaries (or hat turns) treated as unchanged')
+    parser.add_argument('--min-novelty', type=float, default=DEFAULT_MIN_NOVELTY,
+                        help='Share of new content below which a debate round ends the analysis')
+    parser.add_argument('--blue-step', choices=BLUE_STEPS, default=DEFAULT_BLUE_STEP,
+                        help='How Blue turns get their focus: a separate call, one started speculatively, '
+                             'or merged into the Blue turn (env: SIX_HATS_BLUE_STEP)')
+    parser.add_argument('--routing', default=DEFAULT_ROUTING_FILE,
+                        help='JSON file with model tiers and per-hat/per-step routes (env: SIX_HATS_ROUTING)')
+    parser.add_argument('--history-db', default=DEFAULT_HISTORY_DB,
+                        help='SQLite file recording every completed analysis for search and reuse (env: SIX_HATS_HISTORY_DB)')
+    parser.add_argument('--reuse', choices=REUSE_MODES, default='report',
+                        help='What to do with a recent run of a near-identical topic: name it in the result, '
+                             'warm-start the context from it, or serve it without model calls')
+    parser.add_argument('--duplicate-threshold', type=float, default=DEFAULT_DUPLICATE_THRESHOLD,
+                        help='Topic similarity (0-1) at which a past run counts as a near-duplicate')
+    parser.add_argument('--reuse-max-age', type=float, default=DEFAULT_REUSE_MAX_AGE,
+                        help='Seconds a past run stays eligible for reuse')
+    parser.add_argument('--search', metavar='QUERY',
+                        help='Full-text search the decision history and print the matching runs as JSON')
+    parser.add_argument('--journal-dir', default=DEFAULT_JOURNAL_DIR,
+                        help='Directory of checkpoint journals of unfinished runs (env: SIX_HATS_JOURNAL_DIR)')
+    parser.add_argument('--no-journal', action='store_true',
+                        help='Do not checkpoint completed messages')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='Continue an interrupted run from its journal instead of starting a new one')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Bypass the response cache')
+    parser.add_argument('--cache-db', default=os.environ.get('SIX_HATS_CACHE_DB'),
+                        help='SQLite file persisting cached responses between runs')
+    parser.add_argument('--cache-ttl', type=float, default=24 * 3600,
+                        help='Seconds a cached response stays valid')
+    parser.add_argument('--stream', action='store_true',
+                        help='Emit NDJSON events (hat_start, token, hat_end, result) as tokens arrive')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help='Model backend; mock runs offline (env: SIX_HATS_BACKEND)')
+    parser.add_argument('--log-dir', default=DEFAULT_LOG_DIR,
+                        help='Directory for rotating JSON logs, one file per process (env: SIX_HATS_LOG_DIR)')
+    parser.add_argument('--log-level', default=DEFAULT_LOG_LEVEL,
+                        help='Log level; DEBUG adds a record per message (env: SIX_HATS_LOG_LEVEL)')
+    parser.add_argument('--output-mode', choices=OUTPUT_MODES, default=DEFAULT_OUTPUT_MODE,
+                        help='Where human-readable rendering goes (env: SIX_HATS_OUTPUT_MODE)')
+    parser.add_argument('--headless', dest='output_mode', action='store_const', const='headless',
+                        help='Skip all rich rendering; shorthand for --output-mode headless')
+    parser.add_argument('--render-mode', choices=RENDER_MODES, default=DEFAULT_RENDER_MODE,
+                        help='Render on a background thread or inline (env: SIX_HATS_RENDER_MODE)')
 
     args = parser.parse_args()
-    hats_order = json.loads(args.hats)
-    dialog_mode = args.dialog_mode.lower() == 'true'
+    configure_logging(args.log_dir, args.log_level)
+    journal_dir = None if args.no_journal else args.journal_dir
+    router = ModelRouter.from_file(args.routing)
+    if args.request_timeout:
+        router = router.with_timeout(args.request_timeout)
+    history = None
+    if args.history_db:
+        history = DecisionHistory(args.history_db, args.duplicate_threshold, args.reuse_max_age)
+
+    if args.search:
+        if history is None:
+            parser.error('--search requires --history-db')
+        print(json.dumps(history.search(args.search), ensure_ascii=False))
+        return
+
+    cache = None if args.no_cache else ResponseCache(ttl_seconds=args.cache_ttl, db_path=args.cache_db)
+    scheduler = RequestScheduler(
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        max_retries=args.max_retries
+    )
+
+    # Workers and streams own stdout, so pretty output falls back to stderr there
+    output_mode = args.output_mode
+    if output_mode == 'pretty' and (args.worker or args.batch or args.stream):
+        output_mode = 'stderr'
+    # Concurrent jobs would each open a live view on the same stream
+    render_mode = 'inline' if args.worker or args.batch else args.render_mode
+
+    if args.worker or args.batch:
+        from worker import AnalysisWorker
+
+        # A batch keeps as many topics in flight as it may make calls at once
+        global_concurrency = args.global_concurrency or (8 if args.batch else None)
+        pool_size = args.pool_size or global_concurrency or 1
+        call_limiter = asyncio.Semaphore(global_concurrency) if global_concurrency else None
+
+        # One warm client for all jobs
+        client = create_client(args.backend)
+        worker = AnalysisWorker(
+            lambda: SixHatsAnalyzer(
+                client=client,
+                console=create_formatter(output_mode, render_mode),
+                max_concurrency=args.concurrency,
+                cache=cache,
+                call_limiter=call_limiter,
+                scheduler=scheduler,
+                context_tokens=args.context_tokens,
+                convergence_threshold=args.convergence_threshold,
+                min_novelty=args.min_novelty,
+                journal_dir=journal_dir,
+                blue_step=args.blue_step,
+                router=router,
+                history=history,
+                reuse=args.reuse
+            ),
+            pool_size=pool_size
+        )
+        if args.batch and args.batch != '-':
+            await worker.serve_file(args.batch)
+        elif args.ipc_fd is not None:
+            await worker.serve_framed(args.ipc_fd)
+        elif args.socket:
+            await worker.serve_unix_socket(args.socket)
+        else:
+            await worker.serve_stdin()
+        return
+
+    if not (args.resume or (args.topic and args.hats and args.dialog_mode)):
+        parser.error('--topic, --hats and --dialog-mode are required unless --worker, --batch or --resume is set')
+
+    async def run(analyzer: SixHatsAnalyzer) -> Dict:
+        if args.resume:
+            return await analyzer.resume(args.resume)
+        return await analyzer.analyze_topic(
+            args.topic,
+            json.loads(args.hats),
+            args.dialog_mode.lower() == 'true',
+            max_rounds=args.max_rounds
+        )
+
+    if args.stream:
+        def write_event(event: Dict) -> None:
+            sys.stdout.write(json.dumps(event) + "\n")
+            sys.stdout.flush()
+
+        analyzer = SixHatsAnalyzer(
+            client=create_client(args.backend),
+            console=create_formatter(output_mode, render_mode),
+            max_concurrency=args.concurrency,
+            cache=cache,
+            on_event=write_event,
+            scheduler=scheduler,
+            context_tokens=args.context_tokens,
+            convergence_threshold=args.convergence_threshold,
+            min_novelty=args.min_novelty,
+            journal_dir=journal_dir,
+            blue_step=args.blue_step,
+            router=router,
+            history=history,
+            reuse=args.reuse
+        )
+        result = await run(analyzer)
+        write_event({'event': 'result', **result})
+        return
 
-    analyzer = SixHatsAnalyzer()
-    result = await analyzer.analyze_topic(args.topic, hats_order, dialog_mode)
+    analyzer = SixHatsAnalyzer(
+        client=create_client(args.backend),
+        console=create_formatter(output_mode, render_mode),
+        max_concurrency=args.concurrency,
+        cache=cache,
+        scheduler=scheduler,
+        context_tokens=args.context_tokens,
+        convergence_threshold=args.convergence_threshold,
+        min_novelty=args.min_novelty,
+        journal_dir=journal_dir,
+        blue_step=args.blue_step,
+        router=router,
+        history=history,
+        reuse=args.reuse
+    )
+    result = await run(analyzer)
 
     print(json.dumps(result))
 
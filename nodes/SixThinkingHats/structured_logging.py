@@ -0,0 +1,194 @@
+import os
+import copy
+import glob
+import json
+import time
+import queue
+import atexit
+import logging
+import tempfile
+import contextlib
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+# Run ID of the analysis the current task belongs to; asyncio tasks inherit it,
+# so concurrent jobs of one worker keep their own value
+current_run_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('current_run_id', default=None)
+
+# Record attributes (passed through extra=) copied into the JSON output
+CONTEXT_FIELDS = ('run_id', 'hat', 'message_id', 'step', 'tier', 'span', 'duration_ms', 'attempts')
+
+DEFAULT_LOG_DIR = os.environ.get('SIX_HATS_LOG_DIR', os.path.join(tempfile.gettempdir(), 'six_hats'))
+DEFAULT_LOG_LEVEL = os.environ.get('SIX_HATS_LOG_LEVEL', 'INFO')
+# Log files (with their backups) of finished processes kept in the log directory
+DEFAULT_LOG_KEEP = int(os.environ.get('SIX_HATS_LOG_KEEP', 10))
+
+spans_logger = logging.getLogger('six_hats.spans')
+
+class RunContextFilter(logging.Filter):
+    """
+    Tags records with the current run ID; runs in the logging call, so the
+    context variable is read in the task that logged
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, 'run_id', None) is None:
+            record.run_id = current_run_id.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'pid': record.process,
+            'msg': record.getMessage()
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that keeps the traceback in its own field. The base class
+    formats exc_info into msg and drops it, so JsonFormatter would never emit
+    exc; here the traceback is rendered to exc_text (the traceback itself must
+    not outlive the logging call) and msg stays the plain message.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class SizeAndTimeRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotates when the file exceeds max_bytes or is older than interval seconds,
+    keeping backup_count numbered backups
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int, interval: float):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+def prune_logs(log_dir: str, keep: int = DEFAULT_LOG_KEEP) -> List[str]:
+    """
+    Deletes the log files of finished processes except the keep most recent
+    ones, so that one file per process does not grow the directory without
+    bound; files of running processes are never touched. Returns the removed paths.
+    """
+    files_by_pid: Dict[int, List[str]] = {}
+    for path in glob.glob(os.path.join(log_dir, 'six_hats-*.log*')):
+        pid = os.path.basename(path)[len('six_hats-'):].split('.', 1)[0]
+        if pid.isdigit():
+            files_by_pid.setdefault(int(pid), []).append(path)
+
+    def last_written(paths: List[str]) -> float:
+        return max(os.path.getmtime(path) for path in paths)
+
+    finished = [
+        paths for pid, paths in files_by_pid.items()
+        if pid != os.getpid() and not _process_alive(pid)
+    ]
+    finished.sort(key=last_written, reverse=True)
+
+    removed = []
+    for paths in finished[keep:]:
+        for path in paths:
+            try:
+                os.remove(path)
+                removed.append(path)
+            except OSError:
+                pass
+    return removed
+
+def configure_logging(
+    log_dir: str = DEFAULT_LOG_DIR,
+    level: str = DEFAULT_LOG_LEVEL,
+    max_bytes: int = int(os.environ.get('SIX_HATS_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+    backup_count: int = int(os.environ.get('SIX_HATS_LOG_BACKUPS', 5)),
+    interval: float = float(os.environ.get('SIX_HATS_LOG_ROTATE_SECONDS', 24 * 3600)),
+    keep: int = DEFAULT_LOG_KEEP
+) -> logging.handlers.QueueListener:
+    """
+    Routes all logging through a queue to a background thread that writes
+    rotating JSON lines; logging calls only enqueue the record.
+
+    Each process writes its own file so that concurrent workers never share one;
+    files of finished processes beyond the keep most recent are removed.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    prune_logs(log_dir, keep)
+    file_handler = SizeAndTimeRotatingFileHandler(
+        os.path.join(log_dir, f"six_hats-{os.getpid()}.log"),
+        max_bytes,
+        backup_count,
+        interval
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(RunContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+@contextlib.contextmanager
+def span(name: str, **fields) -> Iterator[None]:
+    """
+    Logs how long the enclosed block took; costs one level check when
+    span logging is disabled
+    """
+    if not spans_logger.isEnabledFor(logging.INFO):
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration_ms = round((time.perf_counter() - start) * 1000, 3)
+        spans_logger.info(name, extra={'span': name, 'duration_ms': duration_ms, **fields})
@@ -0,0 +1,67 @@
+import json
+import asyncio
+from typing import Dict, List, Optional, Tuple
+
+MESSAGE = {
+    'id': 'msg_fake',
+    'type': 'message',
+    'role': 'assistant',
+    'model': 'fake-model',
+    'content': [{'type': 'text', 'text': 'ok'}],
+    'stop_reason': 'end_turn',
+    'stop_sequence': None,
+    'usage': {'input_tokens': 3, 'output_tokens': 1}
+}
+
+ERROR_TYPES = {
+    400: 'invalid_request_error',
+    429: 'rate_limit_error',
+    500: 'api_error',
+    503: 'api_error',
+    529: 'overloaded_error'
+}
+
+class FakeModelServer:
+    """
+    Messages API on localhost that answers the first requests with scripted
+    error responses, (status, headers) each, and every later one with a message
+    """
+
+    def __init__(self, failures: List[Tuple[int, Optional[Dict[str, str]]]]):
+        self.failures = list(failures)
+        self.requests = 0
+        self.base_url = None
+        self._server = None
+
+    async def __aenter__(self) -> "FakeModelServer":
+        self._server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        port = self._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = 0
+        for line in head.decode('latin-1').split("\r\n")[1:]:
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        await reader.readexactly(length)
+        self.requests += 1
+
+        if self.failures:
+            status, headers = self.failures.pop(0)
+            body = {'type': 'error', 'error': {'type': ERROR_TYPES.get(status, 'api_error'), 'message': 'injected'}}
+        else:
+            status, headers, body = 200, None, MESSAGE
+        payload = json.dumps(body).encode('utf-8')
+        lines = [f"HTTP/1.1 {status} Injected", "Content-Type: application/json",
+                 f"Content-Length: {len(payload)}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + payload)
+        await writer.drain()
+        writer.close()
@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from model_backends import MockBackend
+from null_formatter import NullFormatter
+from six_hats_prompt import SixHatsAnalyzer, parse_blue_turn
+
+HATS = ['blue', 'white', 'red', 'blue', 'black', 'blue']
+
+def analyze(blue_step, max_concurrency=1, dialog_mode=True):
+    backend = MockBackend(latency=0, tokens_per_second=1e6)
+    analyzer = SixHatsAnalyzer(
+        client=backend,
+        console=NullFormatter(),
+        max_concurrency=max_concurrency,
+        blue_step=blue_step
+    )
+    result = asyncio.run(analyzer.analyze_topic("Open a second office", HATS, dialog_mode))
+    assert result['status'] == 'success'
+    return result, backend
+
+def shape(conversation):
+    return [(m['hat'], m['id'], m['response_to'], m['content']) for m in conversation]
+
+@pytest.mark.parametrize('max_concurrency, dialog_mode', [(1, True), (4, True), (4, False)])
+def test_speculative_focus_matches_two_call(max_concurrency, dialog_mode):
+    two_call, two_call_backend = analyze('two-call', max_concurrency, dialog_mode)
+    speculative, speculative_backend = analyze('speculative', max_concurrency, dialog_mode)
+    assert shape(speculative['conversation']) == shape(two_call['conversation'])
+    # Speculation only moves the focus call earlier, it never adds one
+    assert speculative_backend.calls == two_call_backend.calls
+
+def test_merged_step_saves_one_call_per_blue_turn_after_the_first():
+    two_call, two_call_backend = analyze('two-call')
+    merged, merged_backend = analyze('merged')
+    assert [m['hat'] for m in merged['conversation']] == HATS
+    # Only the opening Blue turn has no discussion to take a focus from
+    assert two_call_backend.calls - merged_backend.calls == HATS.count('blue') - 1
+
+def test_parse_blue_turn():
+    assert parse_blue_turn("<focus> Costs </focus>\n<contribution>Check rent.</contribution>", "topic") == ('Costs', 'Check rent.')
+    # A reply cut off by max_tokens has no closing contribution tag
+    assert parse_blue_turn("<focus>Costs</focus><contribution>Check re", "topic") == ('Costs', 'Check re')
+    assert parse_blue_turn("<focus>Costs</focus> Check rent.", "topic") == ('Costs', 'Check rent.')
+    assert parse_blue_turn("Check rent.", "topic") == ('topic', 'Check rent.')
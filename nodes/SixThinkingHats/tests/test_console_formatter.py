@@ -0,0 +1,59 @@
+import io
+import sys
+
+from rich.console import Console
+
+from console_formatter import ConsoleFormatter
+from hat_handlers import Message
+
+def formatter() -> ConsoleFormatter:
+    return ConsoleFormatter(Console(file=io.StringIO(), width=160, color_system=None))
+
+def output(formatter: ConsoleFormatter) -> str:
+    return formatter.console.file.getvalue()
+
+def test_response_time_percentiles_use_nearest_rank():
+    assert ConsoleFormatter._format_response_times([]) == ("-", "-", "-")
+    assert ConsoleFormatter._format_response_times([2.0]) == ("2.00s", "2.00s", "2.00s")
+    values = [float(i) for i in range(20, 0, -1)]
+    assert ConsoleFormatter._format_response_times(values) == ("10.50s", "10.00s", "19.00s")
+
+def test_statistics_table_has_a_row_per_hat_and_a_total():
+    messages = [Message('white', 0, "Facts", 100.0)]
+    # Every red reply arrives 1s after the previous message, every black one 3s after
+    for i in range(1, 5):
+        previous = messages[-1]
+        hat, delay = ('red', 1.0) if i % 2 else ('black', 3.0)
+        messages.append(Message(hat, i // 2, f"Reply {i}", previous.timestamp + delay, previous.id))
+    f = formatter()
+    f.print_analysis_statistics(messages)
+
+    rows = {line.split('│')[1].strip(): [cell.strip() for cell in line.split('│')[2:-1]]
+            for line in output(f).splitlines() if line.count('│') == 7}
+    assert rows['👒 WHITE'] == ['1', '20.0%', '-', '-', '-']
+    assert rows['🧢 RED'] == ['2', '40.0%', '1.00s', '1.00s', '1.00s']
+    assert rows['🎓 BLACK'] == ['2', '40.0%', '3.00s', '3.00s', '3.00s']
+    assert rows['ALL'] == ['5', '100.0%', '2.00s', '1.00s', '3.00s']
+
+def test_replies_to_unknown_messages_become_roots():
+    messages = [
+        Message('white', 0, "Root", 1.0),
+        Message('red', 0, "Reply to root", 2.0, 'white_0'),
+        Message('black', 0, "Reply to a message of another run", 3.0, 'blue_7'),
+        Message('yellow', 0, "Reply to the orphan", 4.0, 'black_0'),
+    ]
+    f = formatter()
+    f.print_dialogue_tree(messages)
+    lines = [line for line in output(f).splitlines() if ':' in line]
+    depth = {line.split(': ', 1)[1]: len(line) - len(line.lstrip(' │├└─')) for line in lines}
+    assert list(depth) == ["Root", "Reply to root", "Reply to a message of another run", "Reply to the orphan"]
+    assert depth["Root"] == depth["Reply to a message of another run"]
+    assert depth["Reply to root"] == depth["Reply to the orphan"] > depth["Root"]
+
+def test_deep_reply_chains_do_not_recurse():
+    messages = [Message('white', 0, "m0", 0.0)]
+    for i in range(1, sys.getrecursionlimit() + 100):
+        messages.append(Message('white', i, f"m{i}", float(i), messages[-1].id))
+    f = ConsoleFormatter(Console(file=io.StringIO(), width=100000, color_system=None))
+    f.print_dialogue_tree(messages)
+    assert output(f).count("WHITE") == len(messages)
@@ -0,0 +1,74 @@
+import time
+
+from context_builder import ContextBuilder, count_tokens, truncate_to_tokens
+from hat_handlers import DialogueLog, Message
+
+HATS = ['white', 'red', 'black', 'yellow', 'green', 'blue']
+
+def log_of(count: int) -> DialogueLog:
+    log = DialogueLog()
+    for i in range(count):
+        hat = HATS[i % len(HATS)]
+        log.append(Message(hat, i // len(HATS), f"Point {i} is about rent. It keeps rising every quarter in the centre.", time.monotonic()))
+    return log
+
+def test_cyrillic_is_counted_by_bytes():
+    assert count_tokens("hello!") == 2
+    # Two bytes per Cyrillic letter
+    assert count_tokens("привет") == 3
+    cut = truncate_to_tokens("аренда растёт каждый квартал", 4)
+    assert cut.endswith('…')
+    assert count_tokens(cut[:-1]) <= 4
+    assert "аренда растёт каждый квартал".startswith(cut[:-1])
+
+def test_context_stays_within_budget_and_folds_each_message_once():
+    full = log_of(60)
+    log = DialogueLog()
+    builder = ContextBuilder(log, max_tokens=200)
+    digested = []
+    digest = builder._digest
+    builder._digest = lambda message, source="": (digested.append(message.id), digest(message, source))[1]
+
+    for message in full.messages:
+        log.append(message)
+        context = builder.build()
+        # Newlines and the two section headings are the only overhead
+        assert count_tokens(context) <= builder.max_tokens + 20
+        assert builder.render(message) in context
+
+    assert len(digested) == len(set(digested))
+    assert digested == [message.id for message in full.messages[:len(digested)]]
+    assert builder._folded == len(digested) > 0
+
+def test_summary_keeps_newest_digests_within_its_share():
+    builder = ContextBuilder(log_of(60), max_tokens=200)
+    context = builder.build()
+    summary, recent = context.split("\n\nRecent discussion:\n")
+    assert builder.summary_tokens == 60
+    assert builder._summary_total <= builder.summary_tokens
+    assert count_tokens(summary) <= builder.summary_tokens + 10
+    # Oldest digests were dropped; the newest folded message is still there
+    assert "Point 0 " not in summary
+    assert f"Point {builder._folded - 1} " in summary
+    assert recent.startswith(builder.render(builder.dialogue_log.messages[builder._folded]))
+
+def test_partial_build_covers_only_the_first_end_messages():
+    log = log_of(60)
+    builder = ContextBuilder(log, max_tokens=200)
+    full = builder.build()
+    folded = builder._folded
+    assert 20 < folded < 59
+
+    for end in (1, 5, 20, 59):
+        context = builder.build(end)
+        assert context.endswith(builder.render(log.messages[end - 1]))
+        assert f"Point {end} " not in context
+        if end < folded:
+            # Below the fold boundary the context is the one the log cut at end would get
+            cut = DialogueLog()
+            for message in log.messages[:end]:
+                cut.append(message)
+            assert context == ContextBuilder(cut, max_tokens=200).build()
+
+    # Partial builds leave the rolling summary alone
+    assert builder.build() == full
@@ -0,0 +1,103 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+from debate import ConvergenceTracker, DebateEngine, shingles, similarity
+from hat_handlers import DialogueLog, Message
+
+HATS = ['white', 'red', 'blue']
+
+def text(prefix: str, words: int = 30) -> str:
+    return ' '.join(f"{prefix}{i}" for i in range(words))
+
+class ScriptedAnalyzer:
+    """
+    Stands in for SixHatsAnalyzer: each round appends the scripted text of
+    every hat not covered by the restored messages
+    """
+
+    def __init__(self, script):
+        self.script = script
+        self.hat_manager = SimpleNamespace(dialogue_log=DialogueLog())
+        self.rounds_run = []
+
+    def add(self, hat: str, content: str) -> None:
+        log = self.hat_manager.dialogue_log
+        log.append(Message(hat, len(log), content, time.monotonic()))
+
+    async def _run_round(self, topic, hats_order, dialog_mode, progress_task, restored=()):
+        round_index = len(self.rounds_run)
+        self.rounds_run.append((list(hats_order), len(restored)))
+        for hat in hats_order[len(restored):]:
+            self.add(hat, self.script[round_index][hat])
+
+def run_debate(analyzer, max_rounds, resumed=0):
+    return asyncio.run(DebateEngine(analyzer, max_rounds).run("topic", HATS, True, 0, resumed))
+
+def test_similarity_of_shingles():
+    assert shingles("") == frozenset()
+    assert len(shingles("two words")) == 1
+    assert similarity(frozenset(), frozenset()) == 1.0
+    assert similarity(shingles(text('a')), shingles(text('a'))) == 1.0
+    assert similarity(shingles(text('a')), shingles(text('b'))) == 0.0
+
+def test_tracker_settles_repeating_hats_but_never_blue():
+    tracker = ConvergenceTracker()
+    first = tracker.observe_round({'white': text('w'), 'blue': text('b')})
+    assert first == {'novelty': 1.0, 'summary_similarity': None, 'settled': []}
+
+    second = tracker.observe_round({'white': text('w'), 'blue': text('b')})
+    assert second['settled'] == ['white']
+    assert second['summary_similarity'] == 1.0
+    assert second['novelty'] == 0.0
+
+def test_stops_when_blue_summary_converges():
+    analyzer = ScriptedAnalyzer([
+        {'white': text('w1'), 'red': text('r1'), 'blue': text('b')},
+        {'white': text('w2'), 'red': text('r2'), 'blue': text('b')},
+        {'white': text('w3'), 'red': text('r3'), 'blue': text('b3')},
+    ])
+    debate = run_debate(analyzer, max_rounds=3)
+    assert debate['stop_reason'] == 'converged'
+    assert debate['rounds'] == 2
+
+def test_stops_when_a_round_adds_little_new_content():
+    analyzer = ScriptedAnalyzer([
+        {'white': text('w', 200), 'red': text('r', 200), 'blue': text('b1', 10)},
+        {'white': text('w', 200), 'red': text('r', 200), 'blue': text('b2', 10)},
+    ])
+    debate = run_debate(analyzer, max_rounds=3)
+    assert debate['stop_reason'] == 'no_new_content'
+    assert debate['history'][1]['novelty'] < 0.15
+
+def test_settled_hats_are_skipped_until_all_have_settled():
+    analyzer = ScriptedAnalyzer([
+        {'white': text('w'), 'red': text('r1'), 'blue': text('b1')},
+        {'white': text('w'), 'red': text('r2'), 'blue': text('b2')},
+        {'red': text('r2'), 'blue': text('b3')},
+        {'red': text('r4'), 'blue': text('b4')},
+    ])
+    debate = run_debate(analyzer, max_rounds=4)
+    assert [hats for hats, _ in analyzer.rounds_run] == [HATS, HATS, ['red', 'blue']]
+    assert [entry['settled'] for entry in debate['history']] == [[], ['white'], ['red']]
+    assert debate['stop_reason'] == 'all_hats_settled'
+
+def test_restored_rounds_are_replayed_without_running_them():
+    script = [
+        {'white': text('w'), 'red': text('r1'), 'blue': text('b1')},
+        {'white': text('w'), 'red': text('r2'), 'blue': text('b2')},
+        {'red': text('r3'), 'blue': text('b3')},
+    ]
+    uninterrupted = run_debate(ScriptedAnalyzer(script), max_rounds=3)
+
+    analyzer = ScriptedAnalyzer(script)
+    # The first round and White's turn of the second were journaled
+    for hat in HATS:
+        analyzer.add(hat, script[0][hat])
+    analyzer.add('white', script[1]['white'])
+    # Keeps the script aligned: round one is not run again
+    analyzer.rounds_run.append(None)
+    resumed = run_debate(analyzer, max_rounds=3, resumed=4)
+
+    assert analyzer.rounds_run[1:] == [(HATS, 1), (['red', 'blue'], 0)]
+    assert resumed == uninterrupted
@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from decision_history import DecisionHistory, MinHasher, normalize_topic, topic_shingles
+from model_backends import MockBackend
+from null_formatter import NullFormatter
+from six_hats_prompt import SixHatsAnalyzer
+
+TOPIC = "Should we open a second office in Lisbon next year?"
+NEAR_DUPLICATE = "Should we open a second office in Lisbon this year?"
+
+def conversation(summary: str = "Open it in spring", facts: str = "Rent went up by a fifth"):
+    return [
+        {'id': 'WHITE-1', 'hat': 'white', 'content': facts, 'timestamp': '', 'response_to': None},
+        {'id': 'BLUE-1', 'hat': 'blue', 'content': summary, 'timestamp': '', 'response_to': 'WHITE-1'},
+    ]
+
+def estimated_similarity(a: str, b: str) -> float:
+    hasher = MinHasher()
+    return MinHasher.similarity(
+        hasher.signature(topic_shingles(normalize_topic(a))),
+        hasher.signature(topic_shingles(normalize_topic(b)))
+    )
+
+@pytest.fixture
+def history(tmp_path):
+    history = DecisionHistory(str(tmp_path / 'history.db'))
+    yield history
+    history.close()
+
+def test_normalized_topics_match_exactly(history):
+    history.record('r1', TOPIC, ['white', 'blue'], True, 1, conversation())
+    match = history.find_similar("  should WE open a second office, in Lisbon next year ")
+    assert match['run_id'] == 'r1'
+    assert match['similarity'] == 1.0
+    assert match['blue_summary'] == "Open it in spring"
+
+def test_find_similar_respects_the_threshold(tmp_path):
+    similarity = estimated_similarity(TOPIC, NEAR_DUPLICATE)
+    assert 0.5 < similarity < 1.0
+
+    for threshold, expected in [(similarity, 'r1'), (similarity + 0.01, None)]:
+        history = DecisionHistory(str(tmp_path / f'{threshold}.db'), duplicate_threshold=threshold)
+        history.record('r1', TOPIC, ['white', 'blue'], True, 1, conversation())
+        match = history.find_similar(NEAR_DUPLICATE)
+        assert (match and match['run_id']) == expected
+        history.close()
+
+def test_unrelated_and_expired_runs_are_not_matched(tmp_path):
+    history = DecisionHistory(str(tmp_path / 'history.db'), max_age=60)
+    history.record('r1', TOPIC, ['white', 'blue'], True, 1, conversation())
+    assert history.find_similar("Hire a data engineer") is None
+
+    history._db.execute("UPDATE runs SET created_at = created_at - 120")
+    assert history.find_similar(TOPIC) is None
+    history.close()
+
+def test_record_replaces_an_earlier_record_of_the_run(history):
+    history.record('r1', TOPIC, ['white', 'blue'], True, 1, conversation("Open it in spring"))
+    history.record('r1', TOPIC, ['white', 'blue'], True, 2, conversation("Wait a year"))
+    assert history.get('r1')['max_rounds'] == 2
+    assert [row['run_id'] for row in history.search("Lisbon")] == ['r1']
+    assert history.search("spring") == []
+    assert history._db.execute("SELECT COUNT(*) FROM topic_bands WHERE run_id = 'r1'").fetchone()[0] == history.hasher.bands
+
+def test_search_falls_back_to_quoted_words(history):
+    history.record('r1', TOPIC, ['white', 'blue'], True, 1, conversation())
+    history.record('r2', "Hire a data engineer", ['white', 'blue'], True, 1, conversation("Hire two", "Three candidates applied"))
+    assert [row['run_id'] for row in history.search("rent")] == ['r1']
+    assert '[Rent]' in history.search("rent")[0]['snippet']
+    # An unbalanced quote is not valid FTS5 syntax
+    assert [row['run_id'] for row in history.search('data engineer"')] == ['r2']
+    assert history.search('"(*') == []
+
+def test_serve_answers_a_repeated_topic_without_model_calls(history):
+    async def run(backend):
+        analyzer = SixHatsAnalyzer(
+            client=backend,
+            console=NullFormatter(),
+            history=history,
+            reuse='serve'
+        )
+        return await analyzer.analyze_topic(TOPIC, ['white', 'blue'], True)
+
+    first = asyncio.run(run(MockBackend(latency=0, tokens_per_second=1e6)))
+    backend = MockBackend(latency=0, tokens_per_second=1e6)
+    served = asyncio.run(run(backend))
+
+    assert backend.calls == 0
+    assert served['similar_run']['used'] == 'served'
+    assert served['similar_run']['run_id'] == first['run_id']
+    assert [m['content'] for m in served['conversation']] == [m['content'] for m in first['conversation']]
@@ -0,0 +1,23 @@
+import os
+import sys
+import subprocess
+
+MODULE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_headless_mock_run_imports_neither_sdk_nor_rich(tmp_path):
+    script = (
+        "import sys, asyncio\n"
+        "from six_hats_prompt import SixHatsAnalyzer, create_client, create_formatter\n"
+        "analyzer = SixHatsAnalyzer(client=create_client('mock'), console=create_formatter('headless'), journal_dir=None)\n"
+        "result = asyncio.run(analyzer.analyze_topic('t', ['white', 'blue'], True))\n"
+        "print(result['status'], 'anthropic' in sys.modules, 'rich' in sys.modules)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', script],
+        cwd=str(tmp_path),
+        env={**os.environ, 'PYTHONPATH': MODULE_DIR, 'SIX_HATS_MOCK_LATENCY': '0'},
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout.split()
+    assert output == ['success', 'False', 'False']
@@ -0,0 +1,77 @@
+import json
+import struct
+import asyncio
+
+import pytest
+
+import ipc_protocol
+from ipc_protocol import PROTOCOL_VERSION, ProtocolError, encode_frame, read_frame
+from worker import AnalysisWorker
+
+def read_all(data: bytes, piece: int = 0):
+    """
+    Feeds data to a stream reader, in pieces of the given size when set, and
+    reads frames until a clean end of stream or a protocol error
+    """
+    async def main():
+        reader = asyncio.StreamReader()
+        step = piece or len(data) or 1
+        for start in range(0, len(data), step):
+            reader.feed_data(data[start:start + step])
+        reader.feed_eof()
+        frames = []
+        while True:
+            payload = await read_frame(reader)
+            if payload is None:
+                return frames
+            frames.append(json.loads(payload))
+    return asyncio.run(main())
+
+def test_frames_round_trip_across_any_split():
+    messages = [
+        {'type': 'event', 'id': 'a', 'event': 'token', 'delta': 'Стоит ли 🎩'},
+        {'type': 'result', 'id': 'a', 'status': 'success', 'conversation': []},
+        {'type': 'event', 'id': 'b', 'event': 'token', 'delta': ''},
+    ]
+    data = b''.join(encode_frame(message) for message in messages)
+    expected = [{'v': PROTOCOL_VERSION, **message} for message in messages]
+    for piece in (0, 1, 2, 3, 5, 7):
+        assert read_all(data, piece) == expected
+
+def test_length_prefix_counts_utf8_bytes():
+    frame = encode_frame({'type': 'event', 'delta': 'é🎩'})
+    (length,) = struct.unpack('>I', frame[:4])
+    assert length == len(frame) - 4
+    assert length > len(json.dumps({'v': 1, 'type': 'event', 'delta': 'é🎩'}, ensure_ascii=False))
+
+def test_clean_end_of_stream_is_not_an_error():
+    assert read_all(b'') == []
+
+@pytest.mark.parametrize('data', [
+    b'\x00\x00',
+    encode_frame({'type': 'hello'})[:-3],
+])
+def test_truncated_frames_raise(data):
+    with pytest.raises(ProtocolError):
+        read_all(data)
+
+def test_oversize_frames_are_rejected(monkeypatch):
+    monkeypatch.setattr(ipc_protocol, 'MAX_FRAME_BYTES', 64)
+    with pytest.raises(ProtocolError):
+        encode_frame({'type': 'event', 'delta': 'x' * 100})
+    with pytest.raises(ProtocolError):
+        read_all(struct.pack('>I', 65) + b'x' * 65)
+
+def test_unsendable_result_becomes_an_error_result(monkeypatch):
+    monkeypatch.setattr(ipc_protocol, 'MAX_FRAME_BYTES', 256)
+    frame = AnalysisWorker._encode_output({'id': 'job-1', 'status': 'success', 'conversation': ['x' * 500]})
+    [result] = read_all(frame)
+    assert result['type'] == 'result'
+    assert result['id'] == 'job-1'
+    assert result['status'] == 'error'
+
+    frame = AnalysisWorker._encode_output({'id': 'job-2', 'status': 'success', 'conversation': [object()]})
+    assert read_all(frame)[0]['status'] == 'error'
+
+def test_unsendable_event_is_dropped():
+    assert AnalysisWorker._encode_output({'id': 'job-1', 'event': 'token', 'delta': object()}) is None
@@ -0,0 +1,94 @@
+import asyncio
+from dataclasses import replace
+
+from model_backends import MockBackend, TransientBackendError
+from model_routing import DEFAULT_TIERS, ModelRouter
+from null_formatter import NullFormatter
+from request_scheduler import RequestScheduler
+from response_cache import ResponseCache
+from six_hats_prompt import SixHatsAnalyzer
+
+STANDARD = DEFAULT_TIERS['standard']
+
+def router() -> ModelRouter:
+    # Fall back on the first failure of the primary
+    return ModelRouter(
+        tiers={**DEFAULT_TIERS, 'standard': replace(STANDARD, fallback_after=0)},
+        routes={'default': ['standard', 'fast']}
+    )
+
+def backend_failing_primary_once() -> MockBackend:
+    # The fallback answers more slowly, so the turn that fell back finishes last
+    backend = MockBackend(latency=0, model_latency={DEFAULT_TIERS['fast'].model: 0.05})
+    create = backend.messages.create
+    failed = False
+
+    async def create_or_fail(**kwargs):
+        nonlocal failed
+        if kwargs['model'] == STANDARD.model and not failed:
+            failed = True
+            raise TransientBackendError("overloaded")
+        return await create(**kwargs)
+
+    backend.messages.create = create_or_fail
+    return backend
+
+def analyze(client, hats, cache=None):
+    analyzer = SixHatsAnalyzer(
+        client=client,
+        console=NullFormatter(),
+        max_concurrency=4,
+        cache=cache,
+        router=router(),
+        journal_dir=None
+    )
+    return asyncio.run(analyzer.analyze_topic("Open a second office", hats, False))
+
+def test_concurrent_turns_of_one_hat_keep_their_own_tier():
+    result = analyze(backend_failing_primary_once(), ['white', 'white'])
+    assert result['status'] == 'success'
+    tiers = [(m['id'], m['tier'], m['model']) for m in result['conversation']]
+    assert tiers == [
+        ('white_0', 'fast', DEFAULT_TIERS['fast'].model),
+        ('white_1', 'standard', STANDARD.model),
+    ]
+
+def test_fallback_answers_are_not_cached_as_the_primary():
+    cache = ResponseCache()
+    first = analyze(backend_failing_primary_once(), ['white'], cache)
+    assert first['conversation'][0]['tier'] == 'fast'
+
+    healthy = MockBackend(latency=0)
+    second = analyze(healthy, ['white'], cache)
+    assert second['conversation'][0]['tier'] == 'standard'
+    assert healthy.calls == 1
+
+    third = analyze(MockBackend(latency=0), ['white'], cache)
+    assert third['conversation'][0]['tier'] == 'cache'
+
+def test_default_tiers_time_out_before_falling_back():
+    for name in ModelRouter().routes['default'][:-1]:
+        tier = DEFAULT_TIERS[name]
+        assert tier.timeout is not None
+        assert tier.timeout * (tier.fallback_after + 1) <= 120
+
+def test_request_timeout_overrides_every_tier():
+    class RecordingScheduler(RequestScheduler):
+        timeouts = []
+
+        async def call(self, make_request, estimated_tokens=0, timeout=None, max_retries=None):
+            self.timeouts.append(timeout)
+            return await super().call(make_request, estimated_tokens, timeout, max_retries)
+
+    analyzer = SixHatsAnalyzer(
+        client=MockBackend(latency=0),
+        console=NullFormatter(),
+        scheduler=RecordingScheduler(),
+        router=ModelRouter().with_timeout(300.0),
+        journal_dir=None
+    )
+    result = asyncio.run(analyzer.analyze_topic("Open a second office", ['white', 'red', 'blue'], True))
+    assert result['status'] == 'success'
+    assert RecordingScheduler.timeouts and set(RecordingScheduler.timeouts) == {300.0}
+    # The routing it was derived from keeps its own timeouts
+    assert ModelRouter().tiers['standard'].timeout == STANDARD.timeout
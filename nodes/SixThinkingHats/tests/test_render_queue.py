@@ -0,0 +1,107 @@
+import io
+import time
+import threading
+
+from rich.console import Console
+
+from console_formatter import ConsoleFormatter
+from hat_handlers import Message
+from render_queue import BackgroundRenderer
+
+class RecordingFormatter(ConsoleFormatter):
+    """
+    Records what the render thread prints; print_message can be held back to
+    simulate a slow terminal or made to fail
+    """
+
+    def __init__(self):
+        super().__init__(Console(file=io.StringIO()))
+        self.printed = []
+        self.release = threading.Event()
+        self.release.set()
+        self.fail = False
+
+    def print_message(self, message: Message) -> None:
+        self.release.wait()
+        if self.fail:
+            raise RuntimeError("terminal closed")
+        self.printed.append(('message', message.content))
+
+    def message_label(self, message: Message) -> str:
+        self.printed.append(('label', message.content))
+        return message.content
+
+    def print_dialogue_tree(self, conversation_history) -> None:
+        self.printed.append(('tree', len(conversation_history)))
+
+def messages(count: int):
+    return [Message('white', i + 1, f"m{i}", time.monotonic()) for i in range(count)]
+
+def test_everything_queued_is_printed_before_the_tree():
+    formatter = RecordingFormatter()
+    renderer = BackgroundRenderer(formatter)
+    renderer.print_header("topic")
+    renderer.create_progress_tracker(10)
+    history = messages(10)
+    for message in history:
+        renderer.print_message(message)
+        renderer.update_progress(0)
+    renderer.print_dialogue_tree(history)
+
+    assert [content for kind, content in formatter.printed if kind != 'tree'] == [m.content for m in history]
+    assert formatter.printed[-1] == ('tree', 10)
+    assert renderer.dropped == 0
+
+def test_a_backlog_is_printed_as_previews_except_the_newest():
+    formatter = RecordingFormatter()
+    renderer = BackgroundRenderer(formatter, max_full_messages=2)
+    renderer.create_progress_tracker(6)
+    formatter.release.clear()
+    history = messages(6)
+    renderer.print_message(history[0])
+    # Let the render thread pick up the first message and block on it
+    time.sleep(0.3)
+    for message in history[1:]:
+        renderer.print_message(message)
+    formatter.release.set()
+    renderer.complete_progress()
+
+    assert formatter.printed == [
+        ('message', 'm0'), ('label', 'm1'), ('label', 'm2'), ('label', 'm3'), ('message', 'm4'), ('message', 'm5')
+    ]
+
+def test_a_full_queue_drops_and_counts_instead_of_blocking():
+    formatter = RecordingFormatter()
+    renderer = BackgroundRenderer(formatter, max_pending=2)
+    renderer.create_progress_tracker(20)
+    formatter.release.clear()
+
+    started = time.monotonic()
+    for message in messages(20):
+        renderer.print_message(message)
+    assert time.monotonic() - started < 0.5
+
+    formatter.release.set()
+    renderer.complete_progress()
+    rendered = [entry for entry in formatter.printed if entry[0] in ('message', 'label')]
+    assert renderer.dropped > 0
+    assert len(rendered) + renderer.dropped == 20
+
+def test_a_failed_render_thread_does_not_block_the_run():
+    formatter = RecordingFormatter()
+    formatter.fail = True
+    renderer = BackgroundRenderer(formatter, max_pending=1)
+    renderer.create_progress_tracker(5)
+    history = messages(5)
+    for message in history:
+        renderer.print_message(message)
+
+    finished = threading.Event()
+
+    def finish():
+        renderer.print_dialogue_tree(history)
+        finished.set()
+
+    threading.Thread(target=finish, daemon=True).start()
+    assert finished.wait(5)
+    assert formatter.printed == [('tree', 5)]
@@ -0,0 +1,64 @@
+import time
+import asyncio
+
+import pytest
+from anthropic import AsyncAnthropic
+
+from fake_model_server import FakeModelServer
+from model_backends import TransientBackendError
+from request_scheduler import RequestScheduler, is_retryable
+
+def run_calls(failures, scheduler):
+    async def main():
+        async with FakeModelServer(failures) as server:
+            client = AsyncAnthropic(api_key='test', base_url=server.base_url, max_retries=0)
+            try:
+                return await scheduler.call(lambda: client.messages.create(
+                    model='fake-model',
+                    max_tokens=16,
+                    messages=[{'role': 'user', 'content': 'hi'}]
+                )), server.requests
+            except Exception as e:
+                return e, server.requests
+    return asyncio.run(main())
+
+@pytest.mark.parametrize('status', [408, 409, 429, 500, 503, 529])
+def test_throttling_and_server_errors_are_retried(status):
+    scheduler = RequestScheduler(max_retries=2, base_delay=0.01)
+    response, requests = run_calls([(status, None), (status, None)], scheduler)
+    assert response.content[0].text == 'ok'
+    assert requests == 3
+
+@pytest.mark.parametrize('status', [400, 401, 404])
+def test_client_errors_are_not_retried(status):
+    scheduler = RequestScheduler(max_retries=3, base_delay=0.01)
+    error, requests = run_calls([(status, None)], scheduler)
+    assert not is_retryable(error)
+    assert requests == 1
+
+def test_gives_up_after_max_retries():
+    scheduler = RequestScheduler(max_retries=1, base_delay=0.01)
+    error, requests = run_calls([(529, None)] * 3, scheduler)
+    assert is_retryable(error)
+    assert error.status_code == 529
+    assert requests == 2
+
+def test_retry_after_header_sets_the_delay():
+    scheduler = RequestScheduler(max_retries=1, base_delay=30)
+    started = time.monotonic()
+    response, requests = run_calls([(429, {'retry-after': '0.3'})], scheduler)
+    elapsed = time.monotonic() - started
+    assert response.content[0].text == 'ok'
+    assert 0.3 <= elapsed < 5
+
+def test_connection_errors_and_local_failures_are_retryable():
+    async def main():
+        client = AsyncAnthropic(api_key='test', base_url='http://127.0.0.1:9', max_retries=0)
+        try:
+            await client.messages.create(model='fake-model', max_tokens=16, messages=[{'role': 'user', 'content': 'hi'}])
+        except Exception as e:
+            return e
+    assert is_retryable(asyncio.run(main()))
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(TransientBackendError("mock"))
+    assert not is_retryable(ValueError("bug"))
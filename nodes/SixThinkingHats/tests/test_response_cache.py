@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache
+
+TTL = 100
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(response_cache, 'time', SimpleNamespace(time=lambda: now.value))
+    return now
+
+def rows(cache: ResponseCache) -> int:
+    return cache._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+def test_keys_depend_on_every_part_but_not_their_order():
+    key = ResponseCache.make_key(model='m', topic='Аренда', context='')
+    assert key == ResponseCache.make_key(context='', topic='Аренда', model='m')
+    assert key != ResponseCache.make_key(model='m', topic='Аренда', context=' ')
+
+def test_entries_expire_after_ttl(clock, tmp_path):
+    cache = ResponseCache(ttl_seconds=TTL, db_path=str(tmp_path / 'cache.db'))
+    cache.set('k', 'answer')
+    clock.value += TTL
+    assert cache.get('k') == 'answer'
+    clock.value += 1
+    assert cache.get('k') is None
+    # An expired entry is removed from both layers
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 0}
+    assert rows(cache) == 0
+    cache.close()
+
+def test_least_recently_used_entries_are_evicted_from_memory(clock):
+    cache = ResponseCache(max_entries=2, ttl_seconds=TTL)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    assert cache.get('a') == '1'
+    cache.set('c', '3')
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'entries': 2}
+
+def test_sqlite_layer_survives_eviction_and_restarts(clock, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache(max_entries=1, ttl_seconds=TTL, db_path=path)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    # Evicted from memory, still on disk
+    assert 'a' not in cache._entries
+    assert cache.get('a') == '1'
+    cache.close()
+
+    reopened = ResponseCache(ttl_seconds=TTL, db_path=path)
+    assert reopened.get('b') == '2'
+    assert reopened.stats() == {'hits': 1, 'misses': 0, 'entries': 1}
+    reopened.close()
+
+def test_expired_rows_are_purged_on_open(clock, tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache(ttl_seconds=TTL, db_path=path)
+    cache.set('old', '1')
+    clock.value += TTL / 2
+    cache.set('new', '2')
+    cache.close()
+
+    clock.value += TTL / 2 + 1
+    reopened = ResponseCache(ttl_seconds=TTL, db_path=path)
+    assert rows(reopened) == 1
+    assert reopened.get('new') == '2'
+    reopened.close()
@@ -0,0 +1,104 @@
+import os
+import time
+import threading
+import asyncio
+
+import pytest
+
+from model_backends import MockBackend
+from null_formatter import NullFormatter
+from run_journal import RunJournal, prune_journals
+from six_hats_prompt import SixHatsAnalyzer
+
+HATS = ['white', 'red', 'black', 'yellow', 'green', 'blue']
+
+def make_analyzer(client, journal_dir, max_concurrency):
+    return SixHatsAnalyzer(
+        client=client,
+        console=NullFormatter(),
+        max_concurrency=max_concurrency,
+        journal_dir=journal_dir
+    )
+
+def crashing_backend(fail_on_call: int) -> MockBackend:
+    backend = MockBackend(latency=0)
+    create = backend.messages.create
+    calls = 0
+
+    async def create_or_crash(**kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == fail_on_call:
+            raise RuntimeError("process killed")
+        return await create(**kwargs)
+
+    backend.messages.create = create_or_crash
+    return backend
+
+def shape(conversation):
+    return [(m['id'], m['response_to'], m['content']) for m in conversation]
+
+@pytest.mark.parametrize('max_concurrency', [1, 4])
+def test_resumed_run_matches_uninterrupted_run(tmp_path, max_concurrency):
+    journal_dir = str(tmp_path)
+
+    async def main():
+        uninterrupted = await make_analyzer(MockBackend(latency=0), journal_dir, max_concurrency).analyze_topic(
+            "Open a second office", HATS, True, run_id='full'
+        )
+        failed = await make_analyzer(crashing_backend(3), journal_dir, max_concurrency).analyze_topic(
+            "Open a second office", HATS, True, run_id='cut'
+        )
+        resumed = await make_analyzer(MockBackend(latency=0), journal_dir, max_concurrency).resume('cut')
+        return uninterrupted, failed, resumed
+
+    uninterrupted, failed, resumed = asyncio.run(main())
+    assert failed['status'] == 'error'
+    assert 0 < len(failed['conversation']) < len(HATS)
+    assert resumed['status'] == 'success'
+    assert resumed['resumed_messages'] == len(failed['conversation'])
+    assert shape(resumed['conversation']) == shape(uninterrupted['conversation'])
+    # A finished run leaves no journal behind
+    assert not os.path.exists(RunJournal.path_for(journal_dir, 'cut'))
+
+def test_expired_journals_are_pruned(tmp_path):
+    stale = tmp_path / 'stale.jsonl'
+    fresh = tmp_path / 'fresh.jsonl'
+    stale.write_text('{}\n')
+    fresh.write_text('{}\n')
+    old = time.time() - 3600
+    os.utime(stale, (old, old))
+
+    RunJournal.create(str(tmp_path), 'new', {'topic': 't'}, ttl=600).close()
+
+    assert not stale.exists()
+    assert fresh.exists()
+    assert prune_journals(str(tmp_path), ttl=600) == []
+
+def test_journal_fsync_is_batched_off_the_event_loop(tmp_path, monkeypatch):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, 'fsync', lambda fd: (synced.append(threading.get_ident()), real_fsync(fd)))
+    main_thread = threading.get_ident()
+
+    async def main():
+        journal = RunJournal(str(tmp_path / 'run.jsonl'), fsync_every=4, fsync_interval=0.05)
+        for i in range(10):
+            journal.write({'type': 'message', 'seq': i})
+        # Batches still unsynced are picked up by the interval timer
+        await asyncio.sleep(0.2)
+        assert journal._unsynced == 0
+        journal.close()
+
+    asyncio.run(main())
+    assert 1 <= len(synced) <= 3
+    assert main_thread not in synced
+
+    # Outside an event loop records are synced in batches in place
+    synced.clear()
+    journal = RunJournal(str(tmp_path / 'sync.jsonl'), fsync_every=4)
+    for i in range(10):
+        journal.write({'type': 'message', 'seq': i})
+    assert synced == [main_thread, main_thread]
+    journal.close()
+    assert len(synced) == 3
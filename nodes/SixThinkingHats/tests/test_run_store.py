@@ -0,0 +1,63 @@
+import os
+import json
+import shutil
+import subprocess
+
+import pytest
+
+VISUALIZER_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web_visualizer')
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason="node is not installed")
+
+def run_node(script: str, tmp_path) -> dict:
+    """
+    Runs script against web_visualizer/run_store.js and returns what it printed as JSON
+    """
+    output = subprocess.run(
+        ['node', '-e', f"const {{ RunStore }} = require({json.dumps(os.path.join(VISUALIZER_DIR, 'run_store.js'))});\n{script}"],
+        cwd=str(tmp_path),
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    return json.loads(output)
+
+def test_messages_build_the_tree_and_publish_deltas(tmp_path):
+    result = run_node("""
+        const store = new RunStore();
+        const deltas = [];
+        store.on('delta', (delta) => deltas.push(delta));
+        store.startRun('r1', 'topic');
+        store.handleEvent('r1', { event: 'token', hat: 'white', delta: 'Fa' });
+        store.addMessage('r1', { id: 'a', hat: 'white', content: 'facts' });
+        store.addMessage('r1', { id: 'b', hat: 'red', content: 'feeling', response_to: 'a' });
+        store.addMessage('r1', { id: 'b', hat: 'red', content: 'duplicate', response_to: 'a' });
+        // Streamed messages are not added twice when the final result repeats them
+        store.finishRun('r1', { status: 'success', conversation: [{ id: 'a', hat: 'white', content: 'facts' }, { id: 'c', hat: 'blue', content: 'summary' }] });
+        console.log(JSON.stringify({ deltas, run: store.getRun('r1') }));
+    """, tmp_path)
+
+    assert [delta['type'] for delta in result['deltas']] == ['run', 'token', 'node', 'node', 'node', 'status']
+    assert result['deltas'][3]['parentId'] == 'a'
+    assert result['deltas'][3]['node']['children'] == []
+    tree = result['run']['tree']
+    assert [child['id'] for child in tree['children']] == ['a', 'c']
+    assert [child['id'] for child in tree['children'][0]['children']] == ['b']
+    assert result['run']['status'] == 'success'
+
+def test_evicted_runs_are_spilled_to_disk(tmp_path):
+    result = run_node("""
+        const store = new RunStore({ maxRuns: 2, spillDir: 'spill' });
+        for (const id of ['r1', 'r2', 'r3']) {
+            store.startRun(id, id);
+            store.addMessage(id, { id: `${id}-m`, hat: 'white', content: id });
+        }
+        const live = store.listRuns().map((run) => run.id);
+        // Spilling is asynchronous
+        setTimeout(() => console.log(JSON.stringify({ live, spilled: store.getRun('r1'), missing: store.getRun('r9') })), 100);
+    """, tmp_path)
+
+    assert result['live'] == ['r3', 'r2']
+    assert result['spilled']['id'] == 'r1'
+    assert result['spilled']['tree']['children'][0]['content'] == 'r1'
+    assert result['missing'] is None
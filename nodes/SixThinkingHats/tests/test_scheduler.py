@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+from hat_handlers import HatManager
+from scheduler import DialogueSchedule
+
+HATS = ['white', 'red', 'black', 'yellow', 'green', 'blue']
+
+def schedule(hats=HATS) -> DialogueSchedule:
+    return DialogueSchedule(hats, HatManager())
+
+def test_turns_depend_on_declared_hats_own_colour_and_blue():
+    turns = schedule(HATS + ['white', 'red']).turns
+    depends = {turn.index: turn.depends_on for turn in turns}
+    assert depends[0] == []
+    # Blue hears everyone before it
+    assert depends[5] == [0, 1, 2, 3, 4]
+    # A later turn follows its own colour's previous turn and the latest Blue
+    assert 0 in depends[6] and 5 in depends[6]
+    assert 1 in depends[7] and 5 in depends[7]
+    assert all(dependency < turn.index for turn in turns for dependency in turn.depends_on)
+
+def test_critical_path_is_a_dependency_chain():
+    s = schedule()
+    path = s.critical_path()
+    assert path[-1] == 5
+    for earlier, later in zip(path, path[1:]):
+        assert earlier in s.turns[later].depends_on
+
+def test_independent_turns_overlap_and_commit_in_hats_order():
+    s = schedule()
+    # Later turns finish first when they do not wait for each other
+    delays = {0: 0.03, 1: 0.01, 2: 0.02, 3: 0.0, 4: 0.0, 5: 0.0}
+    running = 0
+    peak = 0
+    committed = []
+
+    async def run_turn(turn, inputs):
+        nonlocal running, peak
+        assert set(inputs) == set(turn.depends_on)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(delays[turn.index])
+        running -= 1
+        return f"{turn.color}:{sorted(inputs)}"
+
+    asyncio.run(s.run(run_turn, lambda turn, response: committed.append(turn.index), max_concurrency=4))
+
+    assert committed == list(range(len(HATS)))
+    assert peak > 1
+
+def test_concurrency_limit_is_respected():
+    s = schedule()
+    running = 0
+    peak = 0
+
+    async def run_turn(turn, inputs):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.005)
+        running -= 1
+        return turn.color
+
+    asyncio.run(s.run(run_turn, lambda turn, response: None, max_concurrency=1))
+    assert peak == 1
+
+def test_failure_commits_the_finished_prefix():
+    s = schedule()
+    committed = []
+
+    async def run_turn(turn, inputs):
+        if turn.color == 'black':
+            raise RuntimeError("black failed")
+        return turn.color
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(s.run(run_turn, lambda turn, response: committed.append(turn.color), max_concurrency=4))
+    assert committed[:2] == ['white', 'red']
+    assert 'black' not in committed
+
+def test_completed_turns_feed_dependents_without_running():
+    s = schedule()
+    ran = []
+    committed = []
+
+    async def run_turn(turn, inputs):
+        ran.append(turn.index)
+        if turn.index == 2:
+            # black depends on white, restored below
+            assert inputs == {0: 'restored white'}
+        return turn.color
+
+    asyncio.run(s.run(
+        run_turn,
+        lambda turn, response: committed.append(turn.index),
+        max_concurrency=4,
+        completed={0: 'restored white', 1: 'restored red'}
+    ))
+    assert sorted(ran) == [2, 3, 4, 5]
+    assert committed == [2, 3, 4, 5]
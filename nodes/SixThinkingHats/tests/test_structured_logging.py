@@ -0,0 +1,48 @@
+import os
+import json
+import atexit
+import logging
+
+from structured_logging import configure_logging, prune_logs
+
+def test_exceptions_keep_their_own_field(tmp_path):
+    listener = configure_logging(str(tmp_path), 'INFO')
+    try:
+        try:
+            raise ValueError("broken")
+        except ValueError:
+            logging.getLogger('test').exception("Call failed for %s", 'white', extra={'hat': 'white'})
+    finally:
+        listener.stop()
+        atexit.unregister(listener.stop)
+        logging.getLogger().handlers[:] = []
+
+    [path] = tmp_path.glob('six_hats-*.log')
+    entry = json.loads(path.read_text(encoding='utf-8').splitlines()[-1])
+    assert entry['msg'] == "Call failed for white"
+    assert entry['hat'] == 'white'
+    assert 'ValueError: broken' in entry['exc']
+
+def test_prune_keeps_recent_and_running_processes(tmp_path):
+    # PIDs far above pid_max belong to no process
+    finished = [4_000_000 + i for i in range(5)]
+    for age, pid in enumerate(finished):
+        for name in (f"six_hats-{pid}.log", f"six_hats-{pid}.log.1"):
+            path = tmp_path / name
+            path.write_text('{}\n')
+            os.utime(path, (1_000_000 - age, 1_000_000 - age))
+    running = tmp_path / f"six_hats-{os.getppid()}.log"
+    running.write_text('{}\n')
+    os.utime(running, (1, 1))
+    unrelated = tmp_path / 'other.log'
+    unrelated.write_text('')
+
+    removed = prune_logs(str(tmp_path), keep=2)
+
+    remaining = sorted(path.name for path in tmp_path.iterdir())
+    assert len(removed) == 6
+    assert remaining == sorted([
+        'other.log', running.name,
+        f"six_hats-{finished[0]}.log", f"six_hats-{finished[0]}.log.1",
+        f"six_hats-{finished[1]}.log", f"six_hats-{finished[1]}.log.1",
+    ])
@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import struct
+import asyncio
+import subprocess
+
+from ipc_protocol import MAX_FRAME_BYTES, PROTOCOL_VERSION, encode_frame
+from test_ipc_protocol import read_all
+from worker import AnalysisWorker
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'six_hats_prompt.py')
+
+class SlowAnalyzer:
+    """
+    Stands in for SixHatsAnalyzer; tracks how many jobs run at once
+    """
+    running = 0
+    peak = 0
+    on_event = None
+
+    async def analyze_topic(self, topic, hats_order, dialog_mode, run_id=None, max_rounds=1):
+        SlowAnalyzer.running += 1
+        SlowAnalyzer.peak = max(SlowAnalyzer.peak, SlowAnalyzer.running)
+        await asyncio.sleep(0.001)
+        SlowAnalyzer.running -= 1
+        return {'status': 'success', 'conversation': [], 'topic': topic}
+
+def test_batch_reads_jobs_only_as_slots_free_up():
+    pool_size = 3
+    worker = AnalysisWorker(SlowAnalyzer, pool_size=pool_size)
+    results = []
+    read = 0
+    read_ahead = []
+
+    async def lines():
+        nonlocal read
+        for i in range(50):
+            read += 1
+            # Jobs read but not yet answered
+            read_ahead.append(read - len(results))
+            yield json.dumps({'id': i, 'topic': f"topic {i}", 'hats': ['white']}).encode()
+        yield b"not json\n"
+
+    asyncio.run(worker._serve_lines(lines(), results.append))
+
+    assert sorted(r['id'] for r in results) == list(range(51))
+    assert [r['status'] for r in results if r['id'] == 50] == ['error']
+    assert SlowAnalyzer.peak <= pool_size
+    assert max(read_ahead) <= pool_size + 1
+
+def run_worker(args, stdin: bytes, tmp_path, env=None, **kwargs):
+    return subprocess.run(
+        [sys.executable, SCRIPT, '--worker', '--headless', '--backend', 'mock', '--no-journal',
+         '--log-dir', str(tmp_path / 'logs'), *args],
+        input=stdin,
+        cwd=str(tmp_path),
+        env={**os.environ, 'SIX_HATS_MOCK_LATENCY': '0', **(env or {})},
+        capture_output=True,
+        timeout=60,
+        **kwargs
+    )
+
+def test_ndjson_worker_answers_every_job_once(tmp_path):
+    jobs = [
+        {'id': 'plain', 'topic': 'Remote work', 'hats': ['white', 'blue'], 'dialog_mode': True},
+        {'id': 'streamed', 'topic': 'Remote work', 'hats': ['red'], 'dialog_mode': False, 'stream': True},
+        # The test_input.json shape
+        {'id': 'legacy', 'topic': 'Remote work', 'selectedHats': '["black"]', 'dialogMode': 'true'},
+        {'id': 'no-topic', 'hats': ['white']},
+        {'id': 'future', 'v': 99, 'topic': 'Remote work', 'hats': ['white']},
+    ]
+    stdin = "".join(json.dumps(job) + "\n" for job in jobs) + "{broken\n"
+
+    completed = run_worker(['--pool-size', '2'], stdin.encode(), tmp_path)
+    assert completed.returncode == 0, completed.stderr
+    lines = [json.loads(line) for line in completed.stdout.decode().splitlines()]
+
+    result_lines = [line for line in lines if line.get('event', 'result') == 'result']
+    results = {line['id']: line for line in result_lines}
+    assert len(results) == len(result_lines)
+    assert set(results) == {'plain', 'streamed', 'legacy', 'no-topic', 'future', 5}
+    assert [m['hat'] for m in results['plain']['conversation']] == ['white', 'blue']
+    assert [m['hat'] for m in results['legacy']['conversation']] == ['black']
+    for job_id in ('no-topic', 'future', 5):
+        assert results[job_id]['status'] == 'error'
+
+    # Stream events carry their job id and come before the job's result
+    streamed = [line for line in lines if line['id'] == 'streamed']
+    assert [line['event'] for line in streamed][0] == 'hat_start'
+    assert streamed[-1]['event'] == 'result'
+    assert 'token' in {line['event'] for line in streamed}
+    assert all('event' not in line for line in lines if line['id'] != 'streamed')
+
+def test_concurrency_defaults_to_the_environment(tmp_path):
+    job = json.dumps({'id': 1, 'topic': 'Remote work', 'hats': ['white', 'red', 'blue']}).encode() + b"\n"
+    sequential = json.loads(run_worker([], job, tmp_path).stdout)
+    scheduled = json.loads(run_worker([], job, tmp_path, env={'SIX_HATS_CONCURRENCY': '4'}).stdout)
+    # Only dependency-graph runs report their critical path
+    assert 'schedule' not in sequential
+    assert scheduled['schedule']['critical_path'] == ['white_0', 'blue_0']
+
+def test_framed_worker_keeps_results_off_stdout(tmp_path):
+    read_fd, write_fd = os.pipe()
+    jobs = [
+        encode_frame({'type': 'job', 'id': 'a', 'topic': 'Удалённая работа', 'hats': ['white', 'blue'], 'stream': True}),
+        encode_frame({'type': 'job', 'id': 'b', 'topic': 'Remote work', 'hats': ['red'], 'dialog_mode': False}),
+        # A whole frame whose payload is not JSON only fails that job
+        struct.pack('>I', 5) + b'{oops',
+        # A length beyond the limit means frame boundaries are lost
+        struct.pack('>I', MAX_FRAME_BYTES + 1) + b'{}',
+    ]
+    try:
+        completed = run_worker(['--ipc-fd', str(write_fd)], b"".join(jobs), tmp_path, pass_fds=(write_fd,))
+    finally:
+        os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as results:
+        frames = list(read_all(results.read()))
+
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout == b""
+    assert frames[0]['type'] == 'hello'
+    assert all(frame['v'] == PROTOCOL_VERSION for frame in frames)
+    results = {frame['id']: frame for frame in frames if frame['type'] == 'result'}
+    assert set(results) == {'a', 'b', 2}
+    assert [m['hat'] for m in results['a']['conversation']] == ['white', 'blue']
+    assert results[2]['status'] == 'error'
+    assert {frame['event'] for frame in frames if frame['type'] == 'event'} >= {'hat_start', 'token', 'hat_end'}
+    assert all(frame['id'] == 'a' for frame in frames if frame['type'] == 'event')
@@ -14,6 +14,25 @@ export interface IAnalysisResult {
     [key: string]: IHatResponse[] | string | undefined;
 }
 
+// Событие потокового режима: начало ответа шляпы, фрагмент текста, готовое сообщение
+export interface IStreamEvent {
+    event: 'hat_start' | 'token' | 'hat_end';
+    hat: string;
+    delta?: string;
+    message?: IDataObject;
+}
+
+// Задание для долгоживущего Python-воркера
+export interface IAnalysisJob {
+    topic: string;
+    hats: string[];
+    dialogMode: boolean;
+    // Максимум раундов дебатов; анализ останавливается раньше, когда мнения сходятся
+    maxRounds?: number;
+    // Идентификатор запуска: помечает логи Python-процесса
+    runId?: string;
+}
+
 export const hatColors = {
     blue: '#0000FF',
     white: '#FFFFFF',
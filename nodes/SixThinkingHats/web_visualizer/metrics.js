@@ -0,0 +1,118 @@
+// Aggregates the metrics block of finished analyses into Prometheus counters and
+// histograms, rendered in the text exposition format for /metrics.
+
+const LATENCY_BUCKETS = [0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120];
+const RUN_BUCKETS = [1, 5, 10, 30, 60, 120, 300, 600];
+const TOKEN_FIELDS = {
+    input_tokens: 'input',
+    output_tokens: 'output',
+    cache_read_input_tokens: 'cache_read',
+    cache_creation_input_tokens: 'cache_creation',
+};
+
+function labelKey(labels) {
+    return Object.keys(labels).sort().map((name) => `${name}="${String(labels[name]).replace(/["\\\n]/g, '_')}"`).join(',');
+}
+
+function sample(name, key, value) {
+    return key ? `${name}{${key}} ${value}` : `${name} ${value}`;
+}
+
+class Counter {
+    constructor(name, help) {
+        this.name = name;
+        this.help = help;
+        this.values = new Map();
+    }
+
+    inc(labels, value = 1) {
+        const key = labelKey(labels);
+        this.values.set(key, (this.values.get(key) || 0) + value);
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} counter`];
+        this.values.forEach((value, key) => lines.push(sample(this.name, key, value)));
+        return lines;
+    }
+}
+
+class Histogram {
+    constructor(name, help, buckets) {
+        this.name = name;
+        this.help = help;
+        this.buckets = buckets;
+        this.series = new Map();
+    }
+
+    observe(labels, value) {
+        const key = labelKey(labels);
+        let series = this.series.get(key);
+        if (!series) {
+            series = { counts: new Array(this.buckets.length).fill(0), count: 0, sum: 0 };
+            this.series.set(key, series);
+        }
+        this.buckets.forEach((bound, i) => {
+            if (value <= bound) series.counts[i] += 1;
+        });
+        series.count += 1;
+        series.sum += value;
+    }
+
+    render() {
+        const lines = [`# HELP ${this.name} ${this.help}`, `# TYPE ${this.name} histogram`];
+        this.series.forEach((series, key) => {
+            const prefix = key ? `${key},` : '';
+            this.buckets.forEach((bound, i) => lines.push(`${this.name}_bucket{${prefix}le="${bound}"} ${series.counts[i]}`));
+            lines.push(`${this.name}_bucket{${prefix}le="+Inf"} ${series.count}`);
+            lines.push(sample(`${this.name}_sum`, key, series.sum));
+            lines.push(sample(`${this.name}_count`, key, series.count));
+        });
+        return lines;
+    }
+}
+
+class AnalysisMetrics {
+    constructor() {
+        this.runs = new Counter('six_hats_runs_total', 'Finished analyses by status');
+        this.runDuration = new Histogram('six_hats_run_duration_seconds', 'End-to-end analysis time', RUN_BUCKETS);
+        this.latency = new Histogram('six_hats_model_call_latency_seconds', 'Model call latency including retries, per hat', LATENCY_BUCKETS);
+        this.ttft = new Histogram('six_hats_time_to_first_token_seconds', 'Time to first streamed token, per hat', LATENCY_BUCKETS);
+        this.modelCalls = new Counter('six_hats_model_calls_total', 'Model calls per hat');
+        this.retries = new Counter('six_hats_retries_total', 'Retried model call attempts per hat');
+        this.fallbacks = new Counter('six_hats_tier_fallbacks_total', 'Model tiers given up on per hat');
+        this.tierCalls = new Counter('six_hats_tier_calls_total', 'Model calls per hat by the tier that answered');
+        this.cacheHits = new Counter('six_hats_cache_hits_total', 'Responses served from the response cache per hat');
+        this.tokens = new Counter('six_hats_tokens_total', 'Tokens per hat by type');
+    }
+
+    // Accepts the result dict returned by analyze_topic
+    observeResult(result) {
+        this.runs.inc({ status: result.status || 'unknown' });
+        const metrics = result.metrics;
+        if (!metrics) return;
+
+        if (metrics.run && metrics.run.duration_ms != null) {
+            this.runDuration.observe({}, metrics.run.duration_ms / 1000);
+        }
+        Object.entries(metrics.hats || {}).forEach(([hat, stats]) => {
+            ((stats.latency_ms && stats.latency_ms.samples) || []).forEach((ms) => this.latency.observe({ hat }, ms / 1000));
+            ((stats.ttft_ms && stats.ttft_ms.samples) || []).forEach((ms) => this.ttft.observe({ hat }, ms / 1000));
+            this.modelCalls.inc({ hat }, stats.model_calls || 0);
+            this.retries.inc({ hat }, stats.retries || 0);
+            this.fallbacks.inc({ hat }, stats.fallbacks || 0);
+            Object.entries(stats.tiers || {}).forEach(([tier, calls]) => this.tierCalls.inc({ hat, tier }, calls));
+            this.cacheHits.inc({ hat }, stats.cache_hits || 0);
+            Object.entries(TOKEN_FIELDS).forEach(([field, type]) => this.tokens.inc({ hat, type }, stats[field] || 0));
+        });
+    }
+
+    render() {
+        return [
+            this.runs, this.runDuration, this.latency, this.ttft,
+            this.modelCalls, this.retries, this.fallbacks, this.tierCalls, this.cacheHits, this.tokens,
+        ].flatMap((metric) => metric.render()).join('\n') + '\n';
+    }
+}
+
+module.exports = { AnalysisMetrics, Counter, Histogram };
@@ -0,0 +1,109 @@
+const path = require('path');
+const fs = require('fs');
+const { EventEmitter } = require('events');
+
+// Bounded store of analysis runs. Trees are built incrementally as messages
+// arrive and every change is published as a small delta for SSE subscribers.
+// Runs pushed out of the in-memory ring are spilled to disk when spillDir is set.
+class RunStore extends EventEmitter {
+    constructor({ maxRuns = 50, spillDir = null } = {}) {
+        super();
+        this.setMaxListeners(0);
+        this.maxRuns = maxRuns;
+        this.spillDir = spillDir;
+        this.runs = new Map();
+        if (spillDir) fs.mkdirSync(spillDir, { recursive: true });
+    }
+
+    startRun(runId, topic) {
+        const run = {
+            id: runId,
+            topic,
+            status: 'running',
+            startedAt: new Date().toISOString(),
+            tree: { name: 'Dialogue', children: [] },
+            nodes: new Map(),
+        };
+        this.runs.set(runId, run);
+        this.evict();
+        this.publish({ type: 'run', runId, topic, status: run.status, startedAt: run.startedAt });
+        return run;
+    }
+
+    // Accepts a stream event from the Python side (hat_start / token / hat_end)
+    handleEvent(runId, event) {
+        if (event.event === 'token' || event.event === 'hat_start') {
+            this.publish({ type: event.event, runId, hat: event.hat, delta: event.delta });
+        } else if (event.event === 'hat_end' && event.message) {
+            this.addMessage(runId, event.message);
+        }
+    }
+
+    addMessage(runId, msg) {
+        const run = this.runs.get(runId) || this.startRun(runId, '');
+        if (run.nodes.has(msg.id)) return;
+
+        const node = {
+            id: msg.id,
+            name: msg.content,
+            hat: msg.hat,
+            content: msg.content,
+            timestamp: msg.timestamp,
+            children: [],
+        };
+        const parent = msg.response_to ? run.nodes.get(msg.response_to) : null;
+        (parent || run.tree).children.push(node);
+        run.nodes.set(msg.id, node);
+
+        this.publish({ type: 'node', runId, parentId: parent ? parent.id : null, node: { ...node, children: [] } });
+    }
+
+    finishRun(runId, result) {
+        const run = this.runs.get(runId) || this.startRun(runId, '');
+        // Catch up on anything that was not streamed (e.g. cached or non-streaming runs)
+        (result.conversation || []).forEach((msg) => this.addMessage(runId, msg));
+        run.status = result.status;
+        this.emit('finish', runId, result);
+        this.publish({ type: 'status', runId, status: run.status, error: result.error });
+    }
+
+    listRuns() {
+        const live = Array.from(this.runs.values()).map(({ id, topic, status, startedAt }) => ({ id, topic, status, startedAt }));
+        return live.reverse();
+    }
+
+    getRun(runId) {
+        const run = this.runs.get(runId);
+        if (run) return { id: run.id, topic: run.topic, status: run.status, startedAt: run.startedAt, tree: run.tree };
+        if (!this.spillDir) return null;
+
+        const spilled = path.join(this.spillDir, `${path.basename(runId)}.json`);
+        return fs.existsSync(spilled) ? JSON.parse(fs.readFileSync(spilled, 'utf8')) : null;
+    }
+
+    latestRun() {
+        const ids = Array.from(this.runs.keys());
+        return ids.length ? this.getRun(ids[ids.length - 1]) : null;
+    }
+
+    evict() {
+        while (this.runs.size > this.maxRuns) {
+            const [oldestId] = this.runs.keys();
+            const snapshot = this.getRun(oldestId);
+            this.runs.delete(oldestId);
+            if (this.spillDir) {
+                fs.writeFile(
+                    path.join(this.spillDir, `${path.basename(oldestId)}.json`),
+                    JSON.stringify(snapshot),
+                    (error) => error && console.error('Failed to spill run:', error.message),
+                );
+            }
+        }
+    }
+
+    publish(delta) {
+        this.emit('delta', delta);
+    }
+}
+
+module.exports = { RunStore };
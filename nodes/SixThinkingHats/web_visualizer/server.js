@@ -1,73 +1,95 @@
 const express = require('express');
 const path = require('path');
-const app = express();
+const { AnalysisMetrics } = require('./metrics');
+const { RunStore } = require('./run_store');
 
-// Serve static files
-app.use(express.static(path.join(__dirname)));
+function createApp(store, metrics = new AnalysisMetrics()) {
+    const app = express();
+    store.on('finish', (runId, result) => metrics.observeResult(result));
 
-// Add error handling middleware
-app.use((err, req, res, next) => {
-    console.error('Error:', err);
-    res.status(500).json({ error: 'Internal server error' });
-});
+    // Serve static files
+    app.use(express.static(path.join(__dirname)));
+    app.use(express.json({ limit: '10mb' }));
 
-// API endpoint to get dialogue data
-app.get('/api/dialogue-data', (req, res) => {
-    try {
-        const conversation = global.latestConversation || {
-            name: "Root",
-            children: []
-        };
-        console.log('Sending conversation data:', JSON.stringify(conversation));
-        res.json(processConversation(conversation));
-    } catch (error) {
-        console.error('Error serving dialogue data:', error);
-        res.status(500).json({ error: 'Failed to process conversation data' });
-    }
-});
+    app.get('/api/runs', (req, res) => {
+        res.json(store.listRuns());
+    });
 
-// Convert flat conversation history to tree structure
-function processConversation(conversation) {
-    console.log('Processing conversation:', conversation);
-    if (!conversation.conversation) return { name: "No data", children: [] };
+    app.get('/api/runs/:runId', (req, res) => {
+        const run = store.getRun(req.params.runId);
+        if (!run) {
+            res.status(404).json({ error: 'Run not found' });
+            return;
+        }
+        res.json(run);
+    });
 
-    const messages = conversation.conversation;
-    const tree = { name: "Dialogue", children: [] };
-    const messagesMap = new Map();
+    // Latest run's tree, kept for clients that predate run IDs
+    app.get('/api/dialogue-data', (req, res) => {
+        const run = store.latestRun();
+        res.json(run ? run.tree : { name: 'No data', children: [] });
+    });
 
-    // First pass: create nodes
-    messages.forEach(msg => {
-        messagesMap.set(msg.id, {
-            name: msg.content,
-            hat: msg.hat,
-            content: msg.content,
-            timestamp: msg.timestamp,
-            children: []
+    // Server-Sent Events with incremental deltas for all runs
+    app.get('/api/stream', (req, res) => {
+        res.set({
+            'Content-Type': 'text/event-stream',
+            'Cache-Control': 'no-cache',
+            Connection: 'keep-alive',
         });
+        res.flushHeaders();
+
+        const send = (delta) => res.write(`data: ${JSON.stringify(delta)}\n\n`);
+        store.on('delta', send);
+        req.on('close', () => store.off('delta', send));
     });
 
-    // Second pass: build tree
-    messages.forEach(msg => {
-        const node = messagesMap.get(msg.id);
-        if (msg.response_to) {
-            const parent = messagesMap.get(msg.response_to);
-            if (parent) {
-                parent.children.push(node);
-            } else {
-                tree.children.push(node);
-            }
+    // Lets a separate process push stream events or final results into this server
+    app.post('/api/runs/:runId/events', (req, res) => {
+        const { runId } = req.params;
+        const event = req.body || {};
+        if (event.event === 'result') {
+            store.finishRun(runId, event);
+        } else if (event.event === 'run') {
+            store.startRun(runId, event.topic || '');
         } else {
-            tree.children.push(node);
+            store.handleEvent(runId, event);
         }
+        res.status(204).end();
+    });
+
+    // Prometheus scrape endpoint: per-hat latency, time to first token, tokens, retries
+    app.get('/metrics', (req, res) => {
+        res.set('Content-Type', 'text/plain; version=0.0.4');
+        res.send(metrics.render());
     });
 
-    return tree;
+    // Add error handling middleware
+    app.use((err, req, res, next) => {
+        console.error('Error:', err.message);
+        res.status(500).json({ error: 'Internal server error' });
+    });
+
+    return app;
+}
+
+function createStoreFromEnv() {
+    return new RunStore({
+        maxRuns: Number(process.env.VISUALIZER_MAX_RUNS || 50),
+        spillDir: process.env.VISUALIZER_SPILL_DIR || null,
+    });
 }
 
+module.exports = { RunStore, AnalysisMetrics, createApp, createStoreFromEnv };
+
 // Start server
-const port = process.env.VISUALIZER_PORT || 3001;
-app.listen(port, '0.0.0.0', () => {
-    console.log(`Visualization server running on port ${port}`);
-}).on('error', (error) => {
-    console.error('Failed to start server:', error);
-});
\ No newline at end of file
+if (require.main === module) {
+    const port = process.env.VISUALIZER_PORT || 3001;
+    // The ingestion route and /metrics are unauthenticated, so bind to localhost by default
+    const host = process.env.VISUALIZER_HOST || '127.0.0.1';
+    createApp(createStoreFromEnv()).listen(port, host, () => {
+        console.log(`Visualization server running on ${host}:${port}`);
+    }).on('error', (error) => {
+        console.error('Failed to start server:', error);
+    });
+}
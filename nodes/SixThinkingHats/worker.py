@@ -0,0 +1,248 @@
+import os
+import sys
+import json
+import asyncio
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+
+from ipc_protocol import MAX_FRAME_BYTES, PROTOCOL_VERSION, ProtocolError, encode_frame, read_frame
+
+logger = logging.getLogger(__name__)
+
+class AnalysisWorker:
+    """
+    Long-lived analysis worker serving newline-delimited JSON jobs.
+
+    Each job line looks like {"id": ..., "topic": ..., "hats": [...], "dialog_mode": true}
+    (the test_input.json shape with "selectedHats" is accepted too) and produces
+    exactly one JSON result line carrying the same id; jobs without an id get
+    their line number. Jobs with
+    "stream": true also get hat_start/token/hat_end event lines tagged with their
+    id, and their result line carries "event": "result". serve_framed() carries
+    the same jobs and results in versioned frames instead (see ipc_protocol). The analyzer
+    factory is called once per job, so every job gets a fresh HatManager while the
+    factory itself keeps sharing one warm HTTP client.
+    """
+
+    def __init__(self, analyzer_factory: Callable, pool_size: int = 1):
+        if pool_size < 1:
+            raise ValueError("pool_size must be at least 1")
+        self.analyzer_factory = analyzer_factory
+        self.pool_size = pool_size
+        self._slots = asyncio.Semaphore(pool_size)
+
+    async def handle_job(self, job: Dict, write: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Runs a single analysis job and returns its result with the job id attached;
+        stream events are passed to write when the job asks for them
+        """
+        job_id = job.get('id')
+        if job.get('v', PROTOCOL_VERSION) != PROTOCOL_VERSION:
+            return {
+                'id': job_id,
+                'status': 'error',
+                'error': f"Unsupported protocol version {job['v']}; this worker speaks {PROTOCOL_VERSION}",
+                'conversation': []
+            }
+        if job.get('resume'):
+            return await self._run_job(job, job_id, write, lambda analyzer: analyzer.resume(str(job['resume'])))
+        try:
+            topic = job['topic']
+            hats_order = job['hats'] if 'hats' in job else job['selectedHats']
+            if isinstance(hats_order, str):
+                hats_order = json.loads(hats_order)
+            dialog_mode = job.get('dialog_mode', job.get('dialogMode', True))
+            if isinstance(dialog_mode, str):
+                dialog_mode = dialog_mode.lower() == 'true'
+            max_rounds = int(job.get('max_rounds', job.get('maxRounds', 1)))
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Invalid job {job_id}: {str(e)}")
+            return {'id': job_id, 'status': 'error', 'error': f"Invalid job: {str(e)}", 'conversation': []}
+
+        return await self._run_job(job, job_id, write, lambda analyzer: analyzer.analyze_topic(
+            topic,
+            hats_order,
+            bool(dialog_mode),
+            run_id=job.get('run_id'),
+            max_rounds=max_rounds
+        ))
+
+    async def _run_job(
+        self,
+        job: Dict,
+        job_id,
+        write: Optional[Callable[[Dict], None]],
+        run: Callable[[object], Awaitable[Dict]]
+    ) -> Dict:
+        """
+        Runs a job on a fresh analyzer once a pool slot is free
+        """
+        stream = bool(job.get('stream')) and write is not None
+        async with self._slots:
+            try:
+                analyzer = self.analyzer_factory()
+                if stream:
+                    analyzer.on_event = lambda event: write({'id': job_id, **event})
+                result = await run(analyzer)
+            except Exception as e:
+                # analyze_topic reports its own failures; this keeps anything else
+                # from taking down the other jobs
+                logger.error(f"Job {job_id} failed: {str(e)}")
+                result = {'status': 'error', 'error': str(e), 'conversation': []}
+
+        if stream:
+            return {'id': job_id, 'event': 'result', **result}
+        return {'id': job_id, **result}
+
+    async def _handle_line(self, line: bytes, line_number: int, write: Callable[[Dict], None]) -> None:
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("job must be a JSON object")
+        except ValueError as e:
+            write({'id': line_number, 'status': 'error', 'error': f"Malformed job: {str(e)}", 'conversation': []})
+            return
+        job.setdefault('id', line_number)
+        write(await self.handle_job(job, write))
+
+    async def _serve_lines(self, lines: AsyncIterator[bytes], write: Callable[[Dict], None]) -> None:
+        """
+        Reads jobs until EOF, running up to pool_size of them at once and writing
+        each result as soon as its job finishes. The next job is only read once a
+        job has finished, so a large batch is never held in memory as a whole.
+        """
+        in_flight = asyncio.Semaphore(self.pool_size)
+        pending = set()
+        line_number = -1
+        async for line in lines:
+            line_number += 1
+            if not line.strip():
+                continue
+            await in_flight.acquire()
+            task = asyncio.create_task(self._handle_line(line, line_number, write))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            task.add_done_callback(lambda _: in_flight.release())
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def _serve_stream(self, reader: asyncio.StreamReader, write: Callable[[Dict], None]) -> None:
+        await self._serve_lines(reader, write)
+
+    async def serve_file(self, path: str) -> None:
+        """
+        Serves a batch of jobs from a JSONL file, writing one result line per job
+        to stdout in completion order
+        """
+        async def read_lines() -> AsyncIterator[bytes]:
+            with open(path, 'rb') as jobs:
+                for line in jobs:
+                    yield line
+
+        logger.info(f"Worker serving batch {path} with pool size {self.pool_size}")
+        await self._serve_lines(read_lines(), self._write_stdout)
+
+    @staticmethod
+    def _write_stdout(result: Dict) -> None:
+        sys.stdout.write(json.dumps(result) + "\n")
+        sys.stdout.flush()
+
+    async def serve_stdin(self) -> None:
+        """
+        Serves jobs from stdin and writes one result line per job to stdout
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=2 ** 24)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+        logger.info(f"Worker serving stdin with pool size {self.pool_size}")
+        await self._serve_stream(reader, self._write_stdout)
+
+    async def serve_framed(self, out_fd: int) -> None:
+        """
+        Serves framed jobs from stdin and writes hello, event and result frames
+        to the file descriptor out_fd, keeping stdout out of the protocol
+        """
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=MAX_FRAME_BYTES)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+        out = os.fdopen(out_fd, 'wb')
+
+        def write(message: Dict) -> None:
+            frame = self._encode_output(message)
+            if frame is not None:
+                out.write(frame)
+                out.flush()
+
+        async def read_frames() -> AsyncIterator[bytes]:
+            while True:
+                try:
+                    payload = await read_frame(reader)
+                except ProtocolError as e:
+                    # Frame boundaries are lost; finish the jobs already read
+                    logger.error(f"Stopped reading jobs: {str(e)}")
+                    return
+                if payload is None:
+                    return
+                yield payload
+
+        out.write(encode_frame({'type': 'hello', 'pid': os.getpid()}))
+        out.flush()
+        logger.info(f"Worker serving framed jobs with pool size {self.pool_size}, results on fd {out_fd}")
+        try:
+            await self._serve_lines(read_frames(), write)
+        finally:
+            out.close()
+
+    @staticmethod
+    def _encode_output(message: Dict) -> Optional[bytes]:
+        """
+        Frames a result or stream event for serve_framed. The node waits for
+        exactly one result per job, so a result that cannot be encoded (too
+        large, not serializable) is replaced by an error result; an event that
+        cannot be encoded is dropped and None returned.
+        """
+        if message.get('event', 'result') == 'result':
+            message = {'type': 'result', **{k: v for k, v in message.items() if k != 'event'}}
+        else:
+            message = {'type': 'event', **message}
+        try:
+            return encode_frame(message)
+        except (ProtocolError, TypeError, ValueError) as e:
+            logger.error(f"Cannot send {message['type']} frame of job {message.get('id')}: {str(e)}")
+            if message['type'] != 'result':
+                return None
+            return encode_frame({
+                'type': 'result',
+                'id': message.get('id'),
+                'status': 'error',
+                'error': f"Result could not be sent: {str(e)}",
+                'conversation': []
+            })
+
+    async def serve_unix_socket(self, path: str) -> None:
+        """
+        Serves jobs on a local Unix socket; each connection is an independent job stream
+        sharing the worker's pool slots
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+
+        async def on_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            def write(result: Dict) -> None:
+                writer.write((json.dumps(result) + "\n").encode())
+
+            try:
+                await self._serve_stream(reader, write)
+                await writer.drain()
+            finally:
+                writer.close()
+
+        server = await asyncio.start_unix_server(on_connection, path=path, limit=2 ** 24)
+        logger.info(f"Worker listening on {path} with pool size {self.pool_size}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(path):
+                os.unlink(path)